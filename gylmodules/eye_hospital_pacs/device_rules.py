@@ -0,0 +1,177 @@
+# 设备文件分类规则
+# 规则表（ehp_config.DEVICE_RULES，或 DEVICE_RULES_PATH 指定的 json 文件）按顺序排列，靠前的规则优先；
+# 绝大多数设备按文件名前缀区分，前缀规则（prefixes）编译为 前缀 -> 规则序号 的字典，按前缀长度逐个查表，
+# 只有按文件名形状识别的规则（pattern，如 Pentacam 直接导出的 4 Maps Refr、蔡司 Master700）才用正则，
+# 且只尝试排在命中的前缀规则之前的正则规则
+# json 文件修改后自动重新加载（最多每 DEVICE_RULES_CHECK_INTERVAL 秒检查一次 mtime），无需重启服务；
+# 规则有误（正则错误、template_id 不是已注册的模板）时拒绝加载，继续使用原规则
+# 共享目录入库（monitor_new_files）按规则重命名、记录设备，OCR 模板匹配（report_templates）按规则的 template_id 找模板
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+
+from gylmodules.eye_hospital_pacs import ehp_config
+
+# 眼别 -> 报告名后缀
+EYE_SUFFIX = {'OD': '-右', 'OS': '-左', '': ''}
+
+
+class DeviceRule:
+    """
+    :param report_name: 报告名
+    :param device: 设备名
+    :param prefixes: 文件名前缀（原样比较，区分大小写），与 pattern 二选一
+    :param pattern: 从文件名开头匹配的正则（re.match），只用于无法按前缀区分的文件名
+    :param eye: 'OD' 右眼 / 'OS' 左眼 / '' 不区分，区分时报告名加 -右 / -左
+    :param template_id: 对应的 OCR 模板，为空表示不解析
+    :param keep_name: 保留原文件名（{报告名}_{原文件名}），否则重命名为 {报告名}_{时间}
+    """
+
+    def __init__(self, report_name: str, device: str, prefixes: Sequence[str] = None, pattern: str = None,
+                 eye: str = '', template_id: str = '', keep_name: bool = False):
+        if bool(prefixes) == bool(pattern):
+            raise ValueError(f"规则 {report_name} 需要且只能指定 prefixes / pattern 之一")
+        if eye not in EYE_SUFFIX:
+            raise ValueError(f"规则 {report_name} 的眼别 {eye} 无效，可选 OD / OS / 空")
+        self.prefixes = tuple(prefixes or ())
+        self.pattern = pattern
+        try:
+            self.regex = re.compile(pattern) if pattern else None
+        except re.error as e:
+            raise ValueError(f"规则 {report_name} 的正则 {pattern} 有误: {e}")
+        self.report_name = report_name
+        self.device = device
+        self.eye = eye
+        self.template_id = template_id
+        self.keep_name = keep_name
+
+    @property
+    def full_report_name(self) -> str:
+        """区分眼别的报告名，如 屈光四图-右"""
+        return self.report_name + EYE_SUFFIX[self.eye]
+
+    def __repr__(self):
+        return f"DeviceRule({self.pattern or list(self.prefixes)!r} -> {self.full_report_name})"
+
+
+class RuleMatcher:
+    """前缀字典 + 按顺序尝试的正则规则，返回命中的第一条规则的序号"""
+
+    def __init__(self, rules: Sequence[DeviceRule]):
+        self._prefixes: Dict[str, int] = {}
+        self._patterns: List[Tuple[int, Pattern]] = []
+        for index, rule in enumerate(rules):
+            for prefix in rule.prefixes:
+                self._prefixes.setdefault(prefix, index)
+            if rule.regex is not None:
+                self._patterns.append((index, rule.regex))
+        self._lengths = sorted({len(prefix) for prefix in self._prefixes})
+
+    def match(self, file_name: str) -> Optional[int]:
+        best = None
+        for length in self._lengths:
+            index = self._prefixes.get(file_name[:length])
+            if index is not None and (best is None or index < best):
+                best = index
+        for index, regex in self._patterns:
+            if best is not None and index > best:
+                break
+            if regex.match(file_name):
+                return index
+        return best
+
+
+def compile_rules(rules: Sequence[DeviceRule]) -> RuleMatcher:
+    return RuleMatcher(rules)
+
+
+def _check_templates(rules: Sequence[DeviceRule]):
+    """template_id 必须是已注册的模板，拼写错误在加载时报错，而不是运行时静默变成不解析"""
+    # report_templates 导入本模块，延迟导入避免循环依赖
+    from gylmodules.eye_hospital_pacs.report_templates import get_template
+    unknown = [rule.template_id for rule in rules if rule.template_id and get_template(rule.template_id) is None]
+    if unknown:
+        raise ValueError(f"规则引用了不存在的模板 {unknown}")
+
+
+class DeviceRules:
+
+    def __init__(self, rules_path: str = None):
+        self._rules_path = rules_path
+        self._lock = threading.Lock()
+        self._rules: List[DeviceRule] = []
+        self._matcher: Optional[RuleMatcher] = None
+        self._source = None
+        self._file_mtime = None
+        self._checked_at = 0.0
+
+    @property
+    def rules_path(self) -> str:
+        return self._rules_path or ehp_config.DEVICE_RULES_PATH
+
+    def _read(self) -> Tuple[List[Dict], str, Optional[int]]:
+        """规则来源：json 文件存在时优先，否则取配置"""
+        try:
+            mtime = os.stat(self.rules_path).st_mtime_ns
+        except OSError:
+            return list(ehp_config.DEVICE_RULES), 'ehp_config.DEVICE_RULES', None
+        with open(self.rules_path, 'r', encoding='utf-8') as f:
+            return json.load(f), self.rules_path, mtime
+
+    def reload(self) -> int:
+        """
+        重新加载并编译规则，规则有误时保留原规则并抛出异常
+        :return: 规则条数
+        """
+        rows, source, mtime = self._read()
+        rules = [DeviceRule(**row) for row in rows]
+        _check_templates(rules)
+        matcher = compile_rules(rules)
+        with self._lock:
+            self._rules, self._matcher, self._source, self._file_mtime = rules, matcher, source, mtime
+            self._checked_at = time.monotonic()
+        print(datetime.now(), f"设备分类规则已加载，共 {len(rules)} 条，来源 {source}")
+        return len(rules)
+
+    def _maybe_reload(self):
+        if self._matcher is not None and time.monotonic() - self._checked_at < ehp_config.DEVICE_RULES_CHECK_INTERVAL:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.rules_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._matcher is None or mtime != self._file_mtime:
+            try:
+                self.reload()
+            except Exception as e:
+                if self._matcher is None:
+                    raise
+                print(datetime.now(), f"设备分类规则 {self.rules_path} 加载失败，继续使用原规则: {e}")
+                self._file_mtime = mtime
+
+    def classify(self, file_name: str) -> Optional[DeviceRule]:
+        """文件名（不含目录）命中的第一条规则，未命中返回 None"""
+        self._maybe_reload()
+        with self._lock:
+            matcher, rules = self._matcher, self._rules
+        index = matcher.match(os.path.basename(file_name))
+        return None if index is None else rules[index]
+
+    def rules(self) -> List[DeviceRule]:
+        self._maybe_reload()
+        return list(self._rules)
+
+    def status(self) -> Dict:
+        rules = self.rules()  # 先加载，来源才是最新的
+        return {"source": self._source, "rules": [
+            {"prefixes": list(rule.prefixes), "pattern": rule.pattern, "report_name": rule.full_report_name,
+             "device": rule.device, "template_id": rule.template_id} for rule in rules]}
+
+
+device_rules = DeviceRules()
@@ -1,3 +1,7 @@
+import os
+
+from gylmodules import global_config
+
 # 屈光手术核查表 默认值
 verification_form = {"operator": "", "table_id": "手术安全核查表", "table_name": "手术安全核查表", "operation_eye": "双眼", "operation_time": "", "after_operation": {"other": "", "skin_check": "是", "basic_check": "是", "patient_way": "离院", "operation_mark": "", "pipeline_check": [], "signature_nurse": "", "operation_method": "是", "operation_sample": "是", "operation_supply": "是", "operation_medical": "是", "signature_operator": "", "signature_anesthetist": ""}, "before_operation": {"other": "", "addon_check": "否", "basic_check": "是", "nurse_other": "", "estimated_time": True, "operation_mark": "是", "operation_risk": "", "operator_other": "", "estimated_blood": True, "operation_focus": True, "signature_nurse": "", "special_medical": True, "anesthesia_focus": ["麻醉关注点"], "anesthesia_other": "", "operation_method": "是", "instrument_status": True, "antibacterial_test": True, "signature_anesthetist": ""}, "operation_method": ["经上皮准分子激光角膜切削术"], "record_detail_id": None, "anesthesia_method": True, "before_anesthesia": {"other": "", "skin_check": "是", "addon_check": [], "basic_check": "是", "blood_check": "否", "mskin_check": "是", "venous_access": "否", "operation_mark": "是", "signature_nurse": "", "allergic_history": "否", "anesthesia_check": "是", "operation_method": "是", "anesthesia_method": "是", "antibacterial_test": "否", "signature_operator": "", "signature_anesthetist": "", "operation_consent_form": "是", "anesthesia_consent_form": "是"}}
 
@@ -60,9 +64,180 @@ surname_pinyin_map = {
 }
 
 
+# ====================== OCR 解析配置 ======================
+
+# 是否使用 GPU 推理：None 自动检测（Paddle 编译了 CUDA 且有显卡）；离线基准测试等场景可改为 False 强制使用 CPU
+OCR_USE_GPU = False if global_config.run_in_local else None
+
+# 推理后端：'paddle' Paddle Inference（GPU / CPU）；'onnx' ONNX Runtime CPU 推理（先执行 ocr_backends export 转换模型）
+OCR_BACKEND = 'paddle'
+# ONNX 后端使用 int8 动态量化模型（export --int8 生成），精度变化需用基准测试确认
+OCR_ONNX_INT8 = False
+# ONNX Runtime 每个引擎的推理线程数（引擎数 × 工作进程数 × 线程数不宜超过 CPU 核数）
+OCR_CPU_THREADS = 4
+
+# 模型目录及可选模型：det / rec 模型目录名、识别算法、识别输入尺寸；paddle / onnx 两种后端都按 OCR_MODEL 取模型
+OCR_MODEL_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference') \
+    if global_config.run_in_local else '/home/nsyy/eye-pacs/inference'
+OCR_ONNX_MODEL_DIR = os.path.join(OCR_MODEL_ROOT, 'onnx')
+OCR_MODEL_PROFILES = {
+    'ppocr_v4': {'det': 'ch_PP-OCRv4_det_infer', 'rec': 'ch_PP-OCRv4_rec_infer',
+                 'rec_algorithm': 'SVTR_LCNet', 'rec_image_shape': '3, 48, 320'},
+    'server_v2': {'det': 'ch_ppocr_server_v2.0_det_infer', 'rec': 'ch_ppocr_server_v2.0_rec_infer',
+                  'rec_algorithm': 'CRNN', 'rec_image_shape': '3, 32, 320'},
+}
+OCR_MODEL = 'server_v2' if global_config.run_in_local else 'ppocr_v4'
+
+# 进程内预热的 OCR 引擎数量（每个引擎约占用一份 det/rec 模型内存）
+OCR_ENGINE_POOL_SIZE = 2
+# 借用 OCR 引擎的最长等待时间（秒）
+OCR_ENGINE_CHECKOUT_TIMEOUT = 5 * 60
+
+# 批量识别时多个区域竖向拼接为一张检测画布，画布最大高度（像素，与 det_limit_side_len 保持一致，避免被检测器缩放）
+OCR_MOSAIC_MAX_HEIGHT = 2048
+# 拼接画布中相邻区域之间的留白（像素）
+OCR_MOSAIC_GAP = 32
+# OCR 区域直接渲染为灰度图，预处理和推理输入全程单通道（检测 / 识别模型需要三通道时才在送入模型前复制通道）；
+# 设为 False 按 RGB 渲染，仅用于基准测试对比
+OCR_RENDER_GRAY = True
+# 解析流水线（渲染 -> 预处理 -> 识别）各阶段之间最多缓冲的报告数，限制同时在内存中的区域图像
+OCR_PIPELINE_DEPTH = 2
+
+# 区域渲染分辨率按区域内文字高度自动选择：目标文字墨迹高度（像素，约为大写字母高度）及 dpi 上下限
+OCR_ADAPTIVE_DPI = True
+OCR_TEXT_TARGET_PX = 24
+OCR_REGION_DPI_MIN = 150
+OCR_REGION_DPI_MAX = 400
+# 每个模板区域先测量 OCR_REGION_DPI_SAMPLES 份报告，之后取中位数复用；复用超过 OCR_REGION_DPI_TTL 秒后重新测量一份
+OCR_REGION_DPI_SAMPLES = 5
+OCR_REGION_DPI_TTL = 3600
+
+# 矢量 PDF 优先读取内嵌文本层，字段校验不通过时再走 OCR
+PDF_TEXT_LAYER_ENABLED = True
+
+# 仅识别（跳过文本检测）的区域按水平投影切分文本行：行最小高度、行间最大断开距离、切出文本行的外扩留白（像素）
+OCR_LINE_MIN_HEIGHT = 8
+OCR_LINE_MAX_GAP = 3
+OCR_LINE_PADDING = 4
+
+# OCR 结果缓存（SQLite），按 (文件 sha256, 模板 id@版本) 缓存识别文本和提取结果
+OCR_CACHE_ENABLED = True
+OCR_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_cache.db') \
+    if global_config.run_in_local else "/home/nsyy/ehp-cache/ocr_cache.db"
+# 缓存最大条数，超出后按最近访问时间淘汰
+OCR_CACHE_MAX_ENTRIES = 20000
+
+# ====================== 多进程解析服务 ======================
+
+# 解析工作进程数，每个进程常驻一套 OCR 模型（GPU 部署时注意显存：gpu_mem × 进程数）；0 表示不启用，仍在调度线程内解析
+PARSE_WORKERS = 2
+# 每个工作进程内的 OCR 引擎数量
+PARSE_WORKER_ENGINES = 1
+# 每个工作进程一次领取的报告数（同一批报告的区域合并批量识别）
+PARSE_BATCH_SIZE = 5
+# 每个工作进程最多同时排队的批次数，超出后派发线程阻塞，避免任务堆积在进程池内部
+PARSE_MAX_IN_FLIGHT_PER_WORKER = 2
+# 待解析队列容量
+PARSE_QUEUE_SIZE = 1000
+# 定时任务每次从数据库补充的待解析报告数
+PARSE_POLL_LIMIT = 200
+# 新报告入库时直接投递到解析队列，定时扫描只作兜底，间隔（秒）
+PARSE_SWEEP_INTERVAL = 10 * 60
+# 领取报告后的解析租约时长（秒），超时未回写的报告由回收任务放回待解析
+PARSE_LEASE_SECONDS = 10 * 60
+# 最大解析尝试次数，租约多次过期的报告标记为解析失败
+PARSE_MAX_ATTEMPTS = 3
+# 过期租约回收间隔（秒）
+PARSE_REAP_INTERVAL = 60
+
+# ====================== 共享目录监控 ======================
+
+# 启动目录监控服务（Linux 下 inotify 实时监听，另有轮询兜底；其他系统只轮询）
+MONITOR_WATCHER_ENABLED = True
+# 兜底轮询间隔（秒）：轮询发现遗漏文件时缩短到最小值，否则逐次翻倍直到最大值；inotify 不可用时最大值取 MONITOR_POLL_ONLY_MAX_INTERVAL
+MONITOR_POLL_MIN_INTERVAL = 2
+MONITOR_POLL_MAX_INTERVAL = 60
+MONITOR_POLL_ONLY_MAX_INTERVAL = 10
+# 收到 inotify 事件后再等待的时间（秒），同一批拷贝的文件合并处理
+MONITOR_EVENT_DEBOUNCE = 0.1
+# 文件大小、修改时间、inode 连续不变超过该时长（秒）且没有进程打开时才认为写入完成
+MONITOR_STABLE_SECONDS = 3
+# 尚未写完的文件的重新检查间隔（秒）
+MONITOR_RETRY_INTERVAL = 1
+# 处理失败的文件的重试间隔（秒）：第 n 次失败后等待 MONITOR_RETRY_BACKOFF * 2^(n-1)，不超过 MONITOR_RETRY_BACKOFF_MAX
+MONITOR_RETRY_BACKOFF = 10
+MONITOR_RETRY_BACKOFF_MAX = 600
+# 扫描索引（SQLite），记录仍在共享目录中的文件的处理状态；连续处理失败达到次数上限的文件被隔离，不再重试
+MONITOR_INDEX_PATH = os.path.join(os.path.dirname(OCR_CACHE_PATH), 'scan_index.db')
+MONITOR_MAX_ATTEMPTS = 5
+# 入库文件锁，同一台机器上的多个进程串行入库
+MONITOR_INGEST_LOCK_PATH = os.path.join(os.path.dirname(OCR_CACHE_PATH), 'ingest.lock')
+
+# ====================== 设备文件分类 ======================
+
+# 共享目录中设备导出的文件按以下规则识别报告类型与设备，按顺序取第一条命中的规则：
+#   prefixes 文件名前缀（查表匹配）或 pattern 从文件名开头匹配的正则（只用于无法按前缀区分的文件名），二选一
+#   report_name 报告名  device 设备名  eye 'OD' 右眼 / 'OS' 左眼 / '' 不区分（报告名加 -右 / -左）
+#   template_id 对应的 OCR 模板（report_templates 中已注册的模板，否则拒绝加载）  keep_name 保留原文件名：{报告名}_{原文件名}，否则重命名为 {报告名}_{时间}
+# 未命中任何规则的文件保留原文件名，设备记为 未收录设备
+DEVICE_RULES = [
+    {"prefixes": ["21", "23"], "report_name": "角膜内皮细胞报告", "device": "角膜内皮显微镜",
+     "template_id": "corneal_endothelium"},
+    {"prefixes": ["22"], "report_name": "角膜内皮细胞报告2", "device": "角膜内皮显微镜",
+     "template_id": "corneal_endothelium_2"},
+    {"prefixes": ["31", "32"], "report_name": "角膜地形图", "device": "角膜地形图仪Medmont",
+     "template_id": "medmont_topography"},
+    {"prefixes": ["41", "42", "43", "44"], "report_name": "眼表综合检查报告", "device": "角膜地形图仪",
+     "template_id": "ocular_surface"},
+    {"prefixes": ["51r", "51R"], "report_name": "屈光四图", "device": "眼前节分析仪", "eye": "OD",
+     "template_id": "pentacam_4maps"},
+    {"prefixes": ["51l", "51L"], "report_name": "屈光四图", "device": "眼前节分析仪", "eye": "OS",
+     "template_id": "pentacam_4maps"},
+    # Pentacam 直接导出：{姓}_{名}_{OD/OS}_{日期}_{时间}_4 Maps Refr_...pdf，眼别取文件名中的 OD / OS
+    {"pattern": r".*_OD_.*4 Maps Refr", "report_name": "屈光四图", "device": "眼前节分析仪", "eye": "OD",
+     "template_id": "pentacam_4maps"},
+    {"pattern": r".*_OS_.*4 Maps Refr", "report_name": "屈光四图", "device": "眼前节分析仪", "eye": "OS",
+     "template_id": "pentacam_4maps"},
+    {"pattern": r".*4 Maps Refr", "report_name": "屈光四图", "device": "眼前节分析仪", "template_id": "pentacam_4maps"},
+    {"prefixes": ["52r", "52R"], "report_name": "屈光六图", "device": "眼前节分析仪", "eye": "OD",
+     "template_id": "pentacam_6maps"},
+    {"prefixes": ["52l", "52L"], "report_name": "屈光六图", "device": "眼前节分析仪", "eye": "OS",
+     "template_id": "pentacam_6maps"},
+    {"prefixes": ["53r", "53R"], "report_name": "Scheimpflug图像总览", "device": "眼前节分析仪", "eye": "OD",
+     "template_id": "pentacam_scheimpflug"},
+    {"prefixes": ["53l", "53L"], "report_name": "Scheimpflug图像总览", "device": "眼前节分析仪", "eye": "OS",
+     "template_id": "pentacam_scheimpflug"},
+    {"prefixes": ["54r", "54R"], "report_name": "比较两次检查", "device": "眼前节分析仪", "eye": "OD",
+     "template_id": "pentacam_compare"},
+    {"prefixes": ["54l", "54L"], "report_name": "比较两次检查", "device": "眼前节分析仪", "eye": "OS",
+     "template_id": "pentacam_compare"},
+    {"prefixes": ["6r", "6R"], "report_name": "生物力学", "device": "非接触式眼压计", "eye": "OD",
+     "template_id": "biomechanics"},
+    {"prefixes": ["6l", "6L"], "report_name": "生物力学", "device": "非接触式眼压计", "eye": "OS",
+     "template_id": "biomechanics"},
+    {"prefixes": ["7"], "report_name": "眼底照片", "device": "眼底照相机", "template_id": "fundus_photo"},
+    # 蔡司 Master700：{10 位 ID}_{姓}_{名}_{时间}.pdf，只在前面的前缀规则都未命中时按形状识别（与原判断顺序一致）
+    {"pattern": r"[^_]{10}(?:_[^_]*){3}$", "report_name": "Master700", "device": "蔡司Master700",
+     "template_id": "master700", "keep_name": True},
+]
+# 规则文件（json，格式同 DEVICE_RULES），存在时代替上面的规则；修改后自动重新加载，检查间隔（秒）
+DEVICE_RULES_PATH = os.path.join(os.path.dirname(OCR_CACHE_PATH), 'device_rules.json')
+DEVICE_RULES_CHECK_INTERVAL = 5
 
+# ====================== 多页报告页面分类 ======================
 
+# 页面缩略图分辨率（dpi），用于计算页面指纹
+PAGE_THUMBNAIL_DPI = 24
+# 每个模板保留的目标页指纹数量
+PAGE_FINGERPRINT_MAX = 20
+PAGE_FINGERPRINT_PATH = os.path.join(os.path.dirname(OCR_CACHE_PATH), 'page_fingerprints.json')
 
+# ====================== 基准测试 ======================
 
+# 基准测试语料目录：<目录>/<template_id>/<报告文件名>.pdf + 同名 .json（期望字段值），默认为随仓库提交的合成语料
+OCR_BENCHMARK_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_corpus')
 
+# ====================== 监控指标 ======================
 
+# 是否统计解析 / 目录监控 / 数据库耗时直方图（/ehp/metrics），计数器不受影响
+EHP_METRICS_ENABLED = True
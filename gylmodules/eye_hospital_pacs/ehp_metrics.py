@@ -0,0 +1,240 @@
+# 解析流程监控指标：阶段耗时直方图、计数器、即时值，以 Prometheus 文本格式输出（/ehp/metrics）
+# 业务代码用 timed('阶段名', template=...) 包裹各阶段，耗时写入直方图并分发给已注册的观察者（基准测试统计等）
+# 指标总是在记录时写入，与是否有人抓取无关：每次 observe 是一把锁加一次二分查找，每次 inc 是一把锁加一次字典更新；
+# EHP_METRICS_ENABLED = False 时阶段 / 目录监控 / 数据库耗时不再写入直方图（观察者照常收到阶段耗时，
+# 数据库观察者在导入时注册，每条 SQL 仍会调用一次并判断开关），计数器照常累加（OCR 缓存状态等接口依赖计数器）
+# 多进程解析时，工作进程每批解析结束后用 drain() 取出增量，由主进程 merge() 合并
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.utils import db_utils
+
+# 默认耗时分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """带标签的直方图，分桶计数为非累计值，输出时再累加"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}  # 标签值 -> [各桶计数..., +Inf 计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += value
+
+    def drain(self) -> Dict[Tuple, List]:
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series: Dict[Tuple, List]):
+        with self._lock:
+            for label_values, values in series.items():
+                current = self._series.setdefault(tuple(label_values), [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(values):
+                    current[i] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(label_values, list(values)) for label_values, values in self._series.items()]
+        for label_values, values in sorted(items):
+            labels = _format_labels(self.label_names, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._series.get(label_values, 0)
+
+    def drain(self) -> Dict[Tuple, float]:
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series: Dict[Tuple, float]):
+        with self._lock:
+            for label_values, value in series.items():
+                label_values = tuple(label_values)
+                self._series[label_values] = self._series.get(label_values, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._series.items())
+        for label_values, value in sorted(items):
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, label_values)}}} {value}")
+        return lines
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(label_names, label_values))
+
+
+# ====================== 指标定义 ======================
+
+STAGE_SECONDS = Histogram('ehp_stage_seconds', '报告解析各阶段耗时（秒）', ('stage', 'template'))
+REPORTS_PARSED = Counter('ehp_reports_parsed_total', '解析完成的报告数', ('template', 'source'))
+PARSE_FAILURES = Counter('ehp_parse_failures_total', '解析失败的报告数', ('template',))
+OCR_REGIONS = Counter('ehp_ocr_regions_total', '送入 OCR 的区域数', ('mode',))
+DB_SECONDS = Histogram('ehp_db_seconds', '数据库操作耗时（秒）', ('op',))
+DB_ERRORS = Counter('ehp_db_errors_total', '数据库操作异常数', ('op',))
+MONITOR_SECONDS = Histogram('ehp_monitor_seconds', '目录监控各阶段耗时（秒）', ('stage',))
+MONITOR_FILES = Counter('ehp_monitor_files_total', '目录监控处理的文件数', ('result',))
+OCR_CACHE_EVENTS = Counter('ehp_ocr_cache_total', 'OCR 结果缓存命中 / 未命中 / 淘汰次数', ('result',))
+
+_METRICS = [STAGE_SECONDS, REPORTS_PARSED, PARSE_FAILURES, OCR_REGIONS, DB_SECONDS, DB_ERRORS,
+            MONITOR_SECONDS, MONITOR_FILES, OCR_CACHE_EVENTS]
+
+# 即时值，抓取时才计算 {名称: (说明, 取值函数)}
+_gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+
+def register_gauge(name: str, documentation: str, getter: Callable[[], float]):
+    _gauges[name] = (documentation, getter)
+
+
+# ====================== 阶段计时 ======================
+
+_observers: List[Callable[[str, float, str], None]] = []
+_observers_lock = threading.Lock()
+
+
+def add_observer(observer: Callable[[str, float, str], None]):
+    """注册耗时观察者 observer(stage, seconds, template)"""
+    with _observers_lock:
+        if observer not in _observers:
+            _observers.append(observer)
+
+
+def remove_observer(observer: Callable[[str, float, str], None]):
+    with _observers_lock:
+        if observer in _observers:
+            _observers.remove(observer)
+
+
+def observe(stage: str, seconds: float, template: str = ''):
+    """记录一次阶段耗时（秒）"""
+    if ehp_config.EHP_METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, stage, template)
+    for observer in list(_observers):
+        try:
+            observer(stage, seconds, template)
+        except Exception:
+            pass
+
+
+@contextmanager
+def timed(stage: str, template: str = ''):
+    """统计 with 块耗时"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start_time, template)
+
+
+@contextmanager
+def measure(histogram: Histogram, *label_values):
+    """统计 with 块耗时，写入指定直方图"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if ehp_config.EHP_METRICS_ENABLED:
+            histogram.observe(time.perf_counter() - start_time, *label_values)
+
+
+class StageRecorder:
+    """收集全部阶段耗时样本，用于基准测试"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, seconds: float, template: str = ''):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+
+def _observe_sql(op: str, seconds: float, ok: bool):
+    if not ehp_config.EHP_METRICS_ENABLED:
+        return
+    DB_SECONDS.observe(seconds, op)
+    if not ok:
+        DB_ERRORS.inc(op)
+
+
+db_utils.add_sql_observer(_observe_sql)
+
+
+# ====================== 多进程合并与输出 ======================
+
+def drain() -> Dict[str, Dict]:
+    """取出并清空本进程的指标增量（工作进程使用）"""
+    return {metric.name: metric.drain() for metric in _METRICS}
+
+
+def merge(delta: Dict[str, Dict]):
+    """合并工作进程的指标增量"""
+    for metric in _METRICS:
+        if delta.get(metric.name):
+            metric.merge(delta[metric.name])
+
+
+def render_prometheus() -> str:
+    """Prometheus 文本格式（text/plain; version=0.0.4）"""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for name, (documentation, getter) in sorted(_gauges.items()):
+        try:
+            value = float(getter())
+        except Exception:
+            continue
+        lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
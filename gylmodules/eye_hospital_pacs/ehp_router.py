@@ -6,7 +6,12 @@ from flask import Blueprint, jsonify, request, send_from_directory, send_file, m
 from gylmodules import global_config
 from gylmodules.eye_hospital_pacs.monitor_new_files import DEST_BASE_DIR
 from gylmodules.global_tools import api_response, validate_params
-from gylmodules.eye_hospital_pacs import ehp_server, monitor_new_files, pdf_ocr_analysis
+from gylmodules.eye_hospital_pacs import ehp_server, monitor_new_files, ocr_facade, parse_service, ehp_metrics
+from gylmodules.eye_hospital_pacs.device_rules import device_rules
+from gylmodules.eye_hospital_pacs.file_watcher import file_watcher
+from gylmodules.eye_hospital_pacs.ocr_result_cache import ocr_result_cache
+from gylmodules.eye_hospital_pacs.scan_index import scan_index
+from gylmodules.utils.startup_profiler import import_profiler
 
 ehp_system = Blueprint('Eye Hospital Pacs', __name__, url_prefix='/ehp')
 
@@ -122,7 +127,12 @@ def upload_file():
 
             register_id = request.form.get("register_id")
             patient_id = request.form.get("patient_id")
-            ehp_server.update_and_bind_report(file.filename, file_path.replace('/', '&'), register_id, patient_id)
+            report_addr = file_path.replace('/', '&')
+            report_id = ehp_server.update_and_bind_report(file.filename, report_addr, register_id, patient_id)
+            if report_id and report_id > 0:
+                # 直接投递解析，无需等待定时扫描
+                parse_service.submit_new_reports([{'report_id': report_id, 'report_name': file.filename,
+                                                   'report_addr': report_addr}])
             return {'code': 20000, 'res': 'File uploaded successfully'}
         except Exception as e:
             return {'code': 50000, 'res': str(e)}
@@ -135,6 +145,71 @@ def monitor_task():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
+@ehp_system.route('/monitor_status', methods=['POST', 'GET'])
+@api_response
+def monitor_status():
+    return file_watcher.status()
+
+
+@ehp_system.route('/release_quarantined_file', methods=['POST'])
+@api_response
+def release_quarantined_file(json_data):
+    """解除问题文件的隔离，下一轮扫描重新处理"""
+    return scan_index.release(json_data.get("path"))
+
+
+@ehp_system.route('/device_rules', methods=['POST', 'GET'])
+@api_response
+def query_device_rules():
+    return device_rules.status()
+
+
+@ehp_system.route('/reload_device_rules', methods=['POST'])
+@api_response
+def reload_device_rules():
+    """修改规则文件后立即重新加载（否则最多 DEVICE_RULES_CHECK_INTERVAL 秒后自动加载）"""
+    return device_rules.reload()
+
+
+@ehp_system.route('/ocr_engine_status', methods=['POST', 'GET'])
+@api_response
+def ocr_engine_status():
+    return ocr_facade.engine_pool_status()
+
+
+@ehp_system.route('/ocr_region_dpi_status', methods=['POST', 'GET'])
+@api_response
+def ocr_region_dpi_status():
+    """自动选择的区域渲染分辨率：本进程（调度线程内解析）及各解析工作进程"""
+    return {"local": ocr_facade.region_dpi_status(), "workers": parse_service.parse_service.worker_region_dpi}
+
+
+@ehp_system.route('/ocr_cache_status', methods=['POST', 'GET'])
+@api_response
+def ocr_cache_status():
+    return ocr_result_cache.stats()
+
+
+@ehp_system.route('/parse_service_status', methods=['POST', 'GET'])
+@api_response
+def parse_service_status():
+    return parse_service.parse_service.status()
+
+
+@ehp_system.route('/startup_report', methods=['POST', 'GET'])
+@api_response
+def startup_report():
+    return import_profiler.report()
+
+
+@ehp_system.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 抓取接口（文本格式，不经过 api_response 包装）"""
+    response = make_response(ehp_metrics.render_prometheus())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+
 @ehp_system.route('/patient_info', methods=['POST', 'GET'])
 @api_response
 def patient_info(json_data):
@@ -417,8 +417,9 @@ def update_and_bind_report(file_name, file_path, register_id, patient_id):
     insert_sql = f"""INSERT INTO nsyy_gyl.ehp_reports (report_name, report_addr, report_time, 
     patient_id, register_id, report_machine) VALUES ('{file_name}', '{file_path}', 
     '{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', '{patient_id}', '{register_id}', '人工上传')"""
-    db.execute(insert_sql, need_commit=True)
+    report_id = db.execute(insert_sql, need_commit=True)
     del db
+    return report_id
 
 
 def place_on_file(patient_id, register_id, is_complete):
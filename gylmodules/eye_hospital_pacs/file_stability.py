@@ -0,0 +1,136 @@
+# 共享目录文件写入完成判断
+# 跨扫描记录每个文件的 (size, mtime, inode) 签名，签名连续 MONITOR_STABLE_SECONDS 秒不变才认为写入完成；
+# 首次见到的文件一律至少再检查一次：SMB、cp -p、robocopy 复制时保留源文件 mtime，不能只凭 mtime 判断已写完，
+# 只有服务启动时目录中已有的文件（mark_startup）按 mtime 倒推计时，下一轮签名不变即可处理
+# 每次检查只对全部待定文件各 stat 一次，不 sleep，未就绪的文件留在跟踪表中等下一轮（监控服务按 MONITOR_RETRY_INTERVAL 重试）
+# 是否仍被打开（SMB 客户端还在写）每轮只查一次：遍历一遍 /proc/*/fd，得到目录下以写方式打开的文件集合
+
+import logging
+import os
+import subprocess
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from gylmodules.eye_hospital_pacs import ehp_config
+
+logger = logging.getLogger(__name__)
+
+Signature = Tuple[int, int, int]  # (size, mtime_ns, inode)
+
+
+class FileStabilityTracker:
+
+    def __init__(self, stable_seconds: float = None):
+        self._stable_seconds = stable_seconds
+        self._seen: Dict[str, Tuple[Signature, float]] = {}  # 路径 -> (签名, 该签名首次出现的时间)
+        self._startup: Set[str] = set()  # 服务启动时已在目录中、尚未首次检查的文件
+        self._lock = threading.Lock()
+
+    @property
+    def stable_seconds(self) -> float:
+        return self._stable_seconds if self._stable_seconds is not None else ehp_config.MONITOR_STABLE_SECONDS
+
+    def mark_startup(self, paths: Iterable[str]):
+        """记录服务启动时目录中已有的文件，首次检查时按 mtime 倒推签名不变的时间"""
+        with self._lock:
+            self._startup.update(path for path in paths if path not in self._seen)
+
+    def check(self, paths: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """
+        :return: (已稳定的文件, 仍在写入的文件)，已不存在的文件不在返回值中并从跟踪表移除
+        首次见到的文件总是留到下一轮，签名不变才可能就绪
+        """
+        ready, pending = [], []
+        now, wall_now = time.monotonic(), time.time()
+        with self._lock:
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    self._seen.pop(path, None)
+                    self._startup.discard(path)
+                    continue
+                signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+                previous = self._seen.get(path)
+                if previous is None or previous[0] != signature:
+                    # 新文件或签名变化：从现在开始计时，启动时已有的文件按 mtime 倒推；本轮不就绪
+                    startup = previous is None and path in self._startup
+                    self._startup.discard(path)
+                    since = now - max(wall_now - st.st_mtime, 0.0) if startup else now
+                    self._seen[path] = (signature, since)
+                    pending.append(path)
+                    continue
+                (ready if now - previous[1] >= self.stable_seconds else pending).append(path)
+        return ready, pending
+
+    def forget(self, path: str):
+        with self._lock:
+            self._seen.pop(path, None)
+            self._startup.discard(path)
+
+    @property
+    def tracked_count(self) -> int:
+        return len(self._seen)
+
+
+stability_tracker = FileStabilityTracker()
+
+
+def open_files_under(directory: str) -> Optional[Set[str]]:
+    """
+    directory 下以写方式打开（O_WRONLY / O_RDWR）的文件，真实路径
+    Linux 下遍历一次 /proc/*/fd，其他系统执行一次 lsof +D；都不可用时返回 None，调用方跳过打开检查
+    没有权限读取的进程（服务非 root 运行时的其他用户进程）会被跳过
+    """
+    prefix = os.path.join(os.path.realpath(directory), '')
+    if os.path.isdir('/proc/self/fd'):
+        return _open_files_from_proc(prefix)
+    return _open_files_from_lsof(directory, prefix)
+
+
+def _open_files_from_proc(prefix: str) -> Set[str]:
+    opened = set()
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        fd_dir = f'/proc/{pid}/fd'
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:  # 进程已退出或没有权限
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f'{fd_dir}/{fd}')
+            except OSError:
+                continue
+            if not target.startswith(prefix) or target in opened:
+                continue
+            # 只有目标目录下的文件才读取打开方式，低两位为访问模式：0 只读 1 只写 2 读写
+            try:
+                with open(f'/proc/{pid}/fdinfo/{fd}') as f:
+                    flags = next((int(line.split()[1], 8) for line in f if line.startswith('flags:')), 0)
+            except (OSError, ValueError):
+                continue
+            if flags & 0o3:
+                opened.add(target)
+    return opened
+
+
+def _open_files_from_lsof(directory: str, prefix: str) -> Optional[Set[str]]:
+    try:
+        # -F an: 每个文件输出 a<访问模式> 与 n<路径> 两个字段，访问模式 w / u 为写
+        output = subprocess.run(['lsof', '-F', 'an', '+D', directory], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, timeout=30).stdout.decode('utf-8', 'replace')
+    except Exception as e:
+        logger.warning(f"lsof 不可用，跳过文件打开检查: {e}")
+        return None
+    opened, writing = set(), False
+    for line in output.splitlines():
+        if line.startswith('a'):
+            writing = line[1:2] in ('w', 'u')
+        elif line.startswith('n') and writing:
+            path = os.path.realpath(line[1:])
+            if path.startswith(prefix):
+                opened.add(path)
+    return opened
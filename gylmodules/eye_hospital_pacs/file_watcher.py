@@ -0,0 +1,308 @@
+# 共享目录监控服务
+# Linux 下用 inotify（ctypes 调用 libc，无需额外依赖）监听 IN_CLOSE_WRITE / IN_MOVED_TO，文件写完即送入入库流程；
+# 同时保留自适应间隔的轮询兜底（SMB 客户端的特殊写入方式、事件队列溢出、非 Linux 开发环境）：
+# 轮询只 stat 已知目录，新增 / 删除文件会改变所在目录的 mtime，只有 mtime 变化的目录才重新列出，
+# 耗时与目录数相关，与目录中已有的文件数无关
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.ehp_metrics import MONITOR_SECONDS, MONITOR_FILES, measure
+from gylmodules.eye_hospital_pacs.file_stability import stability_tracker
+from gylmodules.eye_hospital_pacs.scan_index import scan_index
+
+logger = logging.getLogger(__name__)
+
+# inotify 事件掩码（<sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: wd, mask, cookie, len，后跟 len 字节的文件名
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """inotify 最小封装，递归监听目录树"""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 失败: {os.strerror(err)}")
+        self._dirs: Dict[int, str] = {}  # watch descriptor -> 目录
+
+    def add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            # ENOSPC: 超过 fs.inotify.max_user_watches，该目录只能靠轮询发现新文件
+            raise OSError(err, f"inotify_add_watch {directory} 失败: {os.strerror(err)}")
+        self._dirs[wd] = directory
+
+    def add_tree(self, root: str):
+        """监听 root 及其全部子目录"""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                self.add_watch(directory)
+                with os.scandir(directory) as it:
+                    stack.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+            except OSError as e:
+                logger.warning(f"监听目录 {directory} 失败: {e}")
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._dirs)
+
+    def read(self, timeout: float) -> List[Tuple[Optional[str], int]]:
+        """
+        等待事件，超时返回空列表
+        :return: [(路径, 掩码)]，事件队列溢出时路径为 None
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events, offset = [], 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is not None:
+                events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class DirectoryPoller:
+    """按目录 mtime 增量轮询，只列出 mtime 变化的目录"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._dirs: Dict[str, Tuple[int, List[str]]] = {}  # 目录 -> (mtime_ns, 子目录)
+
+    def poll(self) -> List[str]:
+        """返回 mtime 变化（含首次发现）的目录中的全部文件"""
+        files = []
+        stack, seen = [self.root], set()
+        while stack:
+            directory = stack.pop()
+            seen.add(directory)
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            cached = self._dirs.get(directory)
+            if cached is not None and cached[0] == mtime:
+                stack.extend(cached[1])
+                continue
+            subdirs = []
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append(entry.path)
+            except OSError as e:
+                logger.warning(f"列出目录 {directory} 失败: {e}")
+                continue
+            self._dirs[directory] = (mtime, subdirs)
+            stack.extend(subdirs)
+        # 已删除的目录
+        for directory in set(self._dirs) - seen:
+            del self._dirs[directory]
+        return files
+
+    @property
+    def dir_count(self) -> int:
+        return len(self._dirs)
+
+
+class FileWatcher:
+    """
+    目录监控服务：inotify 事件 + 自适应间隔轮询，候选文件批量交给 ingest 处理
+    ingest 返回仍留在目录中、需要稍后重试的文件（如尚未写完），下一轮连同新文件一起再次处理
+    轮询发现了 inotify 没有报告的文件时间隔缩短到最小值，否则逐次翻倍直到最大值
+    """
+
+    def __init__(self, root: str = None, ingest: Callable[[Iterable[str]], List[str]] = None):
+        self._root = root
+        self._ingest = ingest
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify: Optional[Inotify] = None
+        self._poller: Optional[DirectoryPoller] = None
+        self._retry: Set[str] = set()
+        self.poll_interval = ehp_config.MONITOR_POLL_MIN_INTERVAL
+        self.last_poll_at = None
+
+    @property
+    def root(self) -> str:
+        if self._root is None:
+            from gylmodules.eye_hospital_pacs.monitor_new_files import SOURCE_DIR
+            self._root = SOURCE_DIR
+        return self._root
+
+    def ingest(self, paths: Iterable[str]) -> List[str]:
+        if self._ingest is None:
+            from gylmodules.eye_hospital_pacs.monitor_new_files import ingest_paths
+            self._ingest = ingest_paths
+        return self._ingest(paths)
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._stop.clear()
+        self._poller = DirectoryPoller(self.root)
+        # 上次运行时尚未处理完的文件
+        self._retry = set(scan_index.pending_paths())
+        stability_tracker.mark_startup(self._retry)
+        try:
+            self._inotify = Inotify()
+            self._inotify.add_tree(self.root)
+            logger.info(f"inotify 监听 {self.root}，目录数 {self._inotify.watch_count}")
+        except (OSError, AttributeError) as e:
+            # 非 Linux（libc 没有 inotify_init1）或 inotify 不可用，只靠轮询
+            logger.warning(f"inotify 不可用，使用轮询监控 {self.root}: {e}")
+            self._inotify = None
+        self._thread = threading.Thread(target=self._run, name='ehp-file-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """停止监控，inotify 句柄由监控线程退出时关闭"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _wait_events(self, timeout: float) -> Tuple[Set[str], bool]:
+        """等待 inotify 事件，收到事件后再等 MONITOR_EVENT_DEBOUNCE 秒把同一批写入的文件合并处理"""
+        if self._inotify is None:
+            self._stop.wait(timeout)
+            return set(), False
+        candidates, rescan = set(), False
+        events = self._inotify.read(timeout)
+        while events:
+            for path, mask in events:
+                if path is None:
+                    logger.warning("inotify 事件队列溢出，执行一次全量轮询")
+                    rescan = True
+                elif mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # 新建 / 移入的目录：加入监听，目录内已有的文件由轮询补上
+                        self._inotify.add_tree(path)
+                        rescan = True
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    candidates.add(path)
+            events = self._inotify.read(ehp_config.MONITOR_EVENT_DEBOUNCE)
+        return candidates, rescan
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    def _loop(self):
+        next_poll = 0.0
+        while not self._stop.is_set():
+            try:
+                # 单次等待不超过 1 秒，stop 后及时退出
+                timeout = min(max(next_poll - time.monotonic(), 0.0), 1.0)
+                if self._retry:
+                    timeout = min(timeout, ehp_config.MONITOR_RETRY_INTERVAL)
+                # 处理失败的文件按扫描索引中的重试时间退避，到期后重新交给入库流程
+                retry_at = scan_index.next_retry_at()
+                if retry_at is not None:
+                    timeout = min(timeout, max(retry_at - time.time(), 0.0))
+                candidates, rescan = self._wait_events(timeout)
+                if candidates:
+                    MONITOR_FILES.inc('event', amount=len(candidates))
+
+                if rescan or time.monotonic() >= next_poll:
+                    first_poll = self.last_poll_at is None
+                    with measure(MONITOR_SECONDS, 'poll'):
+                        polled = set(self._poller.poll())
+                    self.last_poll_at = time.time()
+                    # 首次轮询返回的是启动前已有的文件，不算作遗漏，写入完成判断可按 mtime 倒推
+                    if first_poll:
+                        stability_tracker.mark_startup(polled - candidates)
+                    missed = set() if first_poll else polled - candidates - self._retry
+                    if missed:
+                        MONITOR_FILES.inc('poll', amount=len(missed))
+                    # 索引中的待处理、已隔离文件一起交给入库流程，由扫描索引判断是否需要处理
+                    candidates |= polled | set(scan_index.pending_paths(include_quarantined=True))
+                    if missed:
+                        self.poll_interval = ehp_config.MONITOR_POLL_MIN_INTERVAL
+                    elif not first_poll:
+                        # 只靠轮询时轮询就是唯一来源，间隔上限更小
+                        max_interval = ehp_config.MONITOR_POLL_MAX_INTERVAL if self._inotify is not None \
+                            else ehp_config.MONITOR_POLL_ONLY_MAX_INTERVAL
+                        self.poll_interval = min(self.poll_interval * 2, max_interval)
+                    next_poll = time.monotonic() + self.poll_interval
+
+                if retry_at is not None and time.time() >= retry_at:
+                    candidates |= set(scan_index.pending_paths())
+                candidates |= self._retry
+                if candidates:
+                    self._retry = set(self.ingest(sorted(candidates)))
+            except Exception as e:
+                logger.error(f"目录监控异常: {e}")
+                self._stop.wait(ehp_config.MONITOR_RETRY_INTERVAL)
+
+    def status(self) -> Dict:
+        return {"running": self.is_running, "root": self.root,
+                "mode": "inotify" if self._inotify is not None else "poll",
+                "watched_dirs": self._inotify.watch_count if self._inotify is not None else 0,
+                "polled_dirs": self._poller.dir_count if self._poller is not None else 0,
+                "poll_interval": self.poll_interval, "retry_files": len(self._retry),
+                "tracked_files": stability_tracker.tracked_count, "index": scan_index.stats(),
+                "quarantined": scan_index.quarantined(20),
+                "last_poll_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_poll_at))
+                if self.last_poll_at else None}
+
+
+file_watcher = FileWatcher()
@@ -0,0 +1,12 @@
+-- ehp_reports 解析任务领取（租约）字段，见 report_claims.py
+-- 部署新版本前由有 ALTER 权限的账号执行一次：mysql -u root -p nsyy_gyl < 001_ehp_reports_parse_claims.sql
+
+ALTER TABLE nsyy_gyl.ehp_reports
+    ADD COLUMN parse_status TINYINT NOT NULL DEFAULT 0 COMMENT '解析状态 0 待解析 1 解析中 2 已完成 3 失败',
+    ADD COLUMN claimed_by VARCHAR(128) NULL COMMENT '领取解析任务的实例',
+    ADD COLUMN lease_expires DATETIME NULL COMMENT '解析租约到期时间',
+    ADD COLUMN parse_attempts INT NOT NULL DEFAULT 0 COMMENT '解析尝试次数',
+    ADD INDEX idx_parse_status (parse_status, lease_expires);
+
+-- 历史已解析的报告直接标记为完成
+UPDATE nsyy_gyl.ehp_reports SET parse_status = 2 WHERE report_value IS NOT NULL;
@@ -1,12 +1,26 @@
-# 每 10 s扫描一次共享目录，将新文件移动到指定目录
+# 共享目录中的新文件移动到指定目录并入库（由 file_watcher 实时触发，/monitor_task 全量扫描兜底）
 # 根据文件代码，重命名文件名字
 import logging
 import os
+import threading
 import time
 import shutil
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Iterable, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 from gylmodules import global_config, global_tools
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.device_rules import device_rules
+from gylmodules.eye_hospital_pacs.ehp_metrics import measure, MONITOR_SECONDS, MONITOR_FILES
+from gylmodules.eye_hospital_pacs.file_stability import stability_tracker, open_files_under
+from gylmodules.eye_hospital_pacs.file_watcher import DirectoryPoller
+from gylmodules.eye_hospital_pacs.scan_index import scan_index
 from gylmodules.utils.db_utils import DbUtil
 
 
@@ -20,49 +34,6 @@ DEST_BASE_DIR = "/Users/gaoyanliang/nsyy/eye-pacs/gylmodules/eye_hospital_pacs/2
     if global_config.run_in_local else "/home/nsyy/pdf-report-catalog"  # 目标基础目录
 CHECK_INTERVAL = 20  # 检查间隔（秒）
 
-MAX_RETRIES = 3  # 最大重试次数
-FILE_STABILITY_CHECK_INTERVAL = 1  # 文件稳定性检查间隔（秒）
-FILE_STABILITY_CHECKS = 3  # 文件稳定性检查次数
-
-
-"""检查文件是否被其他进程锁定（Linux系统）"""
-
-
-def is_file_locked(filepath):
-    import subprocess
-    try:
-        output = subprocess.check_output(['lsof', filepath], stderr=subprocess.PIPE)
-        return bool(output)
-    except subprocess.CalledProcessError:
-        return False
-    except Exception:
-        # 如果lsof不可用，则跳过锁定检查
-        return False
-
-
-"""改进的文件稳定性检查"""
-
-
-def is_file_stable(filepath):
-    sizes, mtimes = [], []
-    for _ in range(FILE_STABILITY_CHECKS):
-        try:
-            sizes.append(os.path.getsize(filepath))
-            mtimes.append(os.path.getmtime(filepath))
-            time.sleep(FILE_STABILITY_CHECK_INTERVAL)
-        except OSError:
-            return False
-
-    # 检查文件大小和修改时间是否稳定
-    if len(set(sizes)) != 1 or len(set(mtimes)) != 1:
-        return False
-
-    # 检查文件是否被锁定
-    if is_file_locked(filepath):
-        return False
-
-    return True
-
 
 def get_dated_subdir():
     """获取当天日期的子目录路径，如果不存在则创建"""
@@ -80,8 +51,8 @@ def ensure_dirs_exist():
     logger.debug(f"目标基础目录: {DEST_BASE_DIR}")
 
 
-def process_file(src_rel_path, retry_count=0):
-    """处理文件：保持原始目录结构，移动到当天日期的子目录"""
+def process_file(src_rel_path):
+    """处理文件：保持原始目录结构，移动到当天日期的子目录（调用方已确认文件写入完成）"""
     try:
         # 源文件完整路径
         src_full_path = os.path.join(SOURCE_DIR, src_rel_path)
@@ -89,79 +60,24 @@ def process_file(src_rel_path, retry_count=0):
         # 基础检查
         if not os.path.exists(src_full_path):
             logger.warning(f"文件不存在: {src_full_path}")
-            return False, ''
-
-        # 检查文件稳定性
-        if not is_file_stable(src_full_path):
-            if retry_count < MAX_RETRIES:
-                logger.warning(f"文件不稳定，将重试({retry_count+1}/{MAX_RETRIES}): {src_full_path}")
-                time.sleep(5)  # 等待更长时间再重试
-                return process_file(src_rel_path, retry_count + 1)
-            else:
-                logger.warning(f"文件仍不稳定，放弃处理: {src_full_path}")
-                return False, ''
+            MONITOR_FILES.inc('missing')
+            return False, "文件不存在"
 
         # 分离文件名和扩展名
         dirname, filename = os.path.split(src_rel_path)
         basename, ext = os.path.splitext(filename)
         date_str = datetime.now().strftime("%Y%m%d%H%M%S")
-        machine = '未收录设备'
-        if str(ext).lower().__contains__('pdf'):
-            if filename.startswith("21") or filename.startswith("23"):
-                basename = "角膜内皮细胞报告"
-                machine = "角膜内皮显微镜"
-            elif filename.startswith("22"):
-                basename = "角膜内皮细胞报告2"
-                machine = "角膜内皮显微镜"
-            elif filename.startswith("31") or filename.startswith("32"):
-                basename = "角膜地形图"
-                machine = "角膜地形图仪Medmont"
-            elif (filename.startswith("41") or filename.startswith("42") or filename.startswith("43")
-                  or filename.startswith("44")):
-                basename = "眼表综合检查报告"
-                machine = "角膜地形图仪"
-            elif (filename.startswith("51r") or filename.startswith("51R")
-                      or filename.__contains__("4 Maps Refr")):
-                basename = "屈光四图-右"
-                machine = "眼前节分析仪"
-            elif (filename.startswith("51l") or filename.startswith("51L")
-                      or filename.__contains__("4 Maps Refr")):
-                basename = "屈光四图-左"
-                machine = "眼前节分析仪"
-            elif (filename.startswith("52r") or filename.startswith("52R")):
-                basename = "屈光六图-右"
-                machine = "眼前节分析仪"
-            elif (filename.startswith("52l") or filename.startswith("52L")):
-                basename = "屈光六图-左"
-                machine = "眼前节分析仪"
-            elif (filename.startswith("53r") or filename.startswith("53R")):
-                basename = "Scheimpflug图像总览-右"
-                machine = "眼前节分析仪"
-            elif (filename.startswith("53l") or filename.startswith("53L")):
-                basename = "Scheimpflug图像总览-左"
-                machine = "眼前节分析仪"
-            elif (filename.startswith("54r") or filename.startswith("54R")):
-                basename = "比较两次检查-右"
-                machine = "眼前节分析仪"
-            elif (filename.startswith("54l") or filename.startswith("54L")):
-                basename = "比较两次检查-左"
-                machine = "眼前节分析仪"
-            elif  (filename.startswith("6r") or filename.startswith("6R")):
-                basename = "生物力学-右"
-                machine = "非接触式眼压计"
-            elif (filename.startswith("6l") or filename.startswith("6L")):
-                basename = "生物力学-左"
-                machine = "非接触式眼压计"
-            elif filename.startswith("7"):
-                basename = "眼底照片"
-                machine = "眼底照相机"
-        new_filename = f"{basename}_{date_str}{ext}"
-        # 阿玛仕设备特殊判断
-        if basename.__contains__('_'):
-            part = basename.split('_')
-            if part and len(part) == 4 and len(part[0]) == 10:
-                new_filename = f"Master700_{basename}{ext}"
-                machine = "蔡司Master700"
+        # 按设备分类规则（ehp_config.DEVICE_RULES）识别报告类型，未收录的设备保留原文件名
+        rule = device_rules.classify(filename) if str(ext).lower().__contains__('pdf') else None
+        if rule is None:
+            new_filename = f"{basename}_{date_str}{ext}"
+            machine = '未收录设备'
+        elif rule.keep_name:
+            new_filename = f"{rule.full_report_name}_{basename}{ext}"
+            machine = rule.device
+        else:
+            new_filename = f"{rule.full_report_name}_{date_str}{ext}"
+            machine = rule.device
 
         # 获取当天日期目录
         dated_dir = get_dated_subdir()
@@ -173,70 +89,158 @@ def process_file(src_rel_path, retry_count=0):
         os.makedirs(dest_dir, exist_ok=True)
 
         # 移动文件
-        shutil.move(src_full_path, dest_full_path)
+        with measure(MONITOR_SECONDS, 'move'):
+            shutil.move(src_full_path, dest_full_path)
         logger.debug(f"文件已移动: {src_rel_path} -> {dated_dir}/{dirname}/{new_filename}")
+        MONITOR_FILES.inc('moved')
         return True, (new_filename, dest_full_path.replace('/', '&'), datetime.now().strftime("%Y-%m-%d %H:%M:%S"), machine)
 
     except Exception as e:
         logger.error(f"处理文件 {src_rel_path} 失败: {e}")
-        return False, ''
+        MONITOR_FILES.inc('failed')
+        return False, str(e)
+
+
+def insert_reports(process_file_list):
+    """
+    报告入库，逐条插入以拿到每条记录的 report_id（单条失败会回滚，因此逐条提交）
+    :param process_file_list: [(report_name, report_addr, report_time, report_machine)]
+    :return: 入库成功的报告 [{report_id, report_name, report_addr, report_time, report_machine}]
+    """
+    insert_sql = """INSERT INTO nsyy_gyl.ehp_reports 
+                    (report_name, report_addr, report_time, report_machine) 
+                    VALUES (%s, %s, %s, %s)"""
+    db = DbUtil(global_config.DB_HOST, global_config.DB_USERNAME, global_config.DB_PASSWORD,
+                global_config.DB_DATABASE_GYL)
+    new_reports = []
+    with measure(MONITOR_SECONDS, 'insert'):
+        for row in process_file_list:
+            report_id = db.execute(insert_sql, args=row, need_commit=True)
+            if report_id and report_id > 0:
+                new_reports.append(dict(zip(('report_name', 'report_addr', 'report_time', 'report_machine'), row),
+                                        report_id=report_id))
+    del db
+    return new_reports
+
+
+# 同一文件可能同时由目录监控服务和 /monitor_task 全量扫描发现，入库流程串行执行；
+# 进程内用线程锁，同一台机器上的多个进程（开发模式 reloader、多实例部署）之间再加文件锁，避免重复移动和重复入库
+_ingest_lock = threading.Lock()
+
+
+@contextmanager
+def _ingest_guard():
+    with _ingest_lock:
+        if fcntl is None:  # Windows 开发环境
+            yield
+            return
+        os.makedirs(os.path.dirname(ehp_config.MONITOR_INGEST_LOCK_PATH), exist_ok=True)
+        with open(ehp_config.MONITOR_INGEST_LOCK_PATH, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ingest_paths(paths: Iterable[str]) -> List[str]:
+    """
+    处理候选文件（绝对路径）：清理 .dcm.upt 临时文件，PDF 重命名移动到当天日期目录，入库并投递解析
+    尚未写完（签名未稳定或仍被打开）的文件不等待，直接留给下一轮；处理失败的文件由扫描索引按退避时间安排重试
+    :return: 尚未写完、仍留在监控目录、需要稍后重新检查的文件
+    """
+    with _ingest_guard():
+        candidates = []
+        for src_path in paths:
+            filename = os.path.basename(src_path)
+            # 添加删除功能
+            if filename.endswith('.dcm.upt'):
+                try:
+                    os.remove(src_path)
+                except Exception as e:
+                    pass
+                continue
+
+            if str(filename).startswith('.') or not str(filename).endswith('pdf'):
+                continue
+            candidates.append(src_path)
+        # 跳过已隔离的问题文件
+        candidates = scan_index.select(candidates)
+
+        # 全部候选文件一次检查，不阻塞等待
+        with measure(MONITOR_SECONDS, 'stability'):
+            ready, remaining = stability_tracker.check(candidates)
+        # 签名已稳定的文件再确认没有进程仍以写方式打开（整个目录查一次，而不是每个文件一次 lsof）
+        if ready:
+            with measure(MONITOR_SECONDS, 'open_files'):
+                opened = open_files_under(SOURCE_DIR)
+            if opened:
+                remaining.extend(src_path for src_path in ready if os.path.realpath(src_path) in opened)
+                ready = [src_path for src_path in ready if os.path.realpath(src_path) not in opened]
+        if remaining:
+            MONITOR_FILES.inc('pending', amount=len(remaining))
 
+        process_file_list = []
+        for src_path in ready:
+            rel_path = os.path.relpath(src_path, SOURCE_DIR)
+
+            try:
+                ret, path = process_file(rel_path)
+                if ret:
+                    stability_tracker.forget(src_path)
+                    scan_index.remove(src_path)
+                    process_file_list.append(path)
+                else:
+                    _record_failure(src_path, path)
+            except Exception as e:
+                logger.error(f"处理文件异常: {rel_path} - {str(e)}")
+                _record_failure(src_path, str(e))
 
-def monitor_directory():
-    """监控目录及其子目录（改进版）"""
-    ensure_dirs_exist()
-    current_dated_dir = get_dated_subdir()
-    last_check_date = datetime.now().date()
+        if process_file_list:
+            new_reports = insert_reports(process_file_list)
+            # 新报告直接投递到解析队列，无需等待定时扫描
+            from gylmodules.eye_hospital_pacs.parse_service import submit_new_reports
+            submit_new_reports(new_reports)
+        return remaining
 
-    try:
-        start_time = time.time()
-        # 获取当前日期并检查是否变化
-        now = datetime.now()
-        if now.date() != last_check_date:
-            new_dated_dir = get_dated_subdir()
-            logger.debug(f"日期变化，新日期目录: {new_dated_dir}")
-            current_dated_dir = new_dated_dir
-            last_check_date = now.date()
-
-        # 处理所有现有文件（包括新文件和之前遗留的）
-        processed_count = 0
-        process_file_list = []
-        for root, _, files in os.walk(SOURCE_DIR):
-            for filename in files:
-                # 添加删除功能
-                if filename.endswith('.dcm.upt'):
-                    try:
-                        src_path = os.path.join(root, filename)
-                        os.remove(src_path)
-                    except Exception as e:
-                        pass
-                    continue
-
-                if str(filename).startswith('.') or not str(filename).endswith('pdf'):
-                    continue
-                src_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(src_path, SOURCE_DIR)
 
-                try:
-                    ret, path = process_file(rel_path)
-                    if ret:
-                        processed_count += 1
-                        process_file_list.append(path)
-                    else:
-                        logger.warning(f"文件处理失败，将重试: {rel_path}")
-                except Exception as e:
-                    logger.error(f"处理文件异常: {rel_path} - {str(e)}")
+def _record_failure(src_path: str, error: str):
+    """记录处理失败，到期后由扫描索引的 pending_paths 重新交给入库流程，连续失败达到上限的文件隔离"""
+    if not os.path.exists(src_path):
+        scan_index.remove(src_path)
+        stability_tracker.forget(src_path)
+        return
+    if scan_index.record_failure(src_path, error or '处理失败'):
+        logger.error(f"文件连续处理失败 {scan_index.max_attempts} 次，已隔离: {src_path} - {error}")
+        MONITOR_FILES.inc('quarantined')
+        stability_tracker.forget(src_path)
+        return
+    logger.warning(f"文件处理失败，将重试: {src_path} - {error}")
 
 
-        if process_file_list:
-            # 批量插入数据库
-            insert_sql = """INSERT INTO nsyy_gyl.ehp_reports 
-                            (report_name, report_addr, report_time, report_machine) 
-                            VALUES (%s, %s, %s, %s)"""
-            db = DbUtil(global_config.DB_HOST, global_config.DB_USERNAME, global_config.DB_PASSWORD,
-                        global_config.DB_DATABASE_GYL)
-            db.execute_many(insert_sql, args=process_file_list, need_commit=True)
-            del db
+_poller = None
+
+
+def monitor_directory():
+    """
+    扫描监控目录及其子目录（目录监控服务 file_watcher 之外的手动 / 兜底触发）
+    只列出 mtime 有变化的目录，连同索引中尚未处理完的文件一起处理
+    """
+    global _poller
+    ensure_dirs_exist()
+
+    try:
+        scan_start = time.perf_counter()
+        first_scan = _poller is None
+        if first_scan:
+            _poller = DirectoryPoller(SOURCE_DIR)
+        polled = _poller.poll()
+        if first_scan:
+            # 首次扫描到的文件是启动前已有的文件，写入完成判断可按 mtime 倒推
+            stability_tracker.mark_startup(polled)
+        paths = set(polled) | set(scan_index.pending_paths(include_quarantined=True))
+        MONITOR_SECONDS.observe(time.perf_counter() - scan_start, 'scan')
+        ingest_paths(sorted(paths))
     except KeyboardInterrupt:
         logger.error("监控程序已正常停止")
     except Exception as e:
@@ -0,0 +1,168 @@
+# OCR 推理后端
+#   paddle: Paddle Inference，有 GPU 时使用 GPU（可选 TensorRT），否则 CPU
+#   onnx:   ONNX Runtime CPU 推理，det / rec 模型由 Paddle 推理模型转换而来，可选 int8 动态量化
+# 两种后端都通过 PaddleOCR 构建（use_onnx=True 时由 PaddleOCR 创建 onnxruntime 会话），
+# 对外接口（text_detector / text_recognizer / ocr）一致，OCRProcessor 无需区分
+# 模型转换（需安装 paddle2onnx、onnxruntime）：
+#   python -m gylmodules.eye_hospital_pacs.ocr_backends export --int8
+# 对比 Paddle CPU：
+#   python -m gylmodules.eye_hospital_pacs.ocr_benchmark --cpu --out paddle_cpu.json
+#   python -m gylmodules.eye_hospital_pacs.ocr_benchmark --backend onnx --int8 --baseline paddle_cpu.json
+
+import argparse
+import os
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+from gylmodules import global_config
+from gylmodules.eye_hospital_pacs import ehp_config
+
+
+def model_profile(name: str = None) -> Dict:
+    name = name or ehp_config.OCR_MODEL
+    if name not in ehp_config.OCR_MODEL_PROFILES:
+        raise ValueError(f"未知的 OCR 模型 {name}，可选 {list(ehp_config.OCR_MODEL_PROFILES)}")
+    return ehp_config.OCR_MODEL_PROFILES[name]
+
+
+def paddle_model_dir(model: str) -> str:
+    return os.path.join(ehp_config.OCR_MODEL_ROOT, model)
+
+
+def onnx_model_path(model: str, int8: bool = None) -> str:
+    int8 = ehp_config.OCR_ONNX_INT8 if int8 is None else int8
+    return os.path.join(ehp_config.OCR_ONNX_MODEL_DIR, f"{model}{'.int8' if int8 else ''}.onnx")
+
+
+_gpu_available = None
+
+
+def use_gpu() -> bool:
+    """OCR_USE_GPU 为 None 时自动检测：Paddle 编译了 CUDA 且能找到显卡才使用 GPU"""
+    global _gpu_available
+    if ehp_config.OCR_USE_GPU is not None:
+        return bool(ehp_config.OCR_USE_GPU)
+    if _gpu_available is None:
+        try:
+            import paddle
+            _gpu_available = paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
+        except Exception:
+            _gpu_available = False
+    return _gpu_available
+
+
+def create_paddle_engine(profile: str = None):
+    """
+    构建 Paddle Inference 推理的 PaddleOCR 引擎，det / rec 模型目录与 ONNX 后端一样取自 OCR_MODEL_PROFILES，
+    基准测试 --model 对两种后端选择的是同一个模型
+    """
+    from paddleocr import PaddleOCR
+
+    profile = model_profile(profile)
+    common = dict(
+        lang='ch', show_log=False, cls_model_dir=None, use_angle_cls=False,  # 禁用方向分类（PDF通常方向固定）
+        det_model_dir=paddle_model_dir(profile['det']), rec_model_dir=paddle_model_dir(profile['rec']),
+        rec_char_dict_path=os.path.join(ehp_config.OCR_MODEL_ROOT, 'ppocr_keys_v1.txt'),
+        rec_algorithm=profile['rec_algorithm'], rec_image_shape=profile['rec_image_shape'],
+    )
+    if global_config.run_in_local:
+        return PaddleOCR(use_gpu=False, enable_mkldnn=False, **common)
+    return PaddleOCR(
+        # 硬件配置
+        use_gpu=use_gpu(), gpu_mem=7000,  # 7GB显存限制
+
+        # ===== 性能优化 =====
+        det_limit_side_len=2048,  # 提高分辨率适应高清扫描件
+        rec_batch_num=8,  # 增大批次（RTX 4060显存充足）
+        use_tensorrt=use_gpu(),  # 启用TensorRT加速（RTX 40系列支持）
+
+        # ===== 质量参数 =====
+        det_db_score_mode="fast",  # 快速检测模式
+        use_mp=True,  # 启用多进程
+        total_process_num=4,  # 6进程（根据CPU核心数调整）
+
+        # ===== 高级优化 =====
+        enable_mkldnn=False,  # 禁用Intel加速（GPU优先）
+        cpu_threads=4,  # CPU线程数（若GPU满载可辅助）
+        det_algorithm='DB',  # 使用DB算法（默认最优）
+        **common,
+    )
+
+
+def create_onnx_engine(profile: str = None, int8: bool = None):
+    """构建 ONNX Runtime CPU 推理的 PaddleOCR 引擎"""
+    from paddleocr import PaddleOCR
+
+    profile = model_profile(profile)
+    det_path, rec_path = onnx_model_path(profile['det'], int8), onnx_model_path(profile['rec'], int8)
+    for path in (det_path, rec_path):
+        if not os.path.exists(path):
+            raise Exception(f"ONNX 模型 {path} 不存在，请先执行 python -m gylmodules.eye_hospital_pacs.ocr_backends export")
+    engine = PaddleOCR(
+        lang='ch', use_onnx=True, use_gpu=False, show_log=False,
+        det_model_dir=det_path, rec_model_dir=rec_path, cls_model_dir=None, use_angle_cls=False,
+        rec_char_dict_path=os.path.join(ehp_config.OCR_MODEL_ROOT, 'ppocr_keys_v1.txt'),
+        rec_algorithm=profile['rec_algorithm'], rec_image_shape=profile['rec_image_shape'],
+        det_limit_side_len=ehp_config.OCR_MOSAIC_MAX_HEIGHT, rec_batch_num=8, det_db_score_mode="fast",
+    )
+    # PaddleOCR 创建的 onnxruntime 会话使用默认线程数（全部核心），多引擎 / 多进程时会互相争抢，按配置重建会话
+    _limit_session_threads(engine.text_detector, det_path)
+    _limit_session_threads(engine.text_recognizer, rec_path)
+    return engine
+
+
+def _limit_session_threads(predictor_owner, model_path: str):
+    try:
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ehp_config.OCR_CPU_THREADS
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        predictor_owner.predictor = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+    except Exception as e:
+        print(datetime.now(), f"设置 onnxruntime 线程数失败，使用默认会话: {e}")
+
+
+def export_onnx(profile: str = None, int8: bool = False, opset: int = 11) -> Dict[str, str]:
+    """
+    Paddle 推理模型转换为 ONNX，可选再做 int8 动态量化（权重量化，无需校准数据）
+    :return: {模型名: onnx 文件路径}
+    """
+    profile = model_profile(profile)
+    os.makedirs(ehp_config.OCR_ONNX_MODEL_DIR, exist_ok=True)
+    exported = {}
+    for model in (profile['det'], profile['rec']):
+        fp32_path = onnx_model_path(model, False)
+        if not os.path.exists(fp32_path):
+            subprocess.check_call(['paddle2onnx', '--model_dir', paddle_model_dir(model),
+                                   '--model_filename', 'inference.pdmodel', '--params_filename', 'inference.pdiparams',
+                                   '--save_file', fp32_path, '--opset_version', str(opset),
+                                   '--enable_onnx_checker', 'True'])
+            print(datetime.now(), f"已导出 {fp32_path}")
+        exported[model] = fp32_path
+        if int8:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            int8_path = onnx_model_path(model, True)
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+            print(datetime.now(), f"已量化 {int8_path}")
+            exported[model] = int8_path
+    return exported
+
+
+def main(argv=None) -> Optional[int]:
+    parser = argparse.ArgumentParser(description='OCR 推理后端工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='Paddle 推理模型转换为 ONNX')
+    export.add_argument('--model', default=None, help=f'模型，可选 {list(ehp_config.OCR_MODEL_PROFILES)}')
+    export.add_argument('--int8', action='store_true', help='同时生成 int8 动态量化模型')
+    export.add_argument('--opset', type=int, default=11)
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        export_onnx(args.model, args.int8, args.opset)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
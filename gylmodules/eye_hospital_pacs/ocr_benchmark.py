@@ -0,0 +1,244 @@
+# 报告解析基准测试（准确率 + 吞吐量）
+# 语料目录结构：
+#   <corpus>/<template_id>/<报告文件名>.pdf    文件名与生产环境一致（模板按文件名匹配）
+#   <corpus>/<template_id>/<报告文件名>.json   期望字段值，如 {"name": "白雪", "r_al": "23.41", "l_al": "23.38"}
+# 默认语料 benchmark_corpus/ 为 synthetic_corpus 生成的合成报告（每个模板一份，随仓库提交），开箱即可运行；
+# 真实患者报告含隐私信息，不入库，按同样的结构在本地准备后用 --corpus 指定
+# 用法：
+#   python -m gylmodules.eye_hospital_pacs.ocr_benchmark --corpus <目录> --out result.json --cpu
+#   python -m gylmodules.eye_hospital_pacs.ocr_benchmark --baseline last.json --max-accuracy-drop 0
+#   python -m gylmodules.eye_hospital_pacs.ocr_benchmark --backend onnx --int8 --baseline paddle_cpu.json  # 与 Paddle CPU 对比
+# 默认关闭 OCR 结果缓存；--baseline 指定上一次结果时，字段准确率下降超过阈值则以非 0 状态退出
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from gylmodules.eye_hospital_pacs import ehp_config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def load_corpus(corpus_dir: str, templates: List[str] = None) -> List[Tuple[str, str, Dict]]:
+    """加载语料，返回 [(template_id, pdf 路径, 期望字段)]，缺少期望文件的 PDF 只统计吞吐量"""
+    samples = []
+    for template_id in sorted(os.listdir(corpus_dir)):
+        template_dir = os.path.join(corpus_dir, template_id)
+        if not os.path.isdir(template_dir) or (templates and template_id not in templates):
+            continue
+        for file_name in sorted(os.listdir(template_dir)):
+            if not file_name.lower().endswith('.pdf'):
+                continue
+            pdf_path = os.path.join(template_dir, file_name)
+            expected = {}
+            expected_path = os.path.splitext(pdf_path)[0] + '.json'
+            if os.path.exists(expected_path):
+                with open(expected_path, 'r', encoding='utf-8') as f:
+                    expected = json.load(f)
+            samples.append((template_id, pdf_path, expected))
+    return samples
+
+
+_BLANK = re.compile(r'\s+')
+
+
+def normalize_value(value) -> str:
+    """比较前去掉空白，统一全角冒号"""
+    return _BLANK.sub('', str(value if value is not None else '')).replace('：', ':')
+
+
+def percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64)
+    return {"count": int(values.size), "total": round(float(values.sum()), 4),
+            "mean": round(float(values.mean()), 4), "p50": round(float(np.percentile(values, 50)), 4),
+            "p95": round(float(np.percentile(values, 95)), 4), "max": round(float(values.max()), 4)}
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    if resource is None:
+        return -1.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def count_pages(pdf_path: str) -> int:
+    import fitz  # PyMuPDF
+    try:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+
+def run_benchmark(corpus_dir: str, batch_size: int = 1, repeat: int = 1, templates: List[str] = None) -> Dict:
+    from gylmodules.eye_hospital_pacs import pdf_ocr_analysis
+    from gylmodules.eye_hospital_pacs.ocr_backends import use_gpu
+    from gylmodules.eye_hospital_pacs.ehp_metrics import StageRecorder, add_observer, remove_observer
+
+    if not os.path.isdir(corpus_dir):
+        raise FileNotFoundError(f"语料目录 {corpus_dir} 不存在：用 --corpus 指定本地语料，"
+                                f"或执行 python -m gylmodules.eye_hospital_pacs.synthetic_corpus --out {corpus_dir} 生成合成语料")
+    samples = load_corpus(corpus_dir, templates)
+    if not samples:
+        raise Exception(f"语料目录 {corpus_dir} 中没有 PDF")
+    pages = sum(count_pages(pdf_path) for _, pdf_path, _ in samples)
+
+    # 引擎加载、预热不计入耗时
+    warm_up_start = time.perf_counter()
+    pdf_ocr_analysis.ocr_engine_pool.warm_up()
+    warm_up_seconds = time.perf_counter() - warm_up_start
+
+    recorder = StageRecorder()
+    add_observer(recorder)
+    latencies, outputs = [], {}
+    start_time = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            for i in range(0, len(samples), batch_size):
+                batch = samples[i:i + batch_size]
+                batch_start = time.perf_counter()
+                parsed = pdf_ocr_analysis.analysis_pdf_batch([pdf_path for _, pdf_path, _ in batch])
+                latencies.append(time.perf_counter() - batch_start)
+                for (_, pdf_path, _), (_, values) in zip(batch, parsed):
+                    outputs[pdf_path] = values
+    finally:
+        remove_observer(recorder)
+    elapsed = time.perf_counter() - start_time
+
+    # 字段准确率（按字段、按模板）
+    fields, per_template, mismatches = {}, {}, []
+    for template_id, pdf_path, expected in samples:
+        values = outputs.get(pdf_path) or {}
+        for field, expected_value in expected.items():
+            correct = normalize_value(values.get(field)) == normalize_value(expected_value)
+            for stats in (fields.setdefault(field, [0, 0]), per_template.setdefault(template_id, [0, 0])):
+                stats[0] += int(correct)
+                stats[1] += 1
+            if not correct:
+                mismatches.append({"file": os.path.relpath(pdf_path, corpus_dir), "field": field,
+                                   "expected": expected_value, "actual": values.get(field)})
+    correct_total = sum(correct for correct, _ in fields.values())
+    field_total = sum(total for _, total in fields.values())
+
+    reports = len(samples) * repeat
+    return {
+        "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {"corpus": os.path.abspath(corpus_dir), "batch_size": batch_size, "repeat": repeat,
+                   "backend": ehp_config.OCR_BACKEND, "model": ehp_config.OCR_MODEL,
+                   "int8": ehp_config.OCR_ONNX_INT8 if ehp_config.OCR_BACKEND == 'onnx' else False,
+                   "use_gpu": use_gpu() if ehp_config.OCR_BACKEND == 'paddle' else False,
+                   "cache": ehp_config.OCR_CACHE_ENABLED,
+                   "text_layer": ehp_config.PDF_TEXT_LAYER_ENABLED, "adaptive_dpi": ehp_config.OCR_ADAPTIVE_DPI,
+                   "render_gray": ehp_config.OCR_RENDER_GRAY},
+        "throughput": {"reports": reports, "pages": pages * repeat, "seconds": round(elapsed, 3),
+                       "reports_per_sec": round(reports / elapsed, 3) if elapsed else 0.0,
+                       "pages_per_sec": round(pages * repeat / elapsed, 3) if elapsed else 0.0,
+                       "warm_up_seconds": round(warm_up_seconds, 3), "peak_rss_mb": peak_rss_mb()},
+        "latency": percentiles(latencies),
+        "stages": {stage: percentiles(values) for stage, values in sorted(recorder.samples.items())},
+        "accuracy": {
+            "overall": round(correct_total / field_total, 4) if field_total else None,
+            "fields": {field: {"correct": c, "total": t, "accuracy": round(c / t, 4)}
+                       for field, (c, t) in sorted(fields.items())},
+            "templates": {template_id: {"correct": c, "total": t, "accuracy": round(c / t, 4)}
+                          for template_id, (c, t) in sorted(per_template.items())},
+        },
+        "mismatches": mismatches,
+    }
+
+
+def compare_with_baseline(result: Dict, baseline: Dict, max_drop: float) -> List[str]:
+    """与基线比较字段准确率，返回下降超过阈值的字段"""
+    regressions = []
+    current = result["accuracy"]["fields"]
+    for field, stats in baseline.get("accuracy", {}).get("fields", {}).items():
+        if field in current and stats["accuracy"] - current[field]["accuracy"] > max_drop:
+            regressions.append(f"{field}: {stats['accuracy']} -> {current[field]['accuracy']}")
+    return regressions
+
+
+def speedup_summary(result: Dict, baseline: Dict) -> str:
+    """吞吐量、延迟、内存、准确率相对基线的变化"""
+    def ratio(current, base):
+        return f"{current / base:.2f}x" if current and base else '-'
+    throughput, base_throughput = result["throughput"], baseline.get("throughput", {})
+    return (f"吞吐量 {ratio(throughput['reports_per_sec'], base_throughput.get('reports_per_sec'))}，"
+            f"p95 延迟 {ratio(result['latency'].get('p95'), baseline.get('latency', {}).get('p95'))}，"
+            f"峰值内存 {throughput['peak_rss_mb']} MB（基线 {base_throughput.get('peak_rss_mb')} MB），"
+            f"字段准确率 {result['accuracy']['overall']}（基线 {baseline.get('accuracy', {}).get('overall')}）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='报告解析基准测试')
+    parser.add_argument('--corpus', default=ehp_config.OCR_BENCHMARK_CORPUS, help='语料目录')
+    parser.add_argument('--out', default='', help='结果输出 json 文件，默认输出到标准输出')
+    parser.add_argument('--batch-size', type=int, default=1, help='每次 analysis_pdf_batch 的报告数')
+    parser.add_argument('--repeat', type=int, default=1, help='语料重复次数')
+    parser.add_argument('--template', action='append', help='只测试指定模板，可重复')
+    parser.add_argument('--cpu', action='store_true', help='强制使用 CPU 推理')
+    parser.add_argument('--backend', choices=('paddle', 'onnx'), default=None, help='推理后端，默认取配置')
+    parser.add_argument('--int8', action='store_true', help='ONNX 后端使用 int8 量化模型')
+    parser.add_argument('--model', default=None, help=f'OCR 模型，可选 {list(ehp_config.OCR_MODEL_PROFILES)}')
+    parser.add_argument('--cache', action='store_true', help='启用 OCR 结果缓存（默认关闭）')
+    parser.add_argument('--no-text-layer', action='store_true', help='关闭文本层快速通道，全部走 OCR')
+    parser.add_argument('--rgb', action='store_true', help='区域按 RGB 渲染（与默认的灰度渲染对比内存和耗时）')
+    parser.add_argument('--baseline', default='', help='基线结果 json，字段准确率下降超过阈值时退出码为 1')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    # 必须在首次创建 OCR 引擎之前修改
+    ehp_config.OCR_CACHE_ENABLED = args.cache
+    if args.cpu:
+        ehp_config.OCR_USE_GPU = False
+    if args.backend:
+        ehp_config.OCR_BACKEND = args.backend
+    if args.int8:
+        ehp_config.OCR_ONNX_INT8 = True
+    if args.model:
+        ehp_config.OCR_MODEL = args.model
+    if args.no_text_layer:
+        ehp_config.PDF_TEXT_LAYER_ENABLED = False
+    if args.rgb:
+        ehp_config.OCR_RENDER_GRAY = False
+
+    try:
+        result = run_benchmark(args.corpus, args.batch_size, args.repeat, args.template)
+    except FileNotFoundError as e:
+        print(datetime.now(), e)
+        return 2
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(datetime.now(), f"基准测试完成：{result['throughput']}，字段准确率 {result['accuracy']['overall']}，"
+                              f"结果已写入 {args.out}")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(result, baseline, args.max_accuracy_drop)
+        print(datetime.now(), f"与基线 {baseline.get('config', {}).get('backend', 'paddle')} 对比：" + speedup_summary(result, baseline))
+        if regressions:
+            print(datetime.now(), f"字段准确率下降: {regressions}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
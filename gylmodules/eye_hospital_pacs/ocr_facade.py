@@ -0,0 +1,64 @@
+# OCR 子系统延迟导入入口
+# pdf_ocr_analysis 依赖 paddleocr、cv2、numpy、PyMuPDF，导入需要数秒并占用数百 MB 内存；
+# Web 路由、定时任务注册、解析服务主进程等只做状态查询或任务投递，统一通过本模块访问，第一次真正需要 OCR 时才导入
+
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+_MODULE_NAME = 'gylmodules.eye_hospital_pacs.pdf_ocr_analysis'
+_module = None
+_lock = threading.Lock()
+
+
+def ocr_module():
+    """导入并返回 pdf_ocr_analysis"""
+    global _module
+    if _module is None:
+        with _lock:
+            if _module is None:
+                start_time = time.perf_counter()
+                from gylmodules.eye_hospital_pacs import pdf_ocr_analysis
+                _module = pdf_ocr_analysis
+                print(datetime.now(), f"OCR 模块加载完成，耗时 {time.perf_counter() - start_time:.2f} s")
+    return _module
+
+
+def is_loaded() -> bool:
+    return _module is not None or _MODULE_NAME in sys.modules
+
+
+def analysis_pdf_batch(file_paths: List[str]) -> List[Tuple[Optional[str], Dict]]:
+    return ocr_module().analysis_pdf_batch(file_paths)
+
+
+def analysis_pdf(file_path: str) -> Tuple[Optional[str], Dict]:
+    return ocr_module().analysis_pdf(file_path)
+
+
+def regularly_parsing_eye_report():
+    ocr_module().regularly_parsing_eye_report()
+
+
+def start_engine_pool() -> threading.Thread:
+    """后台线程导入 OCR 模块并预热本进程的引擎池，不阻塞启动"""
+    t = threading.Thread(target=lambda: ocr_module().ocr_engine_pool.warm_up(), name='ocr-engine-warm-up',
+                         daemon=True)
+    t.start()
+    return t
+
+
+def engine_pool_status() -> Dict:
+    """本进程 OCR 引擎池状态，OCR 模块尚未加载时不触发加载"""
+    if not is_loaded():
+        return {"loaded": False}
+    return {"loaded": True, **ocr_module().ocr_engine_pool.status()}
+
+
+def region_dpi_status() -> Dict:
+    """本进程自动选择的区域渲染分辨率，OCR 模块尚未加载时不触发加载"""
+    if not is_loaded():
+        return {"loaded": False}
+    return {"loaded": True, "regions": ocr_module().region_dpi_cache.status()}
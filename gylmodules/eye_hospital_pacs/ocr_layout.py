@@ -0,0 +1,183 @@
+# OCR 文本框版面分析
+# 识别结果（或文本层单词）保留坐标，按行分组、排序全部用 numpy 向量化完成；
+# 字段提取按"标签 -> 值"的空间关系查找：同一文本框内标签之后、同一行右侧最近的文本框、正下方最近的文本框，
+# 不再依赖把所有文本拼成一个字符串后的相对顺序
+
+import re
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple, Union
+
+import numpy as np
+
+# 标签与值之间的分隔符
+_SEPARATORS = ' \t:：。.'
+# 数值（整数或小数）
+NUMBER = re.compile(r'(\d+(?:\.\d+)?)')
+
+Token = Union[str, Dict]
+
+
+def token_text(token: Token) -> str:
+    return token if isinstance(token, str) else token.get("text", "")
+
+
+def token_boxes(positions: Sequence) -> np.ndarray:
+    """四点坐标 [[x, y] * 4] 转为 (N, 4) 的 [x0, y0, x1, y1]"""
+    if not len(positions):
+        return np.zeros((0, 4), dtype=np.float32)
+    points = np.asarray(positions, dtype=np.float32).reshape(len(positions), -1, 2)
+    return np.concatenate((points.min(axis=1), points.max(axis=1)), axis=1)
+
+
+def line_threshold(boxes: np.ndarray) -> float:
+    """行分组阈值：文本框高度中位数的一半（不同渲染 dpi 下自适应），至少 4 像素"""
+    if not len(boxes):
+        return 4.0
+    return max(float(np.median(boxes[:, 3] - boxes[:, 1])) * 0.5, 4.0)
+
+
+def group_lines(boxes: np.ndarray, threshold: float = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    文本框按行分组：按中心 y 排序后，相邻中心 y 差超过阈值处断行
+    :return: (阅读顺序下标：从上到下、行内从左到右, 每个文本框的行号)
+    """
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    threshold = line_threshold(boxes) if threshold is None else threshold
+    center_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    by_y = np.argsort(center_y, kind='stable')
+    sorted_line_ids = np.concatenate(([0], np.cumsum(np.diff(center_y[by_y]) > threshold)))
+    line_ids = np.empty(n, dtype=np.int64)
+    line_ids[by_y] = sorted_line_ids
+    return np.lexsort((boxes[:, 0], line_ids)), line_ids
+
+
+def merge_line_tokens(tokens: List[Dict], level: int = 1) -> List[Dict]:
+    """
+    合并同一行内水平间距较小的相邻文本框
+    level: 0 - 不合并  1 - 行合并，以空格连接  2 - 段落合并，以换行连接
+    """
+    if level == 0 or len(tokens) <= 1:
+        return tokens
+    boxes = token_boxes([token["position"] for token in tokens])
+    order, line_ids = group_lines(boxes)
+    boxes, line_ids = boxes[order], line_ids[order]
+    widths = boxes[:, 2] - boxes[:, 0]
+    # 同一行且与前一个文本框的间距小于其宽度 2.5 倍时合并
+    joined = (line_ids[1:] == line_ids[:-1]) & (boxes[1:, 0] - boxes[:-1, 2] < widths[:-1] * 2.5)
+    starts = np.flatnonzero(np.concatenate(([True], ~joined)))
+    x0 = np.minimum.reduceat(boxes[:, 0], starts)
+    y0 = np.minimum.reduceat(boxes[:, 1], starts)
+    x1 = np.maximum.reduceat(boxes[:, 2], starts)
+    y1 = np.maximum.reduceat(boxes[:, 3], starts)
+
+    sep = ' ' if level == 1 else '\n'
+    ends = np.append(starts[1:], len(order))
+    merged = []
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        members = [tokens[j] for j in order[start:end]]
+        left, top, right, bottom = int(x0[i]), int(y0[i]), int(x1[i]), int(y1[i])
+        merged.append({
+            "text": sep.join(member["text"] for member in members),
+            "confidence": min(member["confidence"] for member in members),
+            "position": [[left, top], [right, top], [right, bottom], [left, bottom]],
+            "y_position": (top + bottom) / 2,
+        })
+    return merged
+
+
+class TokenLayout:
+    """
+    单个区域内文本框的空间索引
+    只有文本没有坐标的 token（如旧版缓存）按顺序各占一行，标签 -> 值查找退化为同一文本框内 / 下一个文本框
+    """
+
+    def __init__(self, tokens: Sequence[Token]):
+        texts, positions = [], []
+        for i, token in enumerate(tokens):
+            text = token_text(token).strip()
+            if not text:
+                continue
+            position = token.get("position") if isinstance(token, dict) else None
+            if not position:
+                position = [[0, i * 100], [1, i * 100], [1, i * 100 + 10], [0, i * 100 + 10]]
+            texts.append(text)
+            positions.append(position)
+        boxes = token_boxes(positions)
+        order, line_ids = group_lines(boxes)
+        self.texts = [texts[i] for i in order]
+        self.boxes = boxes[order]
+        self.line_ids = line_ids[order]
+
+    @classmethod
+    def from_regions(cls, region_tokens: Sequence[Sequence[Token]]) -> List['TokenLayout']:
+        return [cls(tokens) for tokens in region_tokens]
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def text(self) -> str:
+        """按阅读顺序以空格拼接"""
+        return " ".join(self.texts)
+
+    def lines(self) -> List[str]:
+        if not self.texts:
+            return []
+        breaks = np.flatnonzero(np.diff(self.line_ids)) + 1
+        bounds = zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [len(self.texts)])))
+        return [" ".join(self.texts[start:end]) for start, end in bounds]
+
+    def _right_of(self, idx: int) -> Optional[int]:
+        """同一行右侧最近的文本框"""
+        candidates = np.flatnonzero((self.line_ids == self.line_ids[idx]) & (self.boxes[:, 0] >= self.boxes[idx, 2] - 2))
+        candidates = candidates[candidates != idx]
+        return int(candidates[np.argmin(self.boxes[candidates, 0])]) if candidates.size else None
+
+    def _below(self, idx: int) -> Optional[int]:
+        """下方水平方向有重叠的最近文本框"""
+        box = self.boxes[idx]
+        overlap = np.minimum(self.boxes[:, 2], box[2]) - np.maximum(self.boxes[:, 0], box[0])
+        candidates = np.flatnonzero((self.line_ids > self.line_ids[idx]) & (overlap > 0))
+        return int(candidates[np.argmin(self.boxes[candidates, 1])]) if candidates.size else None
+
+    def values_after(self, label: Pattern, value: Pattern) -> List[str]:
+        """
+        所有标签对应的值，按阅读顺序
+        :param label: 标签正则，如 re.compile(r'K1')
+        :param value: 值正则，从分隔符之后开始 match，有分组时取第一组
+        """
+        values = []
+        for idx, text in enumerate(self.texts):
+            label_match = label.search(text)
+            if not label_match:
+                continue
+            found = _match_value(value, text[label_match.end():])
+            for neighbour in (self._right_of, self._below):
+                if found is not None:
+                    break
+                other = neighbour(idx)
+                if other is not None:
+                    found = _match_value(value, self.texts[other])
+            if found is not None:
+                values.append(found)
+        return values
+
+    def value_after(self, label: Pattern, value: Pattern) -> Optional[str]:
+        values = self.values_after(label, value)
+        return values[0] if values else None
+
+
+def _match_value(value: Pattern, text: str) -> Optional[str]:
+    match = value.match(text.lstrip(_SEPARATORS))
+    if not match:
+        return None
+    return match.group(1) if match.re.groups else match.group(0)
+
+
+def reading_order(tokens: List[Dict]) -> List[Dict]:
+    """OCR 结果格式的文本框按阅读顺序排序"""
+    if len(tokens) <= 1:
+        return list(tokens)
+    order, _ = group_lines(token_boxes([token["position"] for token in tokens]))
+    return [tokens[i] for i in order]
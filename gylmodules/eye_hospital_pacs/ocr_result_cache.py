@@ -0,0 +1,117 @@
+# OCR 结果持久化缓存
+# 同一份报告重复上传、设备重发或 report_value 被重置后重新解析时，直接复用上次的识别结果
+# 缓存键为 (文件内容 sha256, 模板 id@版本)，模板区域或提取规则变化时递增版本即可使旧缓存失效
+# 命中 / 未命中 / 淘汰次数记在 ehp_metrics.OCR_CACHE_EVENTS，多进程解析时由工作进程回传合并，服务进程的统计包含全部进程
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.ehp_metrics import OCR_CACHE_EVENTS
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """
+    基于 SQLite 的 OCR 结果缓存，存储各区域识别文本框（tokens，文本 + 坐标）和提取结果（value）
+    命中时由调用方用 tokens 重新执行模板提取（部分模板依赖文件名，如阿玛仕的左右眼）
+    条数超过 max_entries 时按最近访问时间淘汰
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 20000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS ocr_cache ("
+                         "file_hash TEXT NOT NULL, template_key TEXT NOT NULL, "
+                         "tokens TEXT NOT NULL, value TEXT NOT NULL, source TEXT, "
+                         "created_at REAL NOT NULL, last_access REAL NOT NULL, "
+                         "PRIMARY KEY (file_hash, template_key))")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_access ON ocr_cache (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, file_hash: str, template_key: str) -> Optional[Dict]:
+        """
+        查询缓存，命中时刷新访问时间
+        :return: {"tokens": [[区域文本框]], "value": {...}, "source": 'OCR' | '文本层'}，未命中返回 None
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT tokens, value, source FROM ocr_cache "
+                                   "WHERE file_hash = ? AND template_key = ?", (file_hash, template_key)).fetchone()
+                if row is None:
+                    OCR_CACHE_EVENTS.inc('miss')
+                    return None
+                conn.execute("UPDATE ocr_cache SET last_access = ? WHERE file_hash = ? AND template_key = ?",
+                             (time.time(), file_hash, template_key))
+                conn.commit()
+                OCR_CACHE_EVENTS.inc('hit')
+            return {"tokens": json.loads(row[0]), "value": json.loads(row[1]), "source": row[2]}
+        except Exception as e:
+            print(datetime.now(), f"OCR 缓存查询失败: {e}")
+            return None
+
+    def put(self, file_hash: str, template_key: str, tokens: List[List[Union[str, Dict]]], value: Dict, source: str = ''):
+        """写入缓存，超出容量时淘汰最久未访问的记录"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("INSERT OR REPLACE INTO ocr_cache "
+                             "(file_hash, template_key, tokens, value, source, created_at, last_access) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (file_hash, template_key, json.dumps(tokens, ensure_ascii=False),
+                              json.dumps(value, ensure_ascii=False, default=str), source, now, now))
+                overflow = conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    conn.execute("DELETE FROM ocr_cache WHERE rowid IN "
+                                 "(SELECT rowid FROM ocr_cache ORDER BY last_access LIMIT ?)", (overflow,))
+                    OCR_CACHE_EVENTS.inc('eviction', amount=overflow)
+                conn.commit()
+        except Exception as e:
+            print(datetime.now(), f"OCR 缓存写入失败: {e}")
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM ocr_cache")
+            conn.commit()
+
+    def stats(self) -> Dict:
+        entries = 0
+        try:
+            with self._lock:
+                entries = self._connect().execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        except Exception as e:
+            print(datetime.now(), f"OCR 缓存统计失败: {e}")
+        hits, misses = OCR_CACHE_EVENTS.value('hit'), OCR_CACHE_EVENTS.value('miss')
+        total = hits + misses
+        return {"entries": entries, "max_entries": self.max_entries, "hits": hits, "misses": misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0, "evictions": OCR_CACHE_EVENTS.value('eviction')}
+
+
+ocr_result_cache = OCRResultCache(ehp_config.OCR_CACHE_PATH, ehp_config.OCR_CACHE_MAX_ENTRIES)
@@ -0,0 +1,119 @@
+# 多页报告的目标页分类（如 Master700 的"生物统计值"页）
+# 按代价从低到高依次尝试，命中即停止，其余页面不做 300 dpi 渲染：
+#   1. 文本层关键字：矢量 PDF 直接在页面文字中查找
+#   2. 页面指纹：低分辨率缩略图的 dHash 与历史目标页指纹比对，只用于决定探测顺序
+#   3. 探测区域识别：按指纹相似度排序依次 OCR 探测区域，命中后记住该页指纹
+# 同一设备各页版式相近，9x8 的指纹不足以区分，选中的页面必须经过关键字或探测确认，通常排第一的页面一次探测即命中
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.pdf_rasterizer import render_thumbnail
+
+
+def dhash(gray: np.ndarray, hash_size: int = 8) -> int:
+    """差值哈希：缩放到 (hash_size + 1) x hash_size，比较水平相邻像素明暗，得到 64 位指纹"""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class PageFingerprints:
+    """按模板保存已确认的目标页指纹，持久化到 json 文件，进程重启后仍可直接命中"""
+
+    def __init__(self, path: str, max_per_template: int = 20):
+        self.path = path
+        self.max_per_template = max_per_template
+        self._fingerprints: Dict[str, List[int]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._fingerprints = {key: [int(h, 16) for h in hashes] for key, hashes in json.load(f).items()}
+        except Exception as e:
+            print(datetime.now(), f"加载页面指纹失败: {e}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({key: [f"{h:016x}" for h in hashes] for key, hashes in self._fingerprints.items()}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(datetime.now(), f"保存页面指纹失败: {e}")
+
+    def distance(self, template_key: str, fingerprint: int) -> int:
+        """与该模板已知目标页指纹的最小汉明距离，没有已知指纹时返回 65"""
+        with self._lock:
+            self._load()
+            return min((hamming(fingerprint, known) for known in self._fingerprints.get(template_key, [])),
+                       default=65)
+
+    def add(self, template_key: str, fingerprint: int):
+        with self._lock:
+            self._load()
+            hashes = self._fingerprints.setdefault(template_key, [])
+            if fingerprint in hashes:
+                return
+            hashes.insert(0, fingerprint)
+            del hashes[self.max_per_template:]
+            self._save()
+
+
+page_fingerprints = PageFingerprints(ehp_config.PAGE_FINGERPRINT_PATH, ehp_config.PAGE_FINGERPRINT_MAX)
+
+
+def select_page(doc, template, probe_page: Callable, use_text_layer: bool = True):
+    """
+    找到模板的目标页
+    :param doc: 已打开的 PDF
+    :param template: 报告模板，使用 page_keywords 和 cache_key
+    :param probe_page: probe_page(page) -> bool，识别探测区域判断是否为目标页（较慢，按需调用）
+    :param use_text_layer: 是否先在文本层中查找关键字
+    :return: 目标页，全部页面都不匹配时返回 None
+    """
+    # 1. 文本层关键字
+    if use_text_layer and template.page_keywords:
+        for page in doc:
+            text = page.get_text()
+            if any(keyword in text for keyword in template.page_keywords):
+                return page
+
+    # 2. 页面指纹：按与已知目标页指纹的距离排序（距离相同保持页码顺序）
+    ranked = []
+    for page in doc:
+        try:
+            fingerprint = dhash(render_thumbnail(page, ehp_config.PAGE_THUMBNAIL_DPI))
+        except Exception as e:
+            print(datetime.now(), f"计算第 {page.number} 页指纹失败: {e}")
+            fingerprint = None
+        distance = page_fingerprints.distance(template.cache_key, fingerprint) if fingerprint is not None else 65
+        ranked.append((distance, page.number, fingerprint))
+    ranked.sort(key=lambda item: (item[0], item[1]))
+
+    # 3. 按相似度依次探测，命中即停止
+    for _, page_number, fingerprint in ranked:
+        page = doc[page_number]
+        if probe_page(page):
+            if fingerprint is not None:
+                page_fingerprints.add(template.cache_key, fingerprint)
+            return page
+    return None
@@ -0,0 +1,129 @@
+# 分阶段流水线：数据源和每个处理阶段各占一个线程，阶段之间用有界队列衔接
+# 上游产出一项就交给下游，渲染 -> 预处理 -> 识别 同时进行，批次总耗时接近最慢阶段的耗时而不是各阶段之和
+# 队列满时上游阻塞，同时在内存中的中间结果不超过 队列容量 × 阶段数
+# PyMuPDF 渲染、OpenCV 预处理、Paddle / onnxruntime 推理主要在原生代码中执行，线程即可重叠
+
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List, Sequence
+
+_DONE = object()
+# 阻塞等待时检查停止标志的间隔（秒）
+_POLL_SECONDS = 0.1
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class Pipeline:
+    """
+    source 的每一项依次经过 stages 处理，按原顺序产出最后一个阶段的结果
+    阶段函数内部应自行处理单项失败；阶段抛出的异常会在消费方重新抛出并终止流水线
+    用法：
+        with Pipeline(files, [render, preprocess]) as pipe:
+            for batch in pipe.batches():
+                ...
+    """
+
+    def __init__(self, source: Iterable, stages: Sequence[Callable], maxsize: int = 2, name: str = 'pipeline'):
+        self._stop = threading.Event()
+        self._queues = [queue.Queue(maxsize=max(maxsize, 1)) for _ in range(len(stages) + 1)]
+        self._threads = [threading.Thread(target=self._produce, args=(iter(source),),
+                                          name=f'{name}-source', daemon=True)]
+        for i, stage in enumerate(stages):
+            self._threads.append(threading.Thread(target=self._run_stage,
+                                                  args=(stage, self._queues[i], self._queues[i + 1]),
+                                                  name=f'{name}-{getattr(stage, "__name__", i)}', daemon=True))
+        self._finished = False
+
+    def __enter__(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """停止各阶段线程；正在处理的一项处理完后退出"""
+        self._stop.set()
+        for t in self._threads:
+            if t.is_alive() and t is not threading.current_thread():
+                t.join()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _produce(self, source: Iterator):
+        try:
+            for item in source:
+                if not self._put(self._queues[0], item):
+                    return
+        except Exception as e:
+            self._put(self._queues[0], _Failure(e))
+            return
+        self._put(self._queues[0], _DONE)
+
+    def _run_stage(self, stage: Callable, inbox: queue.Queue, outbox: queue.Queue):
+        while True:
+            item = self._get(inbox)
+            if item is _DONE or isinstance(item, _Failure):
+                self._put(outbox, item)
+                return
+            try:
+                result = stage(item)
+            except Exception as e:
+                self._put(outbox, _Failure(e))
+                return
+            if not self._put(outbox, result):
+                return
+
+    def _take(self, block: bool):
+        item = self._get(self._queues[-1]) if block else self._queues[-1].get_nowait()
+        if item is _DONE:
+            self._finished = True
+        elif isinstance(item, _Failure):
+            self._finished = True
+            raise item.error
+        return item
+
+    def __iter__(self) -> Iterator:
+        while not self._finished:
+            item = self._take(block=True)
+            if item is not _DONE:
+                yield item
+
+    def batches(self, limit: int = None) -> Iterator[List]:
+        """
+        等到至少一项就绪后，连同此刻已经就绪的其余项一起产出（最多 limit 项）
+        下游处理一批的同时上游继续生产，下游越慢批次越大，可以合并批量推理
+        """
+        while not self._finished:
+            first = self._take(block=True)
+            if first is _DONE:
+                return
+            batch = [first]
+            while not self._finished and (limit is None or len(batch) < limit):
+                try:
+                    item = self._take(block=False)
+                except queue.Empty:
+                    break
+                if item is not _DONE:
+                    batch.append(item)
+            yield batch
@@ -0,0 +1,234 @@
+# 多进程报告解析服务
+# 定时任务 / 入库流程把待解析报告放入有界队列，派发线程按批交给 N 个常驻工作进程解析，主进程回写结果
+# 每个工作进程启动时加载并预热自己的 OCR 引擎，吞吐量随进程数（CPU 核数 / 显存）近似线性扩展
+# 主进程只负责派发和回写，不导入 OCR 模块（pdf_ocr_analysis 只在工作进程内导入）
+
+import atexit
+import functools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from gylmodules import global_config
+from gylmodules.eye_hospital_pacs import ehp_config, ehp_metrics, ocr_facade
+from gylmodules.eye_hospital_pacs.report_claims import claim_reports, pending_reports, release_reports, \
+    report_file_path, save_parse_result
+from gylmodules.utils.db_utils import DbUtil
+
+
+def _init_worker(engines: int):
+    """工作进程初始化：替换为进程内的引擎池并同步预热，Ctrl+C 由主进程统一处理"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pdf_ocr_analysis = ocr_facade.ocr_module()
+    pdf_ocr_analysis.ocr_engine_pool = pdf_ocr_analysis.OCREnginePool(engines)
+    pdf_ocr_analysis.ocr_engine_pool.warm_up()
+
+
+def _parse_in_worker(file_paths: List[str]) -> Tuple[List[Tuple[Optional[str], Dict]], Dict, Tuple[int, Dict]]:
+    """在工作进程中批量解析，连同本批的监控指标增量、本进程的区域渲染分辨率一起返回，由主进程合并"""
+    return ocr_facade.analysis_pdf_batch(file_paths), ehp_metrics.drain(), \
+        (os.getpid(), ocr_facade.region_dpi_status())
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class ParseService:
+    """
+    报告解析服务
+    - submit: 报告放入有界队列（按 report_id 去重），队列满时返回 False，由下一次定时任务重新补充
+    - 派发线程: 每次取 batch_size 份报告提交给进程池，在途批次数受 max_in_flight 限制
+    - stop: 不再派发新批次，等待在途批次完成并回写；未派发的报告保持待解析状态
+    """
+
+    def __init__(self, workers: int = None, batch_size: int = None, max_in_flight: int = None,
+                 queue_size: int = None):
+        self.workers = workers or ehp_config.PARSE_WORKERS
+        self.batch_size = batch_size or ehp_config.PARSE_BATCH_SIZE
+        self.max_in_flight = max_in_flight or self.workers * ehp_config.PARSE_MAX_IN_FLIGHT_PER_WORKER
+        self._queue = queue.Queue(maxsize=queue_size or ehp_config.PARSE_QUEUE_SIZE)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._pending_ids = set()
+        self._ids_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = None
+        self._dispatcher = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.worker_region_dpi: Dict[int, Dict] = {}  # 工作进程号 -> 最近一次回报的区域渲染分辨率
+
+    @property
+    def is_running(self) -> bool:
+        return self._executor is not None and not self._stop.is_set()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # 使用 spawn 启动，避免 fork 继承主进程中已初始化的推理库状态
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(ehp_config.PARSE_WORKER_ENGINES,))
+        # 提前拉起全部工作进程，模型加载与服务启动并行
+        for _ in range(self.workers):
+            executor.submit(_ping)
+        return executor
+
+    def start(self):
+        if self._executor is not None:
+            return
+        self._stop.clear()
+        self._executor = self._new_executor()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='ehp-parse-dispatcher', daemon=True)
+        self._dispatcher.start()
+        atexit.register(self.stop)
+        print(datetime.now(), f"报告解析服务启动，工作进程 {self.workers} 个，在途批次上限 {self.max_in_flight}")
+
+    def submit(self, report: Dict) -> bool:
+        """加入待解析队列，已在队列或解析中、队列已满或服务未启动时返回 False"""
+        if not self.is_running:
+            return False
+        report_id = report.get('report_id')
+        with self._ids_lock:
+            if report_id in self._pending_ids:
+                return False
+            try:
+                self._queue.put_nowait(report)
+            except queue.Full:
+                return False
+            self._pending_ids.add(report_id)
+        return True
+
+    def _next_batch(self) -> List[Dict]:
+        try:
+            batch = [self._queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=1):
+                continue
+            batch = self._next_batch()
+            if batch:
+                # 派发前原子领取，已被其他实例领取或已解析的报告直接丢弃
+                claimed = claim_reports(report_ids=[report.get('report_id') for report in batch])
+                claimed_ids = {report.get('report_id') for report in claimed}
+                self._forget([report for report in batch if report.get('report_id') not in claimed_ids])
+                batch = claimed
+            if not batch:
+                self._slots.release()
+                continue
+            try:
+                future = self._executor.submit(_parse_in_worker, [report_file_path(report) for report in batch])
+            except Exception as e:
+                print(datetime.now(), f"提交解析任务失败: {e}")
+                # 尚未解析，放回待解析并退回本次尝试次数
+                release_reports(batch, f"提交解析任务失败: {e}", attempted=False)
+                self._forget(batch)
+                self._slots.release()
+                if isinstance(e, BrokenProcessPool) and not self._stop.is_set():
+                    # 工作进程异常退出（如推理库崩溃），重建进程池
+                    self._executor = self._new_executor()
+                continue
+            self.submitted += len(batch)
+            future.add_done_callback(functools.partial(self._on_done, batch))
+
+    def _on_done(self, batch: List[Dict], future):
+        """回写一个批次的解析结果；没有回写成功的报告（工作进程崩溃、回写出错）立即释放领取，不等租约过期"""
+        unsaved = list(batch)
+        try:
+            parsed, metrics, (worker_pid, region_dpi) = future.result()
+            ehp_metrics.merge(metrics)
+            self.worker_region_dpi[worker_pid] = region_dpi
+            db = DbUtil(global_config.DB_HOST, global_config.DB_USERNAME, global_config.DB_PASSWORD,
+                        global_config.DB_DATABASE_GYL)
+            for report, (patient_name, values) in zip(batch, parsed):
+                try:
+                    # 租约已失效的结果被丢弃，报告已不属于本进程，同样不需要释放
+                    if save_parse_result(db, report, patient_name, values):
+                        self.completed += 1
+                    unsaved.remove(report)
+                except Exception as e:
+                    self.failed += 1
+                    print(datetime.now(), f"回写报告 {report.get('report_id')} 解析结果失败: {e}")
+            del db
+        except Exception as e:
+            # 工作进程崩溃（BrokenProcessPool）等
+            self.failed += len(unsaved)
+            print(datetime.now(), f"解析批次 {[report.get('report_id') for report in batch]} 失败: {e}")
+        finally:
+            if unsaved:
+                release_reports(unsaved, "解析或回写失败")
+            self._forget(batch)
+            self._slots.release()
+
+    def _forget(self, batch: List[Dict]):
+        with self._ids_lock:
+            for report in batch:
+                self._pending_ids.discard(report.get('report_id'))
+
+    def stop(self, timeout: float = None):
+        """优雅停止：等待在途批次解析并回写完成后关闭工作进程"""
+        if self._executor is None:
+            return
+        self._stop.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        dropped = []
+        while True:
+            try:
+                dropped.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._forget(dropped)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        print(datetime.now(), f"报告解析服务已停止，{len(dropped)} 份未派发报告留待下次解析")
+
+    def status(self) -> Dict:
+        return {"running": self.is_running, "workers": self.workers, "queued": self._queue.qsize(),
+                "in_flight_reports": len(self._pending_ids) - self._queue.qsize(),
+                "submitted": self.submitted, "completed": self.completed, "failed": self.failed}
+
+
+parse_service = ParseService()
+ehp_metrics.register_gauge('ehp_parse_queue_reports', '解析队列中等待派发的报告数',
+                           lambda: parse_service.status()["queued"])
+ehp_metrics.register_gauge('ehp_parse_in_flight_reports', '正在解析的报告数',
+                           lambda: parse_service.status()["in_flight_reports"])
+
+
+def submit_new_reports(reports: List[Dict]) -> int:
+    """
+    入库后立即投递新报告（目录监控、人工上传），返回入队数量
+    服务未启动或队列已满时不入队，由定时兜底扫描领取
+    """
+    return sum(parse_service.submit(report) for report in reports)
+
+
+def enqueue_pending_reports():
+    """
+    定时兜底扫描：新报告入库时已直接投递，这里只补充遗漏的（投递时队列已满、服务重启、解析进程异常等）
+    解析服务未启动时退回调度线程内解析
+    """
+    if not parse_service.is_running:
+        ocr_facade.regularly_parsing_eye_report()
+        return
+
+    # 只查询不领取，派发线程取出后再领取，避免报告在队列中排队时租约过期
+    for report in pending_reports(ehp_config.PARSE_POLL_LIMIT):
+        file_path = report_file_path(report)
+        if not os.path.exists(file_path) and not str(file_path).endswith(".pdf"):
+            continue
+        parse_service.submit(report)
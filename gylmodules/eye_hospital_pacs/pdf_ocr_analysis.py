@@ -1,92 +1,45 @@
 # pdf 文件解析，定时执行
 
-import json
+import bisect
+import queue
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
 import numpy as np
 from datetime import datetime
 from PIL import Image
-from paddleocr import PaddleOCR
 import time
 import io
 import os
-from typing import Union, List, Dict, Literal
-from pdf2image import convert_from_path
+from typing import Union, List, Dict, Literal, Hashable, Tuple, Callable, Collection
 import re
 import cv2
 from typing import Optional
 
 from gylmodules import global_config
-from gylmodules.eye_hospital_pacs import ehp_server
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.page_classifier import select_page
+from gylmodules.eye_hospital_pacs.page_pipeline import Pipeline
+from gylmodules.eye_hospital_pacs.pdf_rasterizer import open_pdf, render_rect, render_gray, page_size, \
+    pick_render_dpi, reference_page_size, relative_to_rect, REGION_DPI
+from gylmodules.eye_hospital_pacs.ehp_metrics import timed, register_gauge, REPORTS_PARSED, PARSE_FAILURES, \
+    OCR_REGIONS
+from gylmodules.eye_hospital_pacs.ocr_backends import create_onnx_engine, create_paddle_engine
+from gylmodules.eye_hospital_pacs.ocr_layout import group_lines, token_boxes, merge_line_tokens
+from gylmodules.eye_hospital_pacs.ocr_result_cache import ocr_result_cache, file_sha256
+from gylmodules.eye_hospital_pacs.pdf_text_layer import page_words, region_tokens
+from gylmodules.eye_hospital_pacs.report_claims import claim_reports, save_parse_result, report_file_path, \
+    fail_report, release_reports
+from gylmodules.eye_hospital_pacs.report_templates import ReportTemplate, match_template
 from gylmodules.utils.db_utils import DbUtil
 
 
-def pdf_to_jpg(pdf_path, output_dir=os.path.join(os.path.dirname(__file__), "output_jpg"), dpi=300):
-    """
-    将 PDF 转换为 JPG 格式图片。
-    """
-    try:
-        # 获取 PDF 文件名（不含扩展名）
-        pdf_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-        # 确保输出目录存在
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        # if global_config.run_in_local:
-        #     poppler_path = "/opt/homebrew/bin"  # 确保与 pdftoppm 路径一致\
-        #     images = convert_from_path(pdf_path, dpi=dpi, fmt='jpg', poppler_path=poppler_path)
-        # else:
-        images = convert_from_path(pdf_path, dpi=dpi, fmt='jpg')
-    except Exception as e:
-        print(datetime.now(), f"ERROR {pdf_path} PDF 转换失败: {e}")
-        return []
-
-    # 保存图片并记录完整路径
-    jpg_paths = []
-    for i, image in enumerate(images):
-        # 使用 PDF 文件名作为前缀
-        jpg_filename = f"{pdf_filename}_page_{i + 1}.jpg"
-        jpg_path = os.path.join(output_dir, jpg_filename)
-        try:
-            image.save(jpg_path, "JPEG")
-            # 获取完整路径
-            full_path = os.path.abspath(jpg_path)
-            jpg_paths.append(full_path)
-        except Exception as e:
-            print(datetime.now(), f"ERROR 保存第 {i + 1} 页失败: {e}")
-
-    return jpg_paths
-
-
-def delete_files(file_paths):
-    """
-    根据给定的文件路径删除文件。
-    """
-    # 如果输入是单个路径，转换为列表
-    if isinstance(file_paths, str):
-        file_paths = [file_paths]
-
-    # 存储删除结果
-    results = {}
-
-    for file_path in file_paths:
-        try:
-            # 检查文件是否存在
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                results[file_path] = True
-            else:
-                results[file_path] = False
-                print(datetime.now(), f"ERROR 文件不存在: {os.path.abspath(file_path)}")
-        except Exception as e:
-            results[file_path] = False
-            print(datetime.now(), f"删除文件失败 ({os.path.abspath(file_path)}): {e}")
-
-    return results
-
-
 class OCRProcessor:
     def __init__(self):
         self._ocr_engine = None
+        # 流水线中页面探测与批量识别可能在不同线程使用同一引擎，推理串行执行
+        self._infer_lock = threading.Lock()
         self.language_map = {
             'ch': {'lang': 'ch', 'cls_model_dir': None},  # macOS建议禁用分类器
             'en': {'lang': 'en', 'cls_model_dir': None},
@@ -98,56 +51,28 @@ class OCRProcessor:
         """macOS优化版引擎初始化"""
         if self._ocr_engine is None:
             try:
-                if global_config.run_in_local:
-                    self._ocr_engine = PaddleOCR(lang='ch', use_angle_cls=False,
-                                                 use_gpu=False, enable_mkldnn=False, show_log=False,
-                                                 det_model_dir=r'C:\Users\Administrator\Desktop\eye-pacs\gylmodules\eye_hospital_pacs\inference\ch_ppocr_server_v2.0_det_infer',
-                                                 rec_model_dir=r'C:\Users\Administrator\Desktop\eye-pacs\gylmodules\eye_hospital_pacs\inference\ch_ppocr_server_v2.0_rec_infer',
-                                                 rec_char_dict_path=r'C:\Users\Administrator\Desktop\eye-pacs\gylmodules\eye_hospital_pacs\inference\ppocr_keys_v1.txt',
-                                                 cls_model_dir=None  # 显式禁用分类模型
-                                                 )
+                if ehp_config.OCR_BACKEND == 'onnx':
+                    self._ocr_engine = create_onnx_engine()
                 else:
-                    # self._ocr_engine = PaddleOCR(lang='ch', use_angle_cls=False,
-                    #                              use_gpu=False, enable_mkldnn=False, show_log=False,
-                    #                              det_model_dir='/home/nsyy/eye-pacs/inference/ch_PP-OCRv4_det_infer/',
-                    #                              rec_model_dir='/home/nsyy/eye-pacs/inference/ch_PP-OCRv4_rec_infer/',
-                    #                              cls_model_dir=None  # 显式禁用分类模型
-                    #                              )
-                    self._ocr_engine = PaddleOCR(
-                        # 硬件配置
-                        lang='ch', use_gpu=True, gpu_mem=7000,  # 7GB显存限制
-
-                        # 模型选择（平衡速度与精度）
-                        det_model_dir='/home/nsyy/eye-pacs/inference/ch_PP-OCRv4_det_infer/',
-                        rec_model_dir='/home/nsyy/eye-pacs/inference/ch_PP-OCRv4_rec_infer/',
-                        rec_char_dict_path='/home/nsyy/eye-pacs/inference/ppocr_keys_v1.txt',
-                        cls_model_dir=None,  # 禁用方向分类（PDF通常方向固定）
-
-                        # ===== 性能优化 =====
-                        det_limit_side_len=2048,  # 提高分辨率适应高清扫描件
-                        rec_batch_num=8,  # 增大批次（RTX 4060显存充足）
-                        use_tensorrt=True,  # 启用TensorRT加速（RTX 40系列支持）
-
-                        # ===== 质量参数 =====
-                        det_db_score_mode="fast",  # 快速检测模式
-                        show_log=False,  # 关闭日志减少I/O
-                        use_angle_cls=False,  # 禁用方向分类（提升速度）
-                        use_mp=True,  # 启用多进程
-                        total_process_num=4,  # 6进程（根据CPU核心数调整）
-
-                        # ===== 高级优化 =====
-                        enable_mkldnn=False,  # 禁用Intel加速（GPU优先）
-                        cpu_threads=4,  # CPU线程数（若GPU满载可辅助）
-                        det_algorithm='DB',  # 使用DB算法（默认最优）
-                        rec_algorithm='SVTR_LCNet'  # PP-OCRv4的轻量识别算法
-                    )
+                    # 与 ONNX 后端一样按 OCR_MODEL 取 det / rec 模型目录
+                    self._ocr_engine = create_paddle_engine()
             except Exception as e:
                 print(datetime.now(), f"初始化失败: {str(e)}")
                 raise
         return self._ocr_engine
 
-    def load_image(self, image_input: Union[str, np.ndarray, bytes]) -> np.ndarray:
-        """macOS专属图像加载方法"""
+    def warm_up(self):
+        """加载模型并用空白图片跑一次推理，避免首个报告承担模型初始化耗时"""
+        dummy = np.full((64, 256), 255, dtype=np.uint8)
+        cv2.rectangle(dummy, (16, 20), (240, 44), 0, -1)
+        self.ocr_engine.ocr(dummy, cls=False)
+
+    @staticmethod
+    def load_image(image_input: Union[str, np.ndarray, bytes]) -> np.ndarray:
+        """
+        macOS专属图像加载方法
+        文件 / 字节流直接解码为灰度图；数组输入不做通道转换（灰度区域保持单通道，RGB 由 preprocess_image 转灰度）
+        """
         try:
             # 处理UNIX路径格式
             if isinstance(image_input, str):
@@ -155,19 +80,22 @@ class OCRProcessor:
                     img = Image.open(io.BytesIO(f.read()))
                     # 处理macOS截图可能带有alpha通道的情况
                     if img.mode in ('RGBA', 'LA'):
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        background.paste(img, mask=img.split()[-1])
+                        background = Image.new('L', img.size, 255)
+                        background.paste(img.convert('L'), mask=img.split()[-1])
                         img = background
                     else:
-                        img = img.convert('RGB')
+                        img = img.convert('L')
 
             # 其他类型处理与Windows版相同
             elif isinstance(image_input, bytes):
-                img = Image.open(io.BytesIO(image_input)).convert('RGB')
+                img = Image.open(io.BytesIO(image_input)).convert('L')
             elif isinstance(image_input, np.ndarray):
-                img = Image.fromarray(image_input)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
+                # 页面渲染结果直接使用（可能是原页面的视图），避免再拷贝一次
+                if image_input.ndim == 3 and image_input.shape[2] == 4:
+                    return cv2.cvtColor(image_input, cv2.COLOR_RGBA2RGB)
+                if image_input.ndim == 3 and image_input.shape[2] == 1:
+                    return image_input[:, :, 0]
+                return image_input
 
             return np.array(img)
         except Exception as e:
@@ -175,9 +103,10 @@ class OCRProcessor:
             raise
 
 
-    def preprocess_image(self, image_array: np.ndarray) -> np.ndarray:
+    @staticmethod
+    def preprocess_image(image_array: np.ndarray) -> np.ndarray:
         """增强图像质量以提高OCR准确率"""
-        # 转换为灰度图
+        # 转换为灰度图（灰度渲染的区域已是单通道）
         if len(image_array.shape) == 3:
             gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
         else:
@@ -205,47 +134,12 @@ class OCRProcessor:
             processed_img = self.preprocess_image(img_array)
 
             # 2. 执行OCR
-            ocr_result = self.ocr_engine.ocr(processed_img, cls=False)
+            with self._infer_lock:
+                ocr_result = self.ocr_engine.ocr(processed_img, cls=False)
 
             # 3. 处理结果
             if ocr_result and ocr_result[0]:
-                # 按 Y 坐标分组并排序
-                sorted_lines = sorted(ocr_result[0], key=lambda x: (sum(p[1] for p in x[0]) / 4, x[0][0][0]))
-
-                # 按 Y 坐标分组，组内按 X 坐标排序
-                current_y = None
-                grouped_lines = []
-                for line in sorted_lines:
-                    avg_y = sum(p[1] for p in line[0]) / 4
-                    if current_y is None or abs(avg_y - current_y) > 10:  # 10 像素为 Y 坐标分组阈值，可调整
-                        grouped_lines.append([])
-                        current_y = avg_y
-                    grouped_lines[-1].append(line)
-
-                # 组内按 X 坐标排序
-                for group in grouped_lines:
-                    group.sort(key=lambda x: x[0][0][0])  # 按左上角 X 坐标排序
-
-                # 展平分组结果
-                sorted_lines = [item for sublist in grouped_lines for item in sublist]
-
-                for line in sorted_lines:
-                    if len(line) >= 2:
-                        points, (text, confidence) = line
-                        ret_data["data"].append({
-                            "text": text.strip(),
-                            "confidence": float(confidence),
-                            "position": [list(map(int, p)) for p in points],
-                            'y_position': sum(p[1] for p in points) / 4
-                        })
-
-                # 仅在需要时合并（merge_level > 0）
-                if merge_level > 0:
-                    ret_data["data"] = self._mac_merge_lines(ret_data["data"], level=merge_level)
-
-                # # 调试信息（可选）
-                # for item in ret_data["data"]:
-                #     print(f"Text: {item['text']}, Y: {item['y_position']}, X: {item['position'][0][0]}")
+                ret_data["data"] = self._format_lines(ocr_result[0], merge_level)
 
             return ret_data
 
@@ -253,85 +147,425 @@ class OCRProcessor:
             print(datetime.now(), f"OCR处理失败: {str(e)}")
             return {"code": 50000, "error": str(e)}
 
-    def _mac_merge_lines(self, text_blocks: List[Dict], level: int = 1) -> List[Dict]:
+    def ocr_regions(self, roi_map: Dict[Hashable, np.ndarray], merge_level: int = 0,
+                    preprocess: Callable = None, rec_only: Collection[Hashable] = ()) -> Dict[Hashable, Dict]:
+        """
+        批量识别多个区域（可以来自同一份报告，也可以来自多份报告）
+        所有区域预处理后竖向拼接成少量画布做检测，再把全部文本框一次性送入识别器（按 rec_batch_num 分批），
+        避免每个小区域单独跑一遍 det + rec
+        :param roi_map: {(report, region): 区域图像}
+        :param preprocess: 区域预处理函数，默认 preprocess_image
+        :param rec_only: 仅识别的区域 key，按水平投影切分文本行后直接送入识别器，不做文本检测
+        :return: {(report, region): 与 ocr_image 相同格式的结果}
         """
-        macOS专属文本合并策略  level参数: 0 - 不合并  1 - 行合并（默认） 2 - 段落合并（适合多栏文本）
+        tiles, line_tiles, ret = self.prepare_regions(roi_map, preprocess, rec_only)
+        recognized = self.recognize_tiles(tiles, line_tiles, merge_level)
+        for key in roi_map:
+            ret.setdefault(key, recognized.get(key, {"code": 20000, "data": []}))
+        return ret
+
+    @staticmethod
+    def prepare_regions(roi_map: Dict[Hashable, np.ndarray], preprocess: Callable = None,
+                        rec_only: Collection[Hashable] = ()) -> Tuple[List, List, Dict[Hashable, Dict]]:
+        """
+        区域预处理，不使用引擎：流水线的预处理线程直接调用 OCRProcessor.prepare_regions，无需借用引擎
+        :return: (需检测的 [(key, 二值图)], 仅识别的 [(key, 二值图)], 预处理失败的 {key: 错误结果})
+        """
+        preprocess = preprocess or OCRProcessor.preprocess_image
+        tiles, line_tiles, errors = [], [], {}
+        with timed('preprocess'):
+            for key, roi in roi_map.items():
+                try:
+                    if roi is None or roi.size == 0:
+                        continue
+                    processed = preprocess(OCRProcessor.load_image(roi))
+                    (line_tiles if key in rec_only else tiles).append((key, processed))
+                except Exception as e:
+                    print(datetime.now(), f"OCR预处理失败 {key}: {str(e)}")
+                    errors[key] = {"code": 50000, "error": str(e)}
+        return tiles, line_tiles, errors
+
+    def recognize_tiles(self, tiles: List[Tuple[Hashable, np.ndarray]], line_tiles: List[Tuple[Hashable, np.ndarray]],
+                        merge_level: int = 0) -> Dict[Hashable, Dict]:
         """
-        if level == 0 or len(text_blocks) <= 1:
-            return text_blocks
-
-        # 按Y坐标排序（考虑macOS的Retina显示屏高DPI特性）
-        sorted_blocks = sorted(
-            text_blocks,
-            key=lambda x: (sum(p[1] for p in x["position"]) / 4, x["position"][0][0])
-        )
-
-        merged = []
-        current = sorted_blocks[0]
-
-        for block in sorted_blocks[1:]:
-            c_box = np.array(current["position"])
-            n_box = np.array(block["position"])
-
-            # 计算垂直重叠（macOS需要更宽松的阈值）
-            y_overlap = min(c_box[:, 1].max(), n_box[:, 1].max()) - max(c_box[:, 1].min(), n_box[:, 1].min())
-            min_height = min(c_box[:, 1].max() - c_box[:, 1].min(), n_box[:, 1].max() - n_box[:, 1].min())
-
-            # 合并条件判断
-            if (y_overlap > min_height * 0.3 and  # 宽松垂直重叠条件
-                    (n_box[0, 0] - c_box[1, 0]) < (c_box[1, 0] - c_box[0, 0]) * 2.5):  # 动态水平间距阈值
-
-                # 合并文本框
-                new_pos = [
-                    [min(c_box[0, 0], n_box[0, 0]), min(c_box[0, 1], n_box[0, 1])],
-                    [max(c_box[1, 0], n_box[1, 0]), min(c_box[1, 1], n_box[1, 1])],
-                    [max(c_box[2, 0], n_box[2, 0]), max(c_box[2, 1], n_box[2, 1])],
-                    [min(c_box[3, 0], n_box[3, 0]), max(c_box[3, 1], n_box[3, 1])]
-                ]
-                sep = ' ' if level == 1 else '\n'  # 段落合并换行
-                current = {
-                    "text": current["text"] + sep + block["text"],
-                    "confidence": min(current["confidence"], block["confidence"]),
-                    "position": new_pos
-                }
-            else:
-                merged.append(current)
-                current = block
-
-        merged.append(current)
-        return merged
-
-
-def get_pdf_orientation(image_path: str) -> Literal['portrait', 'landscape', 'square', 'unknown']:
+        识别预处理后的区域，可以来自多份报告
+        :return: {key: 与 ocr_image 相同格式的结果}
+        """
+        ret = {key: {"code": 20000, "data": []} for key, _ in tiles + line_tiles}
+        OCR_REGIONS.inc('detect', amount=len(tiles))
+        OCR_REGIONS.inc('rec_only', amount=len(line_tiles))
+
+        try:
+            # 1. 拼接画布批量检测，检测框映射回各自区域
+            crops, owners = [], []
+            for canvas, placements in self._build_mosaics(tiles):
+                offsets = [y for _, y, _ in placements]
+                with timed('detect'):
+                    boxes = self._run_detector(canvas)
+                for box in boxes:
+                    center_y = float(np.mean(box[:, 1]))
+                    idx = bisect.bisect_right(offsets, center_y) - 1
+                    if idx < 0:
+                        continue
+                    key, y_offset, tile_h = placements[idx]
+                    if center_y >= y_offset + tile_h:
+                        continue  # 落在拼接留白中
+                    crops.append(_crop_text_box(canvas, box))
+                    owners.append((key, box - np.array([0, y_offset], dtype=box.dtype)))
+
+            # 仅识别的区域：投影切行，行图直接作为识别输入
+            for key, tile in line_tiles:
+                for left, top, right, bottom in _split_text_lines(tile):
+                    crops.append(tile[top:bottom, left:right])
+                    owners.append((key, np.array([[left, top], [right, top], [right, bottom], [left, bottom]],
+                                                 dtype=np.float32)))
+
+            # 2. 全部文本框一次送入识别器
+            with timed('recognize'):
+                rec_res = self._run_recognizer(crops)
+
+            # 3. 按区域归集结果
+            drop_score = getattr(self.ocr_engine, 'drop_score', 0.5)
+            lines_by_key = {}
+            for (key, box), (text, score) in zip(owners, rec_res):
+                if score >= drop_score:
+                    lines_by_key.setdefault(key, []).append([box.tolist(), (text, score)])
+            for key, lines in lines_by_key.items():
+                ret[key]["data"] = self._format_lines(lines, merge_level)
+        except Exception as e:
+            print(datetime.now(), f"批量OCR处理失败: {str(e)}")
+            for key, _ in tiles + line_tiles:
+                ret[key] = {"code": 50000, "error": str(e)}
+        return ret
+
+    def _run_detector(self, image: np.ndarray) -> List[np.ndarray]:
+        """文本检测，返回 (4, 2) 的四点框列表"""
+        image = _model_input(image)
+        with self._infer_lock:
+            dt_boxes, _ = self.ocr_engine.text_detector(image)
+        return [] if dt_boxes is None else list(dt_boxes)
+
+    def _run_recognizer(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """文本识别，识别器内部按 rec_batch_num 分批推理"""
+        if not crops:
+            return []
+        crops = [_model_input(crop) for crop in crops]
+        with self._infer_lock:
+            rec_res, _ = self.ocr_engine.text_recognizer(crops)
+        return rec_res
+
+    @staticmethod
+    def _build_mosaics(tiles: List[Tuple[Hashable, np.ndarray]]) -> List[Tuple[np.ndarray, List]]:
+        """将多个灰度区域竖向拼接成若干张画布，返回 [(画布, [(key, y偏移, 高度)])]"""
+        mosaics, group = [], []
+        height = width = 0
+        for key, tile in tiles:
+            h, w = tile.shape[:2]
+            if group and height + h > ehp_config.OCR_MOSAIC_MAX_HEIGHT:
+                mosaics.append((group, height, width))
+                group, height, width = [], 0, 0
+            group.append((key, height, tile))
+            height += h + ehp_config.OCR_MOSAIC_GAP
+            width = max(width, w)
+        if group:
+            mosaics.append((group, height, width))
+
+        ret = []
+        for group, height, width in mosaics:
+            canvas = np.full((height, width), 255, dtype=np.uint8)
+            placements = []
+            for key, y, tile in group:
+                canvas[y:y + tile.shape[0], :tile.shape[1]] = tile
+                placements.append((key, y, tile.shape[0]))
+            ret.append((canvas, placements))
+        return ret
+
+    def _format_lines(self, lines: List, merge_level: int = 0) -> List[Dict]:
+        """将 [[四点坐标, (文本, 置信度)], ...] 按行分组排序（从上到下、行内从左到右）并转换为输出格式"""
+        lines = [line for line in lines if len(line) >= 2]
+        if not lines:
+            return []
+        order, _ = group_lines(token_boxes([points for points, _ in lines]))
+        data = []
+        for i in order:
+            points, (text, confidence) = lines[i]
+            data.append({
+                "text": text.strip(),
+                "confidence": float(confidence),
+                "position": [list(map(int, p)) for p in points],
+                'y_position': sum(p[1] for p in points) / 4
+            })
+
+        # 仅在需要时合并（merge_level > 0）: 1 - 行合并 2 - 段落合并（适合多栏文本）
+        if merge_level > 0:
+            data = merge_line_tokens(data, level=merge_level)
+        return data
+
+
+def _model_input(image: np.ndarray) -> np.ndarray:
+    """det / rec 模型输入为三通道，灰度图只在送入模型前复制通道（检测画布、文本行小图，不涉及整页）"""
+    if image.ndim == 2:
+        return cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_GRAY2BGR)
+    return image
+
+
+def _crop_text_box(image: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """按四点框透视变换截取文本行（与 PaddleOCR get_rotate_crop_image 一致）"""
+    points = np.asarray(points, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    # 竖排文本旋转为横排
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def _split_text_lines(binary: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    二值图按水平投影切分文本行，返回每行的 (left, top, right, bottom)
+    适用于位置固定、内容为一到几行文字的区域，代替 DB 文本检测
+    """
+    ink = binary < 128
+    if ink.mean() > 0.5:  # 深色背景浅色文字
+        ink = ~ink
+    rows = np.flatnonzero(ink.any(axis=1))
+    if rows.size == 0:
+        return []
+
+    # 相邻有墨迹的行间隔不超过 OCR_LINE_MAX_GAP 视为同一文本行
+    breaks = np.flatnonzero(np.diff(rows) > ehp_config.OCR_LINE_MAX_GAP + 1)
+    starts = np.concatenate(([rows[0]], rows[breaks + 1]))
+    ends = np.concatenate((rows[breaks], [rows[-1]])) + 1
+
+    pad = ehp_config.OCR_LINE_PADDING
+    height, width = ink.shape
+    lines = []
+    for top, bottom in zip(starts, ends):
+        if bottom - top < ehp_config.OCR_LINE_MIN_HEIGHT:
+            continue  # 噪点、表格线
+        cols = np.flatnonzero(ink[top:bottom].any(axis=0))
+        lines.append((max(int(cols[0]) - pad, 0), max(int(top) - pad, 0),
+                      min(int(cols[-1]) + 1 + pad, width), min(int(bottom) + pad, height)))
+    return lines
+
+
+class OCREnginePool:
+    """
+    进程级 OCR 引擎池
+    启动时加载并预热 size 个 OCRProcessor，调用方借出使用后归还，避免每份报告都重新加载 det/rec 模型
+    """
+
+    def __init__(self, size: int = None):
+        self.size = size or ehp_config.OCR_ENGINE_POOL_SIZE
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._created = 0  # 已加载及正在加载的引擎数，不超过 size
+        self._loaded = 0
+
+    @property
+    def is_ready(self) -> bool:
+        """所有引擎均已加载并预热"""
+        return self._ready.is_set()
+
+    @property
+    def idle_count(self) -> int:
+        return self._idle.qsize()
+
+    def _reserve(self) -> bool:
+        """占用一个引擎名额，池已满时返回 False；加载在锁外进行，预热线程和借用方可以同时各自加载"""
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _create(self) -> OCRProcessor:
+        """加载并预热一个引擎（需先 _reserve），失败时归还名额"""
+        start_time = time.time()
+        try:
+            processor = OCRProcessor()
+            processor.warm_up()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._loaded += 1
+            loaded = self._loaded
+        print(datetime.now(), f"OCR 引擎 {loaded}/{self.size} 预热完成，耗时 {time.time() - start_time} s")
+        if loaded >= self.size:
+            self._ready.set()
+        return processor
+
+    def warm_up(self):
+        """依次加载并预热尚未创建的引擎，每预热完一个立即放入池中可供借用"""
+        while self._reserve():
+            self._idle.put(self._create())
+
+    def start(self):
+        """后台线程预热，不阻塞服务启动"""
+        t = threading.Thread(target=self.warm_up, name='ocr-engine-warm-up', daemon=True)
+        t.start()
+        return t
+
+    def checkout(self, timeout: float = None) -> OCRProcessor:
+        """借出一个引擎：有空闲引擎直接借出，池未满时自己加载一个（不等整池预热），否则等待归还"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self._reserve():
+            return self._create()
+        try:
+            return self._idle.get(timeout=timeout or ehp_config.OCR_ENGINE_CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"等待 OCR 引擎超时（池大小 {self.size}）")
+
+    def release(self, processor: OCRProcessor):
+        """归还引擎"""
+        self._idle.put(processor)
+
+    @contextmanager
+    def engine(self, timeout: float = None):
+        processor = self.checkout(timeout)
+        try:
+            yield processor
+        finally:
+            self.release(processor)
+
+    def status(self) -> Dict:
+        return {"ready": self.is_ready, "size": self.size, "created": self._created, "loaded": self._loaded,
+                "idle": self.idle_count}
+
+
+ocr_engine_pool = OCREnginePool()
+register_gauge('ehp_ocr_engines_idle', '空闲 OCR 引擎数', lambda: ocr_engine_pool.idle_count)
+
+
+def get_pdf_orientation(page) -> Literal['portrait', 'landscape', 'square', 'unknown']:
     """
-    根据图片尺寸判断方向
-    :param image_path: 图片文件路径
+    根据页面尺寸判断方向
+    :param page: PDF 页面
     :return: 方向类型
     """
-    # 检查文件是否存在
-    if not os.path.exists(image_path):
-        print(f"图片文件不存在: {image_path}")
+    if page is None:
         return 'unknown'
 
-    try:
-        # 打开图片并获取尺寸
-        with Image.open(image_path) as img:
-            width, height = img.size
+    width, height = page_size(page)
+    if not height:
+        return 'unknown'
+    # 计算宽高比
+    ratio = width / height
 
-            # 计算宽高比
-            ratio = width / height
+    # 判断方向
+    if ratio > 1.25:  # 横版：宽明显大于高
+        return 'landscape'
+    elif ratio < 0.8:  # 竖版：高明显大于宽
+        return 'portrait'
+    else:  # 正方形或接近正方形
+        return 'square'
 
-            # 判断方向
-            if ratio > 1.25:  # 横版：宽明显大于高
-                return 'landscape'
-            elif ratio < 0.8:  # 竖版：高明显大于宽
-                return 'portrait'
-            else:  # 正方形或接近正方形
-                return 'square'
 
-    except Exception as e:
-        print(f"图片读取失败: {str(e)}")
-        return 'unknown'
+def region_rect(page, template: ReportTemplate, region, orientation: str = None):
+    """模板区域换算为页面坐标：按参考页面尺寸归一化，再乘以实际页面尺寸"""
+    orientation = orientation or get_pdf_orientation(page)
+    ref_width, ref_height = reference_page_size(page, template.page_size_for(orientation))
+    return relative_to_rect(page, region.relative((ref_width * REGION_DPI / 72, ref_height * REGION_DPI / 72)))
+
+
+class RegionDpiCache:
+    """
+    自动选择的区域渲染分辨率 {(模板, 页面方向, 区域序号): 最近几份报告的测量值}
+    前 OCR_REGION_DPI_SAMPLES 份报告各自测量并使用自己的结果，之后取中位数复用，不再测量；
+    复用超过 OCR_REGION_DPI_TTL 秒后再测量一份替换最早的样本，个别版式异常的报告（页面内容稀疏、固件字号不同）不会固定后续报告的 dpi
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _median(samples) -> int:
+        return sorted(samples)[len(samples) // 2]
+
+    def get(self, key: Tuple, measure: Callable[[], Optional[int]]) -> Optional[int]:
+        """返回缓存的 dpi；样本不足或已过期时调用 measure() 测量，区域内没有文字时 measure 返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if len(entry['samples']) >= ehp_config.OCR_REGION_DPI_SAMPLES \
+                        and now - entry['measured_at'] < ehp_config.OCR_REGION_DPI_TTL:
+                    return self._median(entry['samples'])
+        dpi = measure()
+        with self._lock:
+            entry = self._entries.get(key)
+            if dpi is None:
+                return self._median(entry['samples']) if entry else None
+            if entry is None:
+                entry = self._entries[key] = {'samples': deque(maxlen=ehp_config.OCR_REGION_DPI_SAMPLES)}
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            entry['samples'].append(dpi)
+            entry['measured_at'] = now
+        return dpi
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def status(self) -> List[Dict]:
+        with self._lock:
+            return [{"template": template_key, "orientation": orientation, "region": r_idx,
+                     "dpi": self._median(entry['samples']), "samples": list(entry['samples']),
+                     "measured_at": datetime.fromtimestamp(entry['measured_at']).strftime("%Y-%m-%d %H:%M:%S")}
+                    for (template_key, orientation, r_idx), entry in self._entries.items()]
+
+
+region_dpi_cache = RegionDpiCache()
+
+
+def region_render_dpi(page, template: ReportTemplate, orientation: str, r_idx: int, region, rect) -> int:
+    """区域渲染分辨率：区域指定的固定 dpi，或按区域内文字高度自动选择"""
+    if region.dpi:
+        return region.dpi
+    if not ehp_config.OCR_ADAPTIVE_DPI:
+        return REGION_DPI
+    dpi = region_dpi_cache.get((template.cache_key, orientation, r_idx),
+                               lambda: pick_render_dpi(page, rect, ehp_config.OCR_TEXT_TARGET_PX,
+                                                       ehp_config.OCR_REGION_DPI_MIN, ehp_config.OCR_REGION_DPI_MAX))
+    # 本页该区域没有文字且还没有样本时使用默认 dpi
+    return dpi or REGION_DPI
+
+
+def render_roi(page, rect, dpi: int = REGION_DPI) -> np.ndarray:
+    """渲染 OCR 区域，默认直接渲染为灰度图"""
+    if ehp_config.OCR_RENDER_GRAY:
+        return render_gray(page, rect, dpi)
+    return render_rect(page, rect, dpi)
+
+
+def ocr_page_regions(processor: OCRProcessor, page, rects: List, file_path: str = '',
+                     preprocess: Callable = None, dpi: int = REGION_DPI) -> List[List[str]]:
+    """
+    渲染同一页上的全部区域（页面坐标矩形）并一次批量识别
+    :return: 与 rects 一一对应的文本列表，失败的区域为空列表
+    """
+    rois = {}
+    for idx, rect in enumerate(rects):
+        try:
+            rois[idx] = render_roi(page, rect, dpi)
+        except Exception as e:
+            print(datetime.now(), f'解析 {file_path} 坐标区域 {rect} 失败: {e}')
+    results = processor.ocr_regions(rois, preprocess=preprocess)
+    return [[item["text"] for item in results.get(idx, {}).get("data", [])] for idx in range(len(rects))]
 
 
 def extract_patient_name(filename):
@@ -351,573 +585,257 @@ def extract_patient_name(filename):
     except:
         return ""
 
-def analysis_pdf(file_path):
+
+def _select_page(doc, template: ReportTemplate, get_processor: Callable[[], OCRProcessor], file_path: str):
     """
-    解析pdf文件，并返回患者名字以及需要提取的数据
-    非pdf文件不进行解析
-    :param file_path:
-    :return:
+    按模板的探测区域找到目标页（如 Master700 的生物统计值页），未配置探测规则时取第一页
+    先按文本层关键字定位，否则按页面指纹排序后依次探测确认；有文本层的页面直接读取探测区域文字，没有文本层的页面才 OCR
     """
-    file_name = os.path.basename(file_path)
-    if not file_path.endswith(".pdf") and not (str(file_name).startswith("角膜内皮细胞报告")
-                                               or str(file_name).startswith("屈光四图")
-                                               or str(file_name).startswith("屈光六图")
-                                               or str(file_name).startswith("眼底照片")
-                                               or str(file_name).startswith("OD")
-                                               or str(file_name).startswith("OS")
-                                               or str(file_name).startswith("Master700")
-                                               or str(file_name).startswith("眼表综合检查报告")
-                                               or str(file_name).startswith("生物力学")
-                                               or str(file_name).startswith("角膜地形图")):
-        return None, {}
+    if not template.page_probe:
+        return doc[0]
+    probe, pattern = template.page_probe
+
+    def probe_page(page) -> bool:
+        rect = region_rect(page, template, probe)
+        words = page_words(page) if ehp_config.PDF_TEXT_LAYER_ENABLED else []
+        if words:
+            texts = [token["text"] for token in region_tokens(words, rect)]
+        else:
+            texts = ocr_page_regions(get_processor(), page, [rect], file_path, template.preprocess)[0]
+        return bool(pattern.search(" ".join(texts)))
+
+    return select_page(doc, template, probe_page, ehp_config.PDF_TEXT_LAYER_ENABLED)
+
 
+def _extract_from_text_layer(page, template: ReportTemplate, rects: List,
+                             file_name: str) -> Optional[Tuple[List[List[Dict]], Dict]]:
+    """
+    文本层快速通道：按区域几何位置从 PDF 内嵌文本中取文字并提取字段
+    页面没有文本层、区域内没有文字或字段校验不通过时返回 None，由调用方回退到 OCR
+    :return: (各区域文本框, 提取结果)
+    """
+    words = page_words(page)
+    if not words:
+        return None
+    tokens = [region_tokens(words, rect) for rect in rects]
+    if not all(tokens):
+        return None
     try:
-        start_time = time.time()
-        # 将pdf文件转换为图片，方便解析, 如果pdf有多页，则会生成多个图片，默认取第一张
-        saved_jpgs = pdf_to_jpg(file_path)
-        # print(datetime.now(), f'{file_path} 已转换为图片，数量 {len(saved_jpgs)}, 耗时 {time.time() - start_time} 秒')
-        # start_time = time.time()
-
-        # 解析图片，识别患者姓名 & 提取数据
-        file_name = os.path.basename(file_path)
-        processor = OCRProcessor()
-
-        result = {}
-        if str(file_name).startswith("角膜内皮细胞报告"):
-            img = Image.open(saved_jpgs[0])
-            if str(file_name).startswith("角膜内皮细胞报告2"):
-                regions = [
-                    (330, 430, 2200, 550),
-                    (1110, 1120, 1580, 1310),
-                    (1110, 2400, 1580, 2600),
-                ]
-            else:
-                regions = [
-                    (330, 430, 2200, 550),
-                    (1250, 1080, 1650, 1280),
-                    (1250, 2380, 1650, 2580),
-                ]
-            ret_str = ""
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = " ".join(all_texts)
-                    # print(joined_text)
-                    ret_str = ret_str + joined_text + '  '
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-
-            def extract_name_and_cd(text: str) -> dict:
-                """从文本中提取姓名和CD值"""
-                result = {"name": '', "r_cd": '', 'l_cd': ''}
-                name_match = re.search(r'姓名[：:\s]*([\u4e00-\u9fa5]{2,4})', text)
-                if name_match:
-                    result["name"] = name_match.group(1)
-                # 提取CD值（支持 CD 1234 或 CD:1234 等形式）
-                cd_matches = re.findall(r'CD[：:\s]*(\d+)', text, re.IGNORECASE)
-                if cd_matches:
-                    result['r_cd'] = cd_matches[0]
-                    result['l_cd'] = cd_matches[1] if len(cd_matches) > 1 else ''
-                return result
-
-            result = extract_name_and_cd(ret_str)
-
-        elif ((str(file_name).__contains__("_OD_20") or str(file_name).__contains__("_OS_20"))
-              and not str(file_name).__contains__("Maps Refr")):
-            # 阿玛仕手术报告
-            img = Image.open(saved_jpgs[0])
-            regions = [
-                (300, 940, 1200, 1100),
-                (400, 1350, 1600, 1450),
-                (300, 1555, 1200, 1625),
-                (1425, 700, 2380, 780),
-                (1425, 940, 2380, 1020),
-            ]
-            ret_str = ""
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = " ".join(all_texts)
-                    # print(joined_text)
-                    ret_str = ret_str + joined_text + '  '
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-
-            def extract_corneal_data(text: str) -> Dict[str, List[str]]:
-                """从阿玛仕手术报告文本中提取关键信息"""
-                result = {}
-                eye_type = 'od' if str(file_name).__contains__('OD') else 'os'
-                # 角膜曲率
-                d_match = re.findall(r"(\d+,\d+)\s+D", text)
-                if d_match:
-                    d_match = d_match[:2]
-                    d_match = ",".join(d_match)
-                result[f'corneal_curvate_{eye_type}'] = d_match if d_match else ''
-
-                # 屈光度
-                name_match = re.search(r"(-?\d+,\d+\s+D\s+-?\d+,\d+\s+Dx\s*\d+)", text)
-                result[f"diopter_{eye_type}"] = name_match.group(1) if name_match else ''
-                result[f"light_area_{eye_type}"] = re.search(r"(\d+,\d+\s+mm)", text).group(1) if re.search(r"(\d+,\d+\s+mm)", text) else ''
-                result[f"cut_depth_{eye_type}"] = re.search(r"(\d+\s+um)", text).group(1) if re.search(r"(\d+\s+um)", text) else ''
-                result[f"cut_time_{eye_type}"]  = re.search(r"(\d+\s+s)", text).group(1) if re.search(r"(\d+\s+s)", text) else ''
-                result['name'] = ''
-                return result
-
-            result = extract_corneal_data(ret_str)
-
-        elif str(file_name).startswith("屈光四图") or ((str(file_name).__contains__("OD") or
-                                                        str(file_name).__contains__("OS"))
-                                                       and str(file_name).__contains__("4 Maps Refr")):
-            orientation = get_pdf_orientation(saved_jpgs[0])
-            if orientation == 'portrait':
-                regions = [
-                    (50, 1150, 700, 1450),
-                    (60, 1450, 700, 1710),
-                    (60, 2250, 700, 2500),
-                    (60, 2480, 700, 2670),
-                ]
-            else:
-                regions = [
-                    (280, 500, 1080, 860),
-                    (290, 890, 1080, 1350),
-                    (290, 1800, 1080, 2150),
-                    (290, 2150, 1080, 2370),
-                ]
-
-            img = Image.open(saved_jpgs[0])
-            ret_str = ""
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = " ".join(all_texts)
-                    # print(joined_text)
-                    ret_str = ret_str + joined_text + '  '
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-
-            def extract_eye_exam_data(text: str, last_text: str) -> Dict[str, Optional[str]]:
-                """
-                从眼科检查文本中提取关键信息（包含眼睛位置和时间）
-                """
-                result = {}
-                # 1. 提取姓名（姓 + 名）
-                surname_match = re.search(r'姓[：:\s]*([A-Za-z]+)', text)
-                given_name_match = re.search(r'名[：:\s]*([A-Za-z]+)', text)
-                if surname_match and given_name_match:
-                    result["name"] = f"{surname_match.group(1)}{given_name_match.group(1)}"
-
-                # 2. 提取眼睛位置
-
-                eye_match = re.search(r'眼睛[：:\s]*(左眼|右眼)', text)
-                if eye_match:
-                    result["eye"] = eye_match.group(1)
-
-                eye = 'l_' if result["eye"] == '左眼' else 'r_'
-
-                # 4. 提取K1值（字符串格式）
-                k1_match = re.search(r'K1[。.：:\s]*([\d\.]+)\s*D?', text)
-                if k1_match:
-                    result[f"{eye}k1"] = k1_match.group(1)
-
-                # 5. 提取K2值（字符串格式）
-                k2_match = re.search(r'K2[。.：:\s]*([\d\.]+)\s*D?', text)
-                if k2_match:
-                    result[f"{eye}k2"] = k2_match.group(1)
-
-                # 6. 提取RM值（字符串格式）
-                rm_match = re.search(r'Rm[。.：:\s]*([\d\.]+)\s*毫?米?', text)
-                if rm_match:
-                    result[f"{eye}rm"] = rm_match.group(1)
-
-                # 7. 提取最薄点位置（字符串格式）
-                thinnest_match = re.search(r'最薄点位置[。.：:\s]*(\d+)\s*微?米?', text)
-                if thinnest_match:
-                    result[f"{eye}thinnest_point"] = thinnest_match.group(1)
-
-                # 8. 提取前房深度  水平方向白到白距离
-                # items = re.findall(r'([\d.]+)\s*(毫米3|毫米|度?)', last_text)
-                pattern = r'([\d.]+)\s*(毫米3|毫米\.3|毫米|度?)'
-                items = re.findall(pattern, last_text)
-                result[f"{eye}distance"] = f"{items[1][0]}{items[1][1]}" if len(items) > 1 and len(items[1]) > 1 else ''
-                result[f"{eye}depth"] = f"{items[4][0]}{items[4][1]}" if len(items) > 4 and len(items[4]) > 1 else ''
-                return result
-
-            result = extract_eye_exam_data(ret_str, joined_text)
-
-        elif str(file_name).startswith("角膜地形图"):
-            img = Image.open(saved_jpgs[0])
-            regions = [
-                (50, 150, 1100, 300),
-                (50, 1600, 1100, 2000),
-                (1750, 1600, 2800, 2000),
-            ]
-
-            ret_str = ""
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = " ".join(all_texts)
-                    # print(joined_text)
-                    ret_str = ret_str + joined_text + '  '
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-
-            def extract_corneal_data(text: str) -> Dict[str, List[str]]:
-                """从角膜地形图文本中提取关键信息"""
-                result = {}
-                # 1. 提取姓名（中文姓名）
-                name_match = re.search(r'^([\u4e00-\u9fa5]{2,4})', text)
-                if name_match:
-                    result["name"] = name_match.group(1)
-
-                # 2. 提取平K值（多个）
-                flat_k_matches = re.findall(r'平K\s*([\d\.]+)', text)
-                if flat_k_matches:
-                    result['r_pk1'] = flat_k_matches[0]
-                    result['l_pk1'] = flat_k_matches[1] if len(flat_k_matches) > 1 else ''
-
-                # 3. 提取陡K值（多个）
-                steep_k_matches = re.findall(r'陡K\s*([\d\.]+)', text)
-                if steep_k_matches:
-                    result["r_xk2"] = steep_k_matches[0]
-                    result["l_xk2"] = steep_k_matches[1] if len(steep_k_matches) > 1 else ''
-
-                # 匹配模式：△K 后跟数字和单位D
-                k_matches = re.findall(r'△K\s*([\d.]+)\s*D', text)
-                if k_matches:
-                    result["r_dk3"] = k_matches[0]
-                    result["l_dk3"] = k_matches[1] if len(steep_k_matches) > 1 else ''
-
-                # 4. 提取平面e值（多个）
-                flat_e_matches = re.findall(r'平面e\s*([\d\.]+)', text)
-                if flat_k_matches:
-                    result["r_pe"] = flat_e_matches[0]
-                    result["l_pe"] = flat_e_matches[1] if len(flat_e_matches) > 1 else ''
-
-                return result
-
-            result = extract_corneal_data(ret_str)
-
-        elif str(file_name).startswith("Master700"):
-            # Master 700 报告
-            for item in saved_jpgs:
-                img = Image.open(item)
-                ret_str = ""
-                crop_box = (950, 930, 1600, 1090)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = " ".join(all_texts)
-                    ret_str = ret_str + joined_text + '  '
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {crop_box} 失败: {e}')
-                if ret_str.__contains__("生物统计值") or ret_str.__contains__("生物") or ret_str.__contains__("生"):
-                    regions = [
-                        (250, 1360, 560, 1425),
-                        (650, 2760, 1220, 2820),
-                        (220, 2710, 600, 2770),
-                        (250, 1416, 560, 1470),
-                    ]
-                    r_ret_str = ""
-                    for region in regions:
-                        left, top, right, bottom = region
-                        crop_box = (left, top, right, bottom)
-                        try:
-                            roi = img.crop(crop_box)
-                            ocr_result = processor.ocr_image(np.array(roi))
-                            all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                            joined_text = " ".join(all_texts)
-                            # print(joined_text)
-                            r_ret_str = r_ret_str + joined_text + '  '
-                        except Exception as e:
-                            print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-
-                    regions = [
-                        (1330, 1360, 1630, 1425),
-                        (1720, 2760, 2240, 2820),
-                        (1290, 2710, 1700, 2770),
-                        (1310, 1416, 1630, 1470),
-                    ]
-                    l_ret_str = ""
-                    for region in regions:
-                        left, top, right, bottom = region
-                        crop_box = (left, top, right, bottom)
-                        try:
-                            roi = img.crop(crop_box)
-                            ocr_result = processor.ocr_image(np.array(roi))
-                            all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                            joined_text = " ".join(all_texts)
-                            # print(joined_text)
-                            l_ret_str = l_ret_str + joined_text + '  '
-                        except Exception as e:
-                            print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-
-                    def parse_biometry_data(data_string, is_left):
-                        print(data_string)
-                        """从字符串中解析AL值和CW-chord值"""
-                        # 初始化结果字典
-                        # 初始化结果字典
-                        ret = { 'AL': [], 'CW_chord': [], "WTW": [], "CCT": []}
-
-                        # 支持中英文的AL值正则表达式
-                        al_patterns = [
-                            r'AL:\s*(\d+\.\d+)\s*mm',  # 英文格式: AL: 26.21 mm
-                            r'AL[：:]\s*(\d+\.\d+)\s*mm',  # 中文冒号: AL：26.21 mm
-                        ]
-
-                        # 支持中英文的CW-chord值正则表达式
-                        cw_patterns = [
-                            r'(?:CW-chord|角膜直径)[：:]\s*([\d\.]+)\s*(?:mm|毫米|厘米|cm)?\s*(?:@|在|角度)?\s*(\d+)(?:°|度)?'
-                        ]
-
-                        wtw_patterns = [
-                            r'WTW:\s*(\d+\.\d+)\s*mm',  # 英文格式: WTW: 26.21 mm
-                            r'WTW[：:]\s*(\d+\.\d+)\s*mm',  # 中文冒号: WTW：26.21 mm
-                        ]
-
-                        cct_patterns = [
-                            r'CCT[:：]\s*(\d+\.?\d*)'
-                        ]
-
-                        # 解析AL值
-                        for pattern in al_patterns:
-                            al_matches = re.findall(pattern, data_string)
-                            for match in al_matches:
-                                ret['AL'].append(match)
-
-                        # 解析CW-chord值
-                        for pattern in cw_patterns:
-                            cw_matches = re.findall(pattern, data_string)
-                            for value, angle in cw_matches:
-                                ret['CW_chord'].append(f"{value} mm @ {angle}°")
-
-                        # 解析WTW值
-                        for pattern in wtw_patterns:
-                            wtw_matches = re.findall(pattern, data_string)
-                            for match in wtw_matches:
-                                ret['WTW'].append(match)
-
-                        # 解析CCT值
-                        for pattern in cct_patterns:
-                            cct_matches = re.findall(pattern, data_string)
-                            for match in cct_matches:
-                                ret['CCT'].append(match)
-
-                        als = list(set(ret['AL']))
-                        cws = list(set(ret['CW_chord']))
-                        wtw = list(set(ret['WTW']))
-                        cct = list(set(ret['CCT']))
-                        if is_left:
-                            result['l_al'] = als[0] if len(als) >0 else ''
-                            result['l_cct'] = cct[0] if len(cct) >0 else ''
-                            result['l_wtw'] = wtw[0] if len(wtw) >0 else ''
-                            result['l_cw_chord'] = cws[0] if len(cws) >0 else ''
-                        else:
-                            result['r_al'] = als[0] if len(als) > 0 else ''
-                            result['r_cct'] = cct[0] if len(cct) > 0 else ''
-                            result['r_wtw'] = wtw[0] if len(wtw) > 0 else ''
-                            result['r_cw_chord'] = cws[0] if len(cws) > 0 else ''
-                        return result
-
-                    dict1 = parse_biometry_data(l_ret_str, True)
-                    dict2 = parse_biometry_data(r_ret_str, False)
-                    result = {**dict1, **dict2}
-
-                    break
-
-        elif str(file_name).startswith("眼表综合检查报告"):
-            # 眼表综合检查报告
-            img = Image.open(saved_jpgs[0])
-            regions = [
-                (50, 310, 500, 390),
-                (620, 500, 1000, 580),
-                (1400, 500, 1700, 580),
-            ]
-            i = 0
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                d = ''
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = "".join(all_texts)
-                    # print(joined_text)
-                    if i == 0:
-                        # 匹配中文姓名（2-4个汉字）或英文姓名（字母和空格）
-                        match = re.search(r'[：:]\s*([\u4e00-\u9fa5]{2,4}|[A-Za-z\s]+)', joined_text)
-                        if match:
-                            d = match.group(1).strip()
-                    else:
-                        d = joined_text
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-                    d = ''
-
-                if i == 0:
-                    result["name"] = d.replace(' ', '')
-                if i == 1:
-                    result["r_first_rupture_time"] = d
-                if i == 2:
-                    result["l_first_rupture_time"] = d
-                i = i + 1
-
-        elif str(file_name).startswith("比较两次检查"):
-            img = Image.open(saved_jpgs[0])
-            regions = [
-                (540, 515, 850, 565),
-            ]
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    d = "".join(all_texts)
-                    # print(joined_text)
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-                    d = ''
-                result["name"] = d.replace(' ', '').replace(',', '').replace('，', '').replace('.', '').replace('。', '')
-
-        elif str(file_name).startswith("Scheimpflug图像总览"):
-            img = Image.open(saved_jpgs[0])
-            regions = [
-                (530, 520, 850, 571),
-            ]
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    d = "".join(all_texts)
-                    # print(joined_text)
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-                    d = ''
-                result["name"] = d.replace(' ', '').replace(',', '').replace('，', '').replace('.', '').replace('。', '')
-
-        elif str(file_name).startswith("生物力学"):
-            orientation = get_pdf_orientation(saved_jpgs[0])
-            if orientation == 'portrait':
-                # 竖版
-                regions = [(180, 1210, 430, 1250)]
-            else:
-                regions = [(420, 535, 750, 591)]
-            img = Image.open(saved_jpgs[0])
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = "".join(all_texts)
-                    # print(joined_text)
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-            result["name"] = joined_text.replace(' ', '').replace(',', '').replace('，', '').replace('.', '').replace('。', '')
-
-        elif str(file_name).startswith("屈光六图"):
-            orientation = get_pdf_orientation(saved_jpgs[0])
-            if orientation == 'portrait':
-                # 竖版
-                regions = [(1430, 1170, 1550, 1250)]
-            else:
-                regions = [(1990, 515, 2150, 610)]
-
-            img = Image.open(saved_jpgs[0])
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = "".join(all_texts)
-                    # print(joined_text)
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-            result["name"] = joined_text.replace(' ', '').replace(',', '').replace('，', '').replace('.', '').replace('。', '')
-
-        elif str(file_name).startswith("眼底照片"):
-            regions = [(1150, 50, 1600, 115)]
-            img = Image.open(saved_jpgs[0])
-            for region in regions:
-                left, top, right, bottom = region
-                crop_box = (left, top, right, bottom)
-                try:
-                    roi = img.crop(crop_box)
-                    ocr_result = processor.ocr_image(np.array(roi))
-                    all_texts = [item["text"] for item in ocr_result.get("data", [])]
-                    joined_text = "".join(all_texts)
-                    # print(joined_text)
-                except Exception as e:
-                    print(datetime.now(), f'解析 {saved_jpgs[0]} 坐标区域 {region} 失败: {e}')
-            result["name"] = joined_text.replace(' ', '').replace(',', '').replace('，', '').replace('.', '').replace('。', '')
+        result = template.extract(tokens, file_name)
+    except Exception:
+        return None
+    if template.validate(result):
+        return None
+    return tokens, result
+
+
+def _load_cached(file_path: str, template: ReportTemplate, file_name: str) -> Tuple[Optional[str], Optional[Tuple]]:
+    """
+    查询 OCR 结果缓存，命中时用缓存的区域文本框重新执行模板提取
+    :return: (文件 sha256, (来源, 各区域文本框, 提取结果) 或 None)
+    """
+    try:
+        file_hash = file_sha256(file_path)
+    except Exception as e:
+        print(datetime.now(), f"计算文件 {file_path} 哈希失败: {e}")
+        return None, None
+    cached = ocr_result_cache.get(file_hash, template.cache_key)
+    if cached is None:
+        return file_hash, None
+    try:
+        return file_hash, ('缓存', cached["tokens"], template.extract(cached["tokens"], file_name))
+    except Exception as e:
+        print(datetime.now(), f"缓存结果提取失败 {file_path}: {e}")
+        return file_hash, None
+
 
-        delete_files(saved_jpgs)
+# 监控指标中的结果来源标签
+_SOURCE_LABELS = {'缓存': 'cache', '文本层': 'text_layer', 'OCR': 'ocr'}
+
+
+def _render_report(idx: int, file_path: str, get_processor: Callable[[], OCRProcessor]) -> Optional[Tuple]:
+    """
+    流水线渲染阶段：匹配模板、查询缓存、选择页面；有文本层的直接提取，否则渲染各区域
+    区域渲染完成后立即关闭文档，内存中只保留区域图像
+    :return: ((序号, 文件路径, 模板, 区域, 已得到的结果), 文件 sha256, {(序号, 区域序号): 区域图像})，
+             不需要解析的文件返回 None
+    """
+    file_name = os.path.basename(file_path)
+    template = match_template(file_name)
+    if template is None and not file_path.endswith(".pdf"):
+        return None
+    try:
+        regions, ready, file_hash, rois = [], None, None, {}
+        if template is not None:
+            if ehp_config.OCR_CACHE_ENABLED:
+                with timed('cache_lookup', template.template_id):
+                    file_hash, ready = _load_cached(file_path, template, file_name)
+                if ready is not None:
+                    return (idx, file_path, template, regions, ready), file_hash, rois
+            with timed('open', template.template_id):
+                doc = open_pdf(file_path)
+            if doc is None:
+                return None
+            try:
+                if doc.page_count == 0:
+                    return None
+                with timed('select_page', template.template_id):
+                    page = _select_page(doc, template, get_processor, file_path)
+                if page is not None:
+                    orientation = get_pdf_orientation(page)
+                    regions = template.regions_for(orientation)
+                    rects = [region_rect(page, template, region, orientation) for region in regions]
+                    if ehp_config.PDF_TEXT_LAYER_ENABLED:
+                        with timed('text_layer', template.template_id):
+                            text_layer = _extract_from_text_layer(page, template, rects, file_name)
+                        ready = ('文本层', *text_layer) if text_layer is not None else None
+                    if ready is None:
+                        with timed('render', template.template_id):
+                            for r_idx, (region, rect) in enumerate(zip(regions, rects)):
+                                try:
+                                    dpi = region_render_dpi(page, template, orientation, r_idx, region, rect)
+                                    rois[(idx, r_idx)] = render_roi(page, rect, dpi)
+                                except Exception as e:
+                                    print(datetime.now(), f'解析 {file_path} 坐标区域 {region} 失败: {e}')
+            finally:
+                doc.close()
+        return (idx, file_path, template, regions, ready), file_hash, rois
+    except Exception as e:
+        print(datetime.now(), f"解析文件 {file_path} 失败: {e}")
+        return None
+
+
+def _extract_report(job: Tuple, file_hash: Optional[str], ocr_results: Dict, start_time: float) -> Tuple[Optional[str], Dict]:
+    """按模板提取字段，新识别且校验通过的结果写入缓存"""
+    idx, file_path, template, regions, ready = job
+    file_name = os.path.basename(file_path)
+    try:
+        result, source = {}, 'OCR'
+        if ready is not None:
+            source, _, result = ready
+            if source != '缓存' and file_hash and not template.validate(result):
+                ocr_result_cache.put(file_hash, template.cache_key, ready[1], result, source)
+        elif regions:
+            # 保留文本框坐标，模板按标签与值的位置关系提取字段
+            tokens = [[{"text": item["text"], "position": item["position"]}
+                       for item in ocr_results.get((idx, r_idx), {}).get("data", [])]
+                      for r_idx in range(len(regions))]
+            ocr_ok = all(ocr_results.get((idx, r_idx), {}).get("code", 20000) == 20000
+                         for r_idx in range(len(regions)))
+            with timed('extract', template.template_id):
+                result = template.extract(tokens, file_name)
+            if file_hash and ocr_ok and not template.validate(result):
+                ocr_result_cache.put(file_hash, template.cache_key, tokens, result, source)
+        template_id = template.template_id if template is not None else ''
+        if template is not None and template.validate(result):
+            PARSE_FAILURES.inc(template_id)
+        REPORTS_PARSED.inc(template_id, _SOURCE_LABELS.get(source, source))
+        result = dict(result)
         if not result.get('name'):
-            name = extract_patient_name(file_name)
-            result['name'] = name
-        print(datetime.now(), f"{file_path} 解析成功， 耗时 {time.time() - start_time} s")
+            result['name'] = extract_patient_name(file_name)
+        print(datetime.now(), f"{file_path} 解析成功（{source}）， 耗时 {time.time() - start_time} s")
         return result.get('name', ''), result
     except Exception as e:
+        PARSE_FAILURES.inc(template.template_id if template is not None else '')
         print(datetime.now(), f"解析文件 {file_path} 失败: {e}")
         return None, {}
 
 
+def analysis_pdf_batch(file_paths: List[str]) -> List[Tuple[Optional[str], Dict]]:
+    """
+    批量解析多份报告，渲染 -> 预处理 -> 识别三个阶段流水线并行：
+    前面的报告在识别时，后面的报告已经在渲染、预处理，阶段之间的队列容量为 OCR_PIPELINE_DEPTH 份报告；
+    识别阶段把此刻已预处理完成的所有报告的区域合并为一次批量 OCR 调用
+    非pdf文件且没有匹配模板的不进行解析
+    :param file_paths:
+    :return: 与 file_paths 一一对应的 (患者名字, 提取的数据)
+    """
+    start_time = time.time()
+    results = [(None, {})] * len(file_paths)
+    processor = None
+    processor_lock = threading.Lock()
+
+    def get_processor() -> OCRProcessor:
+        # 只有确实需要 OCR 时才借用引擎，整批都命中缓存或都是矢量 PDF 时不占用引擎
+        nonlocal processor
+        with processor_lock:
+            if processor is None:
+                with timed('engine_checkout'):
+                    processor = ocr_engine_pool.checkout()
+            return processor
+
+    def render(item):
+        return _render_report(*item, get_processor)
+
+    def preprocess(rendered):
+        if rendered is None or not rendered[2]:
+            return rendered
+        job, file_hash, rois = rendered
+        template, regions = job[2], job[3]
+        rec_only = {(job[0], r_idx) for r_idx, region in enumerate(regions) if region.rec_only}
+        return job, file_hash, OCRProcessor.prepare_regions(rois, template.preprocess, rec_only)
+
+    try:
+        with Pipeline(enumerate(file_paths), [render, preprocess], ehp_config.OCR_PIPELINE_DEPTH,
+                      name='pdf-parse') as pipe:
+            for batch in pipe.batches():
+                batch = [item for item in batch if item is not None]
+                # 1. 已预处理完成的报告合并批量识别
+                tiles, line_tiles, ocr_results = [], [], {}
+                for _, _, prepared in batch:
+                    if prepared:
+                        tiles.extend(prepared[0])
+                        line_tiles.extend(prepared[1])
+                        ocr_results.update(prepared[2])
+                if tiles or line_tiles:
+                    with timed('ocr'):
+                        ocr_results.update(get_processor().recognize_tiles(tiles, line_tiles))
+                # 2. 按模板提取字段
+                for job, file_hash, _ in batch:
+                    results[job[0]] = _extract_report(job, file_hash, ocr_results, start_time)
+        return results
+    except Exception as e:
+        print(datetime.now(), f"批量解析文件 {file_paths} 失败: {e}")
+        return results
+    finally:
+        if processor is not None:
+            ocr_engine_pool.release(processor)
+
+
+def analysis_pdf(file_path):
+    """
+    解析pdf文件，并返回患者名字以及需要提取的数据
+    非pdf文件不进行解析
+    :param file_path:
+    :return:
+    """
+    return analysis_pdf_batch([file_path])[0]
+
+
 def regularly_parsing_eye_report():
     db = DbUtil(global_config.DB_HOST, global_config.DB_USERNAME, global_config.DB_PASSWORD,
                 global_config.DB_DATABASE_GYL)
-    report_list = db.query_all(f"SELECT * FROM nsyy_gyl.ehp_reports "
-                               f"WHERE report_value is null ORDER BY report_time limit 5")
+    # 原子领取，多个实例 / 调度线程同时执行时不会重复解析同一份报告
+    report_list = claim_reports(limit=5)
 
     try:
-        value_list = []
+        pending = []
         for report in report_list:
-            file_path = report.get('report_addr').replace('&', '/')
+            file_path = report_file_path(report)
             if not os.path.exists(file_path) and not str(file_path).endswith(".pdf") :
+                # 已领取的报告不能直接跳过，否则一直处于解析中，直到租约过期后被反复领取
+                fail_report(db, report.get('report_id'), f"报告文件不存在: {file_path}", report.get('claimed_by'))
                 continue
+            pending.append((report, file_path))
 
-            patient_name, values = analysis_pdf(file_path)
-            if not values:
-                values = {"res": "analysis failed"}
-
-            report_name = report.get('report_name')
-            report_value = json.dumps(values, ensure_ascii=False, default=str) if values else ''
-
-            bind_sql = ""
-            if patient_name:
-                patients = ehp_server.query_patient_by_name(patient_name)
-                if patients:
-                    register_id = patients[0].get('挂号id')
-                    patient_id = patients[0].get('门诊号')
-                    bind_sql = f" , register_id = '{register_id}', patient_id = '{patient_id}'"
-            db.execute(f"UPDATE nsyy_gyl.ehp_reports SET report_name = '{report_name}', "
-                       f"report_value = '{report_value}' {bind_sql} "
-                       f"WHERE report_id = {report.get('report_id')}", need_commit=True)
+        # 本批报告的全部区域一起批量识别
+        try:
+            parsed = analysis_pdf_batch([file_path for _, file_path in pending])
+        except Exception as e:
+            release_reports([report for report, _ in pending], f"解析失败: {e}")
+            raise
+        for (report, file_path), (patient_name, values) in zip(pending, parsed):
+            save_parse_result(db, report, patient_name, values)
     except Exception as e:
         del db
         raise Exception(e)
@@ -0,0 +1,119 @@
+# pdf 光栅化，基于 PyMuPDF 只裁剪渲染模板区域到内存中的 numpy 数组，不渲染整页，不落地 jpg 临时文件
+
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+# 模板区域坐标以 300 dpi 下的像素 (left, top, right, bottom) 标定
+REGION_DPI = 300
+# 模板标定所用的参考页面（A4，单位 pt）
+A4_PORTRAIT = (595.28, 841.89)
+A4_LANDSCAPE = (841.89, 595.28)
+
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """
+    将 PyMuPDF Pixmap 的像素缓冲区转换为 numpy 数组 (H, W, C)
+    pix.samples 返回缓冲区拷贝，Pixmap 释放后数组依然有效
+    """
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+
+def render_thumbnail(page, dpi: int = 24) -> np.ndarray:
+    """低分辨率灰度缩略图 (H, W)，用于页面分类，A4 在 24 dpi 下约 200x280 像素"""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return pixmap_to_array(pix)[:, :, 0]
+
+
+def open_pdf(pdf_path: str):
+    """打开 PDF，失败返回 None；调用方负责 close"""
+    try:
+        return fitz.open(pdf_path)
+    except Exception as e:
+        print(datetime.now(), f"ERROR {pdf_path} PDF 打开失败: {e}")
+        return None
+
+
+def reference_page_size(page, reference_size: Tuple[float, float] = None) -> Tuple[float, float]:
+    """
+    模板标定所用的参考页面尺寸（pt）：模板未指定时按页面方向取 A4 竖版 / 横版，
+    接近正方形的页面无法判断，按页面自身尺寸（不缩放）
+    """
+    if reference_size:
+        return reference_size
+    width, height = page_size(page)
+    ratio = width / height if height else 1
+    if ratio < 0.8:
+        return A4_PORTRAIT
+    if ratio > 1.25:
+        return A4_LANDSCAPE
+    return width, height
+
+
+def relative_to_rect(page, relative: Sequence[float]) -> fitz.Rect:
+    """归一化坐标（0~1）换算为页面坐标，适配任意页面尺寸"""
+    rect = page.rect
+    left, top, right, bottom = relative
+    return fitz.Rect(rect.x0 + left * rect.width, rect.y0 + top * rect.height,
+                     rect.x0 + right * rect.width, rect.y0 + bottom * rect.height)
+
+
+def render_rect(page, rect: fitz.Rect, dpi: int = 300, colorspace=None) -> np.ndarray:
+    """
+    裁剪渲染：只光栅化页面上的指定矩形，不渲染整页
+    整页 A4 300dpi RGB 约 26MB，单个区域通常只有几十 KB
+    """
+    clip = rect & page.rect
+    channels = colorspace.n if colorspace else 3
+    if clip.is_empty:
+        return np.zeros((0, 0, channels), dtype=np.uint8)
+    pix = page.get_pixmap(dpi=dpi, clip=clip, alpha=False, colorspace=colorspace or fitz.csRGB)
+    return pixmap_to_array(pix)
+
+
+def render_gray(page, rect: fitz.Rect, dpi: int = 300) -> np.ndarray:
+    """
+    裁剪渲染为单通道灰度图 (H, W)，OCR 预处理本身就在灰度上进行，
+    直接灰度光栅化省去 RGB 渲染、拷贝和转换，像素缓冲区只有 RGB 的 1/3
+    """
+    clip = rect & page.rect
+    if clip.is_empty:
+        return np.zeros((0, 0), dtype=np.uint8)
+    pix = page.get_pixmap(dpi=dpi, clip=clip, alpha=False, colorspace=fitz.csGRAY)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+
+def text_line_heights(gray: np.ndarray, min_height: int = 2) -> List[int]:
+    """灰度图按水平投影统计各文本行的墨迹高度（像素），忽略表格线等过矮的行"""
+    ink = gray < 128
+    if ink.mean() > 0.5:  # 深色背景
+        ink = ~ink
+    rows = ink.any(axis=1).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows, [0]))))
+    heights = edges[1::2] - edges[::2]
+    return [int(h) for h in heights if h >= min_height]
+
+
+def pick_render_dpi(page, rect: fitz.Rect, target_px: int, min_dpi: int, max_dpi: int,
+                    probe_dpi: int = 100) -> Optional[int]:
+    """
+    按区域内文字高度选择渲染分辨率：先低分辨率渲染测量文本行高度，
+    再选择使文字墨迹高度约为 target_px 像素的 dpi（识别模型输入高度 48，大写字母 24 像素左右即可）
+    大号数字用较低 dpi，小字用 300 以上；区域内没有文字时返回 None
+    """
+    gray = render_gray(page, rect, probe_dpi)
+    heights = text_line_heights(gray) if gray.size else []
+    if not heights:
+        return None
+    text_height_pt = float(np.median(heights)) * 72 / probe_dpi
+    dpi = target_px * 72 / text_height_pt
+    # 取 25 的整数倍，便于缓存复用和排查
+    dpi = int(np.ceil(dpi / 25) * 25)
+    return max(min_dpi, min(max_dpi, dpi))
+
+
+def page_size(page) -> Tuple[float, float]:
+    """页面宽高（pt）"""
+    return page.rect.width, page.rect.height
@@ -0,0 +1,46 @@
+# pdf 文本层读取
+# 设备导出的矢量 PDF（Pentacam、Master700、Medmont 等）自带文本层，直接按模板区域取文字，无需光栅化和 OCR
+
+from typing import Dict, List
+
+from gylmodules.eye_hospital_pacs.ocr_layout import reading_order
+from gylmodules.eye_hospital_pacs.pdf_rasterizer import REGION_DPI
+
+
+def page_words(page) -> List[tuple]:
+    """
+    页面文本层中的单词及其位置 (x0, y0, x1, y1, word, block_no, line_no, word_no)，单位 pt
+    扫描件 / 纯图片 PDF 返回空列表
+    """
+    try:
+        return page.get_text("words")
+    except Exception:
+        return []
+
+
+def region_tokens(words: List[tuple], rect, dpi: int = REGION_DPI) -> List[Dict]:
+    """
+    取中心点落在区域（页面坐标矩形）内的单词，按文本行合并，输出格式与 OCRProcessor.ocr_image 的 data 一致
+    position 为相对区域左上角、dpi 下的像素坐标
+    """
+    scale = dpi / 72
+    lines = {}
+    for x0, y0, x1, y1, word, block_no, line_no, _ in words:
+        if rect.x0 <= (x0 + x1) / 2 <= rect.x1 and rect.y0 <= (y0 + y1) / 2 <= rect.y1:
+            lines.setdefault((block_no, line_no), []).append((x0, y0, x1, y1, word))
+
+    tokens = []
+    for items in lines.values():
+        items.sort(key=lambda w: w[0])
+        left = (min(w[0] for w in items) - rect.x0) * scale
+        top = (min(w[1] for w in items) - rect.y0) * scale
+        right = (max(w[2] for w in items) - rect.x0) * scale
+        bottom = (max(w[3] for w in items) - rect.y0) * scale
+        tokens.append({
+            "text": " ".join(w[4] for w in items).strip(),
+            "confidence": 1.0,
+            "position": [[int(left), int(top)], [int(right), int(top)], [int(right), int(bottom)], [int(left), int(bottom)]],
+            "y_position": (top + bottom) / 2,
+        })
+    # 与 OCR 结果一致：从上到下、从左到右
+    return reading_order(tokens)
@@ -0,0 +1,288 @@
+# ehp_reports 解析任务领取（租约）
+# 多个实例 / 进程 / 调度线程并发解析时，通过 SELECT ... FOR UPDATE SKIP LOCKED 原子领取待解析报告，
+# 领取后在租约期内独占，回写结果时校验领取人；租约过期仍未完成的报告由回收任务放回待解析，
+# 超过最大尝试次数的标记为解析失败，避免反复 OCR 一份无法解析的报告
+
+import json
+import os
+import socket
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from pymysql.cursors import DictCursor
+
+from gylmodules import global_config
+from gylmodules.eye_hospital_pacs import ehp_config, ehp_server
+from gylmodules.eye_hospital_pacs.ehp_metrics import timed
+from gylmodules.utils.db_utils import DbUtil
+
+# 解析状态
+PARSE_STATUS_PENDING = 0  # 待解析
+PARSE_STATUS_CLAIMED = 1  # 解析中（已领取）
+PARSE_STATUS_DONE = 2  # 已完成
+PARSE_STATUS_FAILED = 3  # 多次租约过期，放弃解析
+
+_instance_id = None
+_instance_pid = None
+
+# 领取相关字段，由 migrations/001_ehp_reports_parse_claims.sql 添加
+_CLAIM_COLUMNS = ('parse_status', 'claimed_by', 'lease_expires', 'parse_attempts')
+_MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', '001_ehp_reports_parse_claims.sql')
+_columns_ready = False
+_columns_lock = threading.Lock()
+
+
+def instance_id() -> str:
+    """
+    当前进程的领取人标识（主机名:进程号）
+    按进程号缓存，导入后 fork 出的子进程不会沿用父进程的标识
+    """
+    global _instance_id, _instance_pid
+    pid = os.getpid()
+    if _instance_pid != pid:
+        _instance_id, _instance_pid = f"{socket.gethostname()}:{pid}", pid
+    return _instance_id
+
+
+def _new_db() -> DbUtil:
+    return DbUtil(global_config.DB_HOST, global_config.DB_USERNAME, global_config.DB_PASSWORD,
+                  global_config.DB_DATABASE_GYL)
+
+
+def claim_columns_ready(db: DbUtil) -> bool:
+    """
+    检查 ehp_reports 是否已有领取相关字段（检查通过后每个进程不再检查）
+    运行时不修改表结构，缺少字段时打印需要执行的迁移脚本并返回 False，调用方跳过本次领取 / 回收
+    """
+    global _columns_ready
+    if _columns_ready:
+        return True
+    with _columns_lock:
+        if _columns_ready:
+            return True
+        existing = {field.get('COLUMN_NAME') for field in db.get_table_fields('nsyy_gyl', 'ehp_reports')}
+        missing = [column for column in _CLAIM_COLUMNS if column not in existing]
+        if missing:
+            print(datetime.now(), f"ehp_reports 缺少解析领取字段 {missing}，报告解析暂停，请先执行数据库迁移 {_MIGRATION}")
+            return False
+        _columns_ready = True
+    return True
+
+
+def pending_reports(limit: int) -> List[Dict]:
+    """
+    查询待解析报告（不领取），用于定时兜底扫描补充解析队列
+    report_value 为空且未被领取的都视为待解析，包括被重置 report_value 需要重新解析的报告
+    """
+    db = _new_db()
+    try:
+        if not claim_columns_ready(db):
+            return []
+        report_list = db.query_all(f"SELECT * FROM nsyy_gyl.ehp_reports WHERE report_value is null "
+                                   f"AND parse_status != {PARSE_STATUS_CLAIMED} ORDER BY report_time limit {int(limit)}")
+    except Exception as e:
+        print(datetime.now(), f"查询待解析报告失败: {e}")
+        return []
+    finally:
+        del db
+    return list(report_list)
+
+
+def claim_reports(limit: int = None, report_ids: Sequence[int] = None) -> List[Dict]:
+    """
+    原子领取待解析报告：FOR UPDATE SKIP LOCKED 锁定候选行（其他实例正在领取的行直接跳过），
+    同一事务内标记为解析中并写入领取人和租约到期时间
+    :param limit: 最多领取数量
+    :param report_ids: 只领取指定报告（解析队列派发时使用），已被其他实例领取或已完成的会被跳过
+    :return: 领取成功的报告，claimed_by 为本次领取人，回写 / 释放时原样传回
+    """
+    claimed_by = instance_id()
+    if report_ids is not None and not report_ids:
+        return []
+    db = _new_db()
+    try:
+        if not claim_columns_ready(db):
+            return []
+    except Exception as e:
+        print(datetime.now(), f"检查解析领取字段失败: {e}")
+        return []
+    conn = db.get_conn()
+    cursor = conn.cursor(DictCursor)
+    try:
+        conn.begin()
+        sql = (f"SELECT * FROM nsyy_gyl.ehp_reports WHERE report_value is null "
+               f"AND parse_status != {PARSE_STATUS_CLAIMED}")
+        if report_ids:
+            sql += f" AND report_id IN ({','.join(str(int(report_id)) for report_id in report_ids)})"
+        sql += " ORDER BY report_time"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        cursor.execute(sql + " FOR UPDATE SKIP LOCKED")
+        reports = list(cursor.fetchall())
+        if reports:
+            ids = ','.join(str(report['report_id']) for report in reports)
+            cursor.execute(f"UPDATE nsyy_gyl.ehp_reports SET parse_status = {PARSE_STATUS_CLAIMED}, claimed_by = %s, "
+                           f"lease_expires = NOW() + INTERVAL %s SECOND, parse_attempts = parse_attempts + 1 "
+                           f"WHERE report_id IN ({ids})", (claimed_by, ehp_config.PARSE_LEASE_SECONDS))
+        conn.commit()
+        for report in reports:
+            report['claimed_by'] = claimed_by
+        return reports
+    except Exception as e:
+        conn.rollback()
+        print(datetime.now(), f"领取待解析报告失败: {e}")
+        return []
+    finally:
+        cursor.close()
+        del db
+
+
+def complete_report(db: DbUtil, report_id, set_sql: str, claimed_by: str) -> bool:
+    """
+    回写解析结果并释放租约，只有仍持有租约的实例才能回写
+    :param set_sql: 需要更新的字段，如 "report_name = 'xx', report_value = 'xx'"
+    :return: False 表示租约已过期被回收或被其他实例重新领取，本次结果丢弃
+    """
+    conn = db.get_conn()
+    cursor = conn.cursor()
+    try:
+        affected = cursor.execute(f"UPDATE nsyy_gyl.ehp_reports SET {set_sql}, parse_status = {PARSE_STATUS_DONE}, "
+                                  f"claimed_by = NULL, lease_expires = NULL, parse_attempts = 0 "
+                                  f"WHERE report_id = {int(report_id)} AND claimed_by = %s "
+                                  f"AND parse_status = {PARSE_STATUS_CLAIMED}", (claimed_by,))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise Exception(f"回写报告 {report_id} 失败: {e}")
+    finally:
+        cursor.close()
+    if not affected:
+        print(datetime.now(), f"报告 {report_id} 租约已失效，丢弃本次解析结果")
+    return bool(affected)
+
+
+def fail_report(db: DbUtil, report_id, reason: str, claimed_by: str) -> bool:
+    """
+    领取后确认无法解析（如报告文件不存在），直接标记为解析失败并释放租约，
+    不留在解析中等租约过期后反复领取
+    """
+    report_value = json.dumps({"res": "analysis failed", "reason": reason}, ensure_ascii=False)
+    conn = db.get_conn()
+    cursor = conn.cursor()
+    try:
+        affected = cursor.execute(f"UPDATE nsyy_gyl.ehp_reports SET parse_status = {PARSE_STATUS_FAILED}, "
+                                  f"report_value = %s, claimed_by = NULL, lease_expires = NULL "
+                                  f"WHERE report_id = {int(report_id)} AND claimed_by = %s "
+                                  f"AND parse_status = {PARSE_STATUS_CLAIMED}", (report_value, claimed_by))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(datetime.now(), f"标记报告 {report_id} 解析失败出错: {e}")
+        return False
+    finally:
+        cursor.close()
+    return bool(affected)
+
+
+def release_reports(reports: Sequence[Dict], reason: str, attempted: bool = True) -> int:
+    """
+    释放已领取但没有结果的报告（提交解析任务失败、解析进程崩溃），放回待解析，不必等租约过期
+    :param attempted: 是否已交给解析进程；未解析过的退回本次领取计入的尝试次数，
+                      已解析过且尝试次数达到上限的标记为解析失败，避免一份导致进程崩溃的报告被反复领取
+    :return: 放回待解析的数量
+    """
+    by_owner: Dict[str, List[int]] = {}
+    for report in reports:
+        if report.get('claimed_by'):
+            by_owner.setdefault(report['claimed_by'], []).append(int(report.get('report_id')))
+    if not by_owner:
+        return 0
+    report_value = json.dumps({"res": "analysis failed", "reason": reason}, ensure_ascii=False)
+    db = _new_db()
+    conn = db.get_conn()
+    cursor = conn.cursor()
+    released = 0
+    try:
+        for claimed_by, report_ids in by_owner.items():
+            where = (f"WHERE report_id IN ({','.join(str(report_id) for report_id in report_ids)}) "
+                     f"AND claimed_by = %s AND parse_status = {PARSE_STATUS_CLAIMED}")
+            if attempted:
+                cursor.execute(f"UPDATE nsyy_gyl.ehp_reports SET parse_status = {PARSE_STATUS_FAILED}, "
+                               f"report_value = %s, claimed_by = NULL, lease_expires = NULL "
+                               f"{where} AND parse_attempts >= %s",
+                               (report_value, claimed_by, ehp_config.PARSE_MAX_ATTEMPTS))
+            released += cursor.execute(f"UPDATE nsyy_gyl.ehp_reports SET parse_status = {PARSE_STATUS_PENDING}, "
+                                       f"claimed_by = NULL, lease_expires = NULL, "
+                                       f"parse_attempts = GREATEST(parse_attempts - %s, 0) {where}",
+                                       (0 if attempted else 1, claimed_by))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(datetime.now(), f"释放报告 {[report.get('report_id') for report in reports]} 解析租约失败: {e}")
+        return 0
+    finally:
+        cursor.close()
+        del db
+    return released
+
+
+def save_parse_result(db: DbUtil, report: Dict, patient_name: Optional[str], values: Dict) -> bool:
+    """回写解析结果，并按患者名字绑定挂号信息；只有仍持有该报告解析租约时才回写"""
+    if not values:
+        values = {"res": "analysis failed"}
+
+    report_name = report.get('report_name')
+    report_value = json.dumps(values, ensure_ascii=False, default=str) if values else ''
+
+    bind_sql = ""
+    if patient_name:
+        patients = ehp_server.query_patient_by_name(patient_name)
+        if patients:
+            register_id = patients[0].get('挂号id')
+            patient_id = patients[0].get('门诊号')
+            bind_sql = f" , register_id = '{register_id}', patient_id = '{patient_id}'"
+    with timed('db_write'):
+        return complete_report(db, report.get('report_id'),
+                               f"report_name = '{report_name}', report_value = '{report_value}' {bind_sql}",
+                               report.get('claimed_by'))
+
+
+def report_file_path(report: Dict) -> str:
+    return report.get('report_addr').replace('&', '/')
+
+
+def reap_expired_leases() -> int:
+    """
+    回收过期租约（实例宕机、解析进程崩溃等），放回待解析；尝试次数达到上限的标记为解析失败
+    :return: 回收数量
+    """
+    db = _new_db()
+    try:
+        if not claim_columns_ready(db):
+            return 0
+    except Exception as e:
+        print(datetime.now(), f"检查解析领取字段失败: {e}")
+        return 0
+    conn = db.get_conn()
+    cursor = conn.cursor()
+    try:
+        failed = cursor.execute(f"UPDATE nsyy_gyl.ehp_reports SET parse_status = {PARSE_STATUS_FAILED}, "
+                                f"report_value = %s, claimed_by = NULL, lease_expires = NULL "
+                                f"WHERE parse_status = {PARSE_STATUS_CLAIMED} AND lease_expires < NOW() "
+                                f"AND parse_attempts >= %s",
+                                ('{"res": "analysis failed"}', ehp_config.PARSE_MAX_ATTEMPTS))
+        released = cursor.execute(f"UPDATE nsyy_gyl.ehp_reports SET parse_status = {PARSE_STATUS_PENDING}, "
+                                  f"claimed_by = NULL, lease_expires = NULL "
+                                  f"WHERE parse_status = {PARSE_STATUS_CLAIMED} AND lease_expires < NOW()")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(datetime.now(), f"回收过期解析租约失败: {e}")
+        return 0
+    finally:
+        cursor.close()
+        del db
+    if failed or released:
+        print(datetime.now(), f"回收过期解析租约：{released} 份放回待解析，{failed} 份超过最大尝试次数标记为失败")
+    return failed + released
@@ -0,0 +1,591 @@
+# 报告模板注册表
+# 每种设备报告一个模板：文件名匹配规则、页面选择、识别区域、预处理以及字段提取规则
+# 模板在模块加载时构建一次，正则全部预编译；新增设备只需在文件末尾注册一个模板
+
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from gylmodules.eye_hospital_pacs.device_rules import device_rules
+from gylmodules.eye_hospital_pacs.ocr_layout import TokenLayout, NUMBER
+
+
+class Region:
+    """
+    模板识别区域，box 为参考页面（见 ReportTemplate.page_size）在 300 dpi 下标定的像素坐标 (left, top, right, bottom)，
+    使用时通过 relative 归一化到页面比例，与实际页面尺寸、渲染分辨率无关
+    rec_only: 区域内只有位置固定的一到几行文字，跳过文本检测，按投影切行后直接识别
+    dpi: 固定渲染分辨率；为空时按区域内文字高度自动选择
+    """
+
+    def __init__(self, box: Sequence[int], name: str = '', rec_only: bool = False, dpi: int = None):
+        self.box = tuple(box)
+        self.name = name
+        self.rec_only = rec_only
+        self.dpi = dpi
+
+    def relative(self, reference_px: Sequence[float]) -> Tuple[float, float, float, float]:
+        """归一化坐标（0~1），reference_px 为参考页面在标定分辨率下的像素尺寸 (宽, 高)"""
+        width, height = reference_px
+        left, top, right, bottom = self.box
+        return left / width, top / height, right / width, bottom / height
+
+    def __repr__(self):
+        return f"Region({self.name or ''}{self.box})"
+
+
+class ReportTemplate:
+    """
+    报告模板
+    :param template_id: 模板唯一标识，用于缓存、批量识别、基准测试
+    :param version: 区域或提取规则变化时递增，使旧缓存失效
+    :param names: 规范化文件名（{报告名}_{时间}.pdf）中的报告名，用于 O(1) 分发
+    :param prefixes: 非规范文件名（人工上传、设备原始文件名）按前缀兜底匹配
+    :param matcher: 更复杂的兜底匹配函数 matcher(file_name) -> bool
+    :param regions: 区域列表，或按页面方向区分的 {'portrait': [...], 'default': [...]}
+    :param page_size: 区域标定所用的参考页面尺寸 (宽, 高)，单位 pt，可按页面方向区分；为空时按页面方向取 A4
+    :param extract: 字段提取函数 extract(region_tokens, file_name) -> dict，region_tokens 与区域一一对应，
+                    每个区域为 OCR 结果格式的文本框列表（旧版缓存中只有文本字符串）
+    :param page_probe: 多页报告的页面选择规则 (探测区域, 正则)，命中的第一页即为目标页；为空则取第一页
+    :param page_keywords: 多页报告目标页的文本层关键字，矢量 PDF 直接按关键字定位页面
+    :param preprocess: 区域图像预处理函数，为空则使用 OCRProcessor.preprocess_image
+    :param checks: 字段校验规则 [(字段名元组, 正则)]，元组内任一字段完整匹配即通过；
+                   文本层结果校验不通过时回退到 OCR。为空时要求 name 非空
+    """
+
+    def __init__(self, template_id: str, report_name: str, regions, extract: Callable,
+                 names: Sequence[str] = (), prefixes: Sequence[str] = (), matcher: Callable = None, page_size=None,
+                 page_probe=None, page_keywords: Sequence[str] = (), preprocess: Callable = None,
+                 checks: Sequence = (), version: int = 1):
+        self.template_id = template_id
+        self.report_name = report_name
+        self.version = version
+        self.names = tuple(names)
+        self.prefixes = tuple(prefixes)
+        self.matcher = matcher
+        self.regions = regions
+        self.page_size = page_size
+        self.extract = extract
+        self.page_probe = page_probe
+        self.page_keywords = tuple(page_keywords)
+        self.preprocess = preprocess
+        self.checks = tuple(checks) or ((('name',), _NON_EMPTY),)
+
+    def regions_for(self, orientation: str = 'default') -> List[Region]:
+        """按页面方向取识别区域"""
+        if isinstance(self.regions, dict):
+            return self.regions.get(orientation, self.regions['default'])
+        return self.regions
+
+    def page_size_for(self, orientation: str = 'default') -> Optional[Tuple[float, float]]:
+        """按页面方向取参考页面尺寸"""
+        if isinstance(self.page_size, dict):
+            return self.page_size.get(orientation, self.page_size.get('default'))
+        return self.page_size
+
+    def matches(self, file_name: str) -> bool:
+        """兜底匹配（非规范文件名）"""
+        if self.prefixes and str(file_name).startswith(self.prefixes):
+            return True
+        return bool(self.matcher and self.matcher(file_name))
+
+    def validate(self, result: Dict) -> List[str]:
+        """校验提取结果，返回未通过校验的字段"""
+        failed = []
+        for fields, pattern in self.checks:
+            if not any(pattern.fullmatch(str(result.get(field) or '')) for field in fields):
+                failed.append('|'.join(fields))
+        return failed
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.template_id}@{self.version}"
+
+    def __repr__(self):
+        return f"ReportTemplate({self.cache_key})"
+
+
+_NON_EMPTY = re.compile(r'\S.*')
+_DECIMAL = re.compile(r'\d+(?:\.\d+)?')
+
+# 模板注册表
+_TEMPLATES: Dict[str, ReportTemplate] = {}
+# 规范化报告名 -> 模板
+_TEMPLATES_BY_NAME: Dict[str, ReportTemplate] = {}
+# 兜底匹配，按注册顺序（即原 if/elif 顺序）依次尝试
+_FALLBACK_TEMPLATES: List[ReportTemplate] = []
+
+
+def register_template(template: ReportTemplate) -> ReportTemplate:
+    if template.template_id in _TEMPLATES:
+        raise ValueError(f"模板 {template.template_id} 重复注册")
+    _TEMPLATES[template.template_id] = template
+    for name in template.names:
+        _TEMPLATES_BY_NAME[name] = template
+    if template.prefixes or template.matcher:
+        _FALLBACK_TEMPLATES.append(template)
+    return template
+
+
+def get_template(template_id: str) -> Optional[ReportTemplate]:
+    return _TEMPLATES.get(template_id)
+
+
+def all_templates() -> List[ReportTemplate]:
+    return list(_TEMPLATES.values())
+
+
+def report_name_of(file_name: str) -> str:
+    """规范化文件名 {报告名}_{时间}.pdf 中的报告名"""
+    return os.path.splitext(os.path.basename(file_name))[0].split('_')[0]
+
+
+def match_template(file_name: str) -> Optional[ReportTemplate]:
+    """
+    根据文件名查找模板：规范化文件名字典直接命中，
+    其次按设备分类规则（与共享目录入库共用）识别设备原始文件名，最后按兜底规则依次匹配
+    """
+    file_name = os.path.basename(file_name)
+    template = _TEMPLATES_BY_NAME.get(report_name_of(file_name))
+    if template:
+        return template
+    rule = device_rules.classify(file_name)
+    if rule is not None and rule.template_id in _TEMPLATES:
+        return _TEMPLATES[rule.template_id]
+    for template in _FALLBACK_TEMPLATES:
+        if template.matches(file_name):
+            return template
+    return None
+
+
+# ====================== 字段提取规则 ======================
+# 有标签的字段先按文本框位置查找（标签同一文本框内 / 右侧 / 下方的值），找不到再对拼接文本做正则匹配
+
+def join_region_texts(region_tokens: List[List]) -> str:
+    """区域内文本按阅读顺序以空格拼接，区域之间以两个空格分隔"""
+    return "".join(TokenLayout(tokens).text + '  ' for tokens in region_tokens)
+
+
+def _find_value(layouts: List[TokenLayout], label, value) -> Optional[str]:
+    """在各区域中按位置查找标签对应的值，返回第一个"""
+    for layout in layouts:
+        found = layout.value_after(label, value)
+        if found is not None:
+            return found
+    return None
+
+
+_NAME_PUNCTUATION = re.compile(r'[ ,，.。]')
+
+
+def clean_name(text: str) -> str:
+    """去掉 OCR 识别出的空格和标点"""
+    return _NAME_PUNCTUATION.sub('', text)
+
+
+def extract_name_only(region_tokens: List[List], file_name: str) -> Dict:
+    """只识别患者姓名的报告：取最后一个区域"""
+    return {"name": clean_name("".join(TokenLayout(region_tokens[-1]).texts))}
+
+
+# 角膜内皮细胞报告
+_CE_NAME = re.compile(r'姓名[：:\s]*([\u4e00-\u9fa5]{2,4})')
+_CE_CD = re.compile(r'CD[：:\s]*(\d+)', re.IGNORECASE)
+_CE_NAME_LABEL = re.compile(r'姓名')
+_CE_CD_LABEL = re.compile(r'CD', re.IGNORECASE)
+_CHINESE_NAME = re.compile(r'([\u4e00-\u9fa5]{2,4})')
+_INTEGER = re.compile(r'(\d+)')
+
+
+def extract_name_and_cd(region_tokens: List[List], file_name: str) -> Dict:
+    """提取姓名和 CD 值，区域依次为患者信息、右眼 CD、左眼 CD"""
+    layouts = TokenLayout.from_regions(region_tokens)
+    text = join_region_texts(region_tokens)
+    result = {"name": '', "r_cd": '', 'l_cd': ''}
+    name = layouts[0].value_after(_CE_NAME_LABEL, _CHINESE_NAME)
+    if name is None:
+        name_match = _CE_NAME.search(text)
+        name = name_match.group(1) if name_match else ''
+    result["name"] = name
+
+    # CD 值（支持 CD 1234、CD:1234、标签与数值分两行等形式），每只眼只在各自区域内查找
+    cds = [layout.value_after(_CE_CD_LABEL, _INTEGER) for layout in layouts[1:3]]
+    if not any(cds):
+        cds = _CE_CD.findall(text)
+    result['r_cd'] = cds[0] or '' if cds else ''
+    result['l_cd'] = cds[1] or '' if len(cds) > 1 else ''
+    return result
+
+
+# 阿玛仕手术报告
+_AMARIS_CURVATE = re.compile(r"(\d+,\d+)\s+D")
+_AMARIS_DIOPTER = re.compile(r"(-?\d+,\d+\s+D\s+-?\d+,\d+\s+Dx\s*\d+)")
+_AMARIS_LIGHT_AREA = re.compile(r"(\d+,\d+\s+mm)")
+_AMARIS_CUT_DEPTH = re.compile(r"(\d+\s+um)")
+_AMARIS_CUT_TIME = re.compile(r"(\d+\s+s)")
+# (结果字段, 区域序号, 值)
+_AMARIS_FIELDS = [
+    ('diopter', 1, _AMARIS_DIOPTER),
+    ('cut_time', 2, _AMARIS_CUT_TIME),
+    ('light_area', 3, _AMARIS_LIGHT_AREA),
+    ('cut_depth', 4, _AMARIS_CUT_DEPTH),
+]
+
+
+def _first_group(pattern, text: str) -> str:
+    match = pattern.search(text)
+    return match.group(1) if match else ''
+
+
+def extract_amaris_data(region_tokens: List[List], file_name: str) -> Dict:
+    """
+    从阿玛仕手术报告中提取关键信息，区域依次为角膜曲率、屈光度、切削时间、光区、切削深度
+    报告中的数值没有标签，每个字段在各自区域内按阅读顺序匹配，区域内找不到时再对拼接文本匹配
+    """
+    layouts = TokenLayout.from_regions(region_tokens)
+    text = join_region_texts(region_tokens)
+    result = {}
+    eye_type = 'od' if str(file_name).__contains__('OD') else 'os'
+
+    def region_text(index: int) -> str:
+        return layouts[index].text if index < len(layouts) else ''
+
+    # 角膜曲率
+    d_match = _AMARIS_CURVATE.findall(region_text(0)) or _AMARIS_CURVATE.findall(text)
+    result[f'corneal_curvate_{eye_type}'] = ",".join(d_match[:2]) if d_match else ''
+
+    # 屈光度、切削时间、光区、切削深度
+    for field, index, pattern in _AMARIS_FIELDS:
+        result[f"{field}_{eye_type}"] = _first_group(pattern, region_text(index)) or _first_group(pattern, text)
+    result['name'] = ''
+    return result
+
+
+# 屈光四图（Pentacam 4 Maps Refr）
+_P4_SURNAME = re.compile(r'姓[：:\s]*([A-Za-z]+)')
+_P4_GIVEN_NAME = re.compile(r'名[：:\s]*([A-Za-z]+)')
+_P4_EYE = re.compile(r'眼睛[：:\s]*(左眼|右眼)')
+_P4_K1 = re.compile(r'K1[。.：:\s]*([\d\.]+)\s*D?')
+_P4_K2 = re.compile(r'K2[。.：:\s]*([\d\.]+)\s*D?')
+_P4_RM = re.compile(r'Rm[。.：:\s]*([\d\.]+)\s*毫?米?')
+_P4_THINNEST = re.compile(r'最薄点位置[。.：:\s]*(\d+)\s*微?米?')
+_P4_MEASURE = re.compile(r'([\d.]+)\s*(毫米3|毫米\.3|毫米|度?)')
+# 按位置查找的字段：(结果字段, 标签, 值, 拼接文本兜底正则)
+_P4_FIELDS = [
+    ('k1', re.compile(r'K1'), NUMBER, _P4_K1),
+    ('k2', re.compile(r'K2'), NUMBER, _P4_K2),
+    ('rm', re.compile(r'Rm'), NUMBER, _P4_RM),
+    ('thinnest_point', re.compile(r'最薄点位置'), _INTEGER, _P4_THINNEST),
+]
+
+
+def extract_eye_exam_data(region_tokens: List[List], file_name: str) -> Dict[str, Optional[str]]:
+    """
+    从眼科检查文本中提取关键信息（包含眼睛位置和时间）
+    """
+    layouts = TokenLayout.from_regions(region_tokens)
+    text = join_region_texts(region_tokens)
+    last_text = layouts[-1].text
+    result = {}
+    # 1. 提取姓名（姓 + 名）
+    surname_match = _P4_SURNAME.search(text)
+    given_name_match = _P4_GIVEN_NAME.search(text)
+    if surname_match and given_name_match:
+        result["name"] = f"{surname_match.group(1)}{given_name_match.group(1)}"
+
+    # 2. 提取眼睛位置
+    eye_match = _P4_EYE.search(text)
+    if eye_match:
+        result["eye"] = eye_match.group(1)
+
+    eye = 'l_' if result["eye"] == '左眼' else 'r_'
+
+    # 3. K1、K2、Rm、最薄点位置（字符串格式）
+    for field, label, value, pattern in _P4_FIELDS:
+        found = _find_value(layouts, label, value)
+        if found is None:
+            match = pattern.search(text)
+            found = match.group(1) if match else None
+        if found is not None:
+            result[f"{eye}{field}"] = found
+
+    # 4. 提取前房深度  水平方向白到白距离
+    items = _P4_MEASURE.findall(last_text)
+    result[f"{eye}distance"] = f"{items[1][0]}{items[1][1]}" if len(items) > 1 and len(items[1]) > 1 else ''
+    result[f"{eye}depth"] = f"{items[4][0]}{items[4][1]}" if len(items) > 4 and len(items[4]) > 1 else ''
+    return result
+
+
+# 角膜地形图（Medmont）
+_MEDMONT_NAME = re.compile(r'^([\u4e00-\u9fa5]{2,4})')
+_MEDMONT_FLAT_K = re.compile(r'平K\s*([\d\.]+)')
+_MEDMONT_STEEP_K = re.compile(r'陡K\s*([\d\.]+)')
+_MEDMONT_DELTA_K = re.compile(r'△K\s*([\d.]+)\s*D')
+_MEDMONT_FLAT_E = re.compile(r'平面e\s*([\d\.]+)')
+# (右眼字段, 左眼字段, 标签, 值, 拼接文本兜底正则)
+_MEDMONT_FIELDS = [
+    ('r_pk1', 'l_pk1', re.compile(r'平K'), NUMBER, _MEDMONT_FLAT_K),
+    ('r_xk2', 'l_xk2', re.compile(r'陡K'), NUMBER, _MEDMONT_STEEP_K),
+    ('r_dk3', 'l_dk3', re.compile(r'△K'), re.compile(r'(\d+(?:\.\d+)?)\s*D'), _MEDMONT_DELTA_K),
+    ('r_pe', 'l_pe', re.compile(r'平面e'), NUMBER, _MEDMONT_FLAT_E),
+]
+
+
+def extract_topography_data(region_tokens: List[List], file_name: str) -> Dict:
+    """从角膜地形图文本中提取关键信息，区域依次为患者信息、右眼、左眼"""
+    layouts = TokenLayout.from_regions(region_tokens)
+    text = join_region_texts(region_tokens)
+    result = {}
+    # 1. 提取姓名（中文姓名）
+    name_match = _MEDMONT_NAME.search(text)
+    if name_match:
+        result["name"] = name_match.group(1)
+
+    # 2. 平K、陡K、△K、平面e：先在各眼区域内按位置查找，都找不到时按拼接文本中的出现顺序取右眼、左眼
+    for right_field, left_field, label, value, pattern in _MEDMONT_FIELDS:
+        values = [layout.value_after(label, value) for layout in layouts[1:3]]
+        if not any(values):
+            values = pattern.findall(text)
+        if values and values[0]:
+            result[right_field] = values[0]
+            result[left_field] = (values[1] if len(values) > 1 else '') or ''
+
+    return result
+
+
+# Master700 生物测量
+_M700_AL = [
+    re.compile(r'AL:\s*(\d+\.\d+)\s*mm'),  # 英文格式: AL: 26.21 mm
+    re.compile(r'AL[：:]\s*(\d+\.\d+)\s*mm'),  # 中文冒号: AL：26.21 mm
+]
+_M700_CW = [
+    re.compile(r'(?:CW-chord|角膜直径)[：:]\s*(\d+(?:\.\d+)?)\s*(?:mm|毫米|厘米|cm)?\s*(?:@|在|角度)?\s*(\d+)(?:°|度)?'),
+]
+_M700_WTW = [
+    re.compile(r'WTW:\s*(\d+\.\d+)\s*mm'),  # 英文格式: WTW: 26.21 mm
+    re.compile(r'WTW[：:]\s*(\d+\.\d+)\s*mm'),  # 中文冒号: WTW：26.21 mm
+]
+_M700_CCT = [
+    re.compile(r'CCT[:：]\s*(\d+\.?\d*)'),
+]
+# 按位置查找的字段：(结果字段, 标签, 值)，CW-chord 的值为 "直径 @ 角度"，按 _M700_CW_PARTS 拆分后统一格式
+_M700_CW_VALUE = re.compile(r'\d+(?:\.\d+)?\s*(?:mm|毫米|厘米|cm)?\s*(?:@|在|角度)\s*\d+(?:°|度)?')
+_M700_CW_PARTS = re.compile(r'(\d+(?:\.\d+)?)\D+?(\d+)')
+_M700_FIELDS = [
+    ('al', re.compile(r'AL'), re.compile(r'(\d+\.\d+)\s*mm')),
+    ('cct', re.compile(r'CCT'), re.compile(r'(\d+\.?\d*)')),
+    ('wtw', re.compile(r'WTW'), re.compile(r'(\d+\.\d+)\s*mm')),
+    ('cw_chord', re.compile(r'CW-chord|角膜直径'), _M700_CW_VALUE),
+]
+
+
+def _unique_matches(patterns, text: str) -> List:
+    """多个正则的匹配结果去重，保持出现顺序"""
+    return list(dict.fromkeys(match for pattern in patterns for match in pattern.findall(text)))
+
+
+def parse_biometry_data(data_string: str, is_left: bool) -> Dict:
+    """从字符串中解析单眼的 AL、CCT、WTW、CW-chord 值"""
+    als = _unique_matches(_M700_AL, data_string)
+    cws = [f"{value} mm @ {angle}°" for value, angle in _unique_matches(_M700_CW, data_string)]
+    wtw = _unique_matches(_M700_WTW, data_string)
+    cct = _unique_matches(_M700_CCT, data_string)
+    eye = 'l_' if is_left else 'r_'
+    return {
+        f'{eye}al': als[0] if als else '',
+        f'{eye}cct': cct[0] if cct else '',
+        f'{eye}wtw': wtw[0] if wtw else '',
+        f'{eye}cw_chord': cws[0] if cws else '',
+    }
+
+
+def parse_biometry_layouts(layouts: List[TokenLayout], is_left: bool) -> Dict:
+    """单眼各区域内按位置查找 AL、CCT、WTW、CW-chord，找不到的字段再对拼接文本做正则匹配"""
+    eye = 'l_' if is_left else 'r_'
+    result = {}
+    for field, label, value in _M700_FIELDS:
+        found = _find_value(layouts, label, value)
+        if found is not None and field == 'cw_chord':
+            parts = _M700_CW_PARTS.match(found)
+            found = f"{parts.group(1)} mm @ {parts.group(2)}°" if parts else None
+        result[f'{eye}{field}'] = found
+    if None in result.values():
+        fallback = parse_biometry_data("".join(layout.text + '  ' for layout in layouts), is_left)
+        result = {key: fallback[key] if found is None else found for key, found in result.items()}
+    return result
+
+
+def extract_biometry_data(region_tokens: List[List], file_name: str) -> Dict:
+    """前 4 个区域为右眼，后 4 个区域为左眼"""
+    layouts = TokenLayout.from_regions(region_tokens)
+    half = len(layouts) // 2
+    return {**parse_biometry_layouts(layouts[half:], True),
+            **parse_biometry_layouts(layouts[:half], False)}
+
+
+# 眼表综合检查报告
+_OS_NAME = re.compile(r'[：:]\s*([\u4e00-\u9fa5]{2,4}|[A-Za-z\s]+)')
+
+
+def extract_ocular_surface_data(region_tokens: List[List], file_name: str) -> Dict:
+    """姓名 + 左右眼首次破裂时间"""
+    texts = ["".join(layout.texts) for layout in TokenLayout.from_regions(region_tokens)]
+    # 匹配中文姓名（2-4个汉字）或英文姓名（字母和空格）
+    match = _OS_NAME.search(texts[0])
+    return {
+        "name": match.group(1).strip().replace(' ', '') if match else '',
+        "r_first_rupture_time": texts[1],
+        "l_first_rupture_time": texts[2],
+    }
+
+
+# ====================== 模板注册 ======================
+
+register_template(ReportTemplate(
+    'corneal_endothelium_2', '角膜内皮细胞报告2',
+    names=('角膜内皮细胞报告2',), prefixes=('角膜内皮细胞报告2',),
+    regions=[
+        Region((330, 430, 2200, 550), 'patient'),
+        Region((1110, 1120, 1580, 1310), 'cd_od', rec_only=True),
+        Region((1110, 2400, 1580, 2600), 'cd_os', rec_only=True),
+    ],
+    extract=extract_name_and_cd,
+    checks=[(('r_cd',), re.compile(r'\d{3,4}'))],
+))
+
+register_template(ReportTemplate(
+    'corneal_endothelium', '角膜内皮细胞报告',
+    names=('角膜内皮细胞报告',), prefixes=('角膜内皮细胞报告',),
+    regions=[
+        Region((330, 430, 2200, 550), 'patient'),
+        Region((1250, 1080, 1650, 1280), 'cd_od', rec_only=True),
+        Region((1250, 2380, 1650, 2580), 'cd_os', rec_only=True),
+    ],
+    extract=extract_name_and_cd,
+    checks=[(('r_cd',), re.compile(r'\d{3,4}'))],
+))
+
+# 阿玛仕手术报告：设备原始文件名，形如 xxx_OD_20250101...
+register_template(ReportTemplate(
+    'amaris', '阿玛仕手术报告',
+    matcher=lambda name: ('_OD_20' in name or '_OS_20' in name) and 'Maps Refr' not in name,
+    regions=[
+        Region((300, 940, 1200, 1100), 'corneal_curvate'),
+        Region((400, 1350, 1600, 1450), 'diopter'),
+        Region((300, 1555, 1200, 1625), 'cut_time'),
+        Region((1425, 700, 2380, 780), 'light_area'),
+        Region((1425, 940, 2380, 1020), 'cut_depth'),
+    ],
+    extract=extract_amaris_data,
+    checks=[(('corneal_curvate_od', 'corneal_curvate_os'), re.compile(r'\d+,\d+(?:,\d+,\d+)?')),
+            (('diopter_od', 'diopter_os'), _NON_EMPTY)],
+))
+
+register_template(ReportTemplate(
+    'pentacam_4maps', '屈光四图',
+    names=('屈光四图', '屈光四图-右', '屈光四图-左'), prefixes=('屈光四图',),
+    matcher=lambda name: ('OD' in name or 'OS' in name) and '4 Maps Refr' in name,
+    regions={
+        'portrait': [
+            Region((50, 1150, 700, 1450), 'patient'),
+            Region((60, 1450, 700, 1710), 'front_surface'),
+            Region((60, 2250, 700, 2500), 'thinnest_point'),
+            Region((60, 2480, 700, 2670), 'chamber'),
+        ],
+        'default': [
+            Region((280, 500, 1080, 860), 'patient'),
+            Region((290, 890, 1080, 1350), 'front_surface'),
+            Region((290, 1800, 1080, 2150), 'thinnest_point'),
+            Region((290, 2150, 1080, 2370), 'chamber'),
+        ],
+    },
+    extract=extract_eye_exam_data,
+    checks=[(('r_k1', 'l_k1'), _DECIMAL), (('r_k2', 'l_k2'), _DECIMAL),
+            (('r_thinnest_point', 'l_thinnest_point'), re.compile(r'\d+'))],
+))
+
+register_template(ReportTemplate(
+    'medmont_topography', '角膜地形图',
+    names=('角膜地形图',), prefixes=('角膜地形图',),
+    regions=[
+        Region((50, 150, 1100, 300), 'patient'),
+        Region((50, 1600, 1100, 2000), 'od'),
+        Region((1750, 1600, 2800, 2000), 'os'),
+    ],
+    extract=extract_topography_data,
+    checks=[(('r_pk1',), _DECIMAL), (('r_xk2',), _DECIMAL)],
+))
+
+# Master700 报告有多页，需要先找到"生物统计值"页
+register_template(ReportTemplate(
+    'master700', 'Master700',
+    names=('Master700',), prefixes=('Master700',),
+    page_probe=(Region((950, 930, 1600, 1090), 'title'), re.compile(r'生')),
+    page_keywords=('生物统计值',),
+    regions=[
+        Region((250, 1360, 560, 1425), 'al_od', rec_only=True),
+        Region((650, 2760, 1220, 2820), 'cw_chord_od', rec_only=True),
+        Region((220, 2710, 600, 2770), 'wtw_od', rec_only=True),
+        Region((250, 1416, 560, 1470), 'cct_od', rec_only=True),
+        Region((1330, 1360, 1630, 1425), 'al_os', rec_only=True),
+        Region((1720, 2760, 2240, 2820), 'cw_chord_os', rec_only=True),
+        Region((1290, 2710, 1700, 2770), 'wtw_os', rec_only=True),
+        Region((1310, 1416, 1630, 1470), 'cct_os', rec_only=True),
+    ],
+    extract=extract_biometry_data,
+    checks=[(('r_al', 'l_al'), _DECIMAL)],
+))
+
+register_template(ReportTemplate(
+    'ocular_surface', '眼表综合检查报告',
+    names=('眼表综合检查报告',), prefixes=('眼表综合检查报告',),
+    regions=[
+        Region((50, 310, 500, 390), 'patient'),
+        Region((620, 500, 1000, 580), 'first_rupture_time_od', rec_only=True),
+        Region((1400, 500, 1700, 580), 'first_rupture_time_os', rec_only=True),
+    ],
+    extract=extract_ocular_surface_data,
+    checks=[(('r_first_rupture_time', 'l_first_rupture_time'), _NON_EMPTY)],
+))
+
+register_template(ReportTemplate(
+    'pentacam_compare', '比较两次检查',
+    names=('比较两次检查', '比较两次检查-右', '比较两次检查-左'), prefixes=('比较两次检查',),
+    regions=[Region((540, 515, 850, 565), 'patient', rec_only=True)],
+    extract=extract_name_only,
+))
+
+register_template(ReportTemplate(
+    'pentacam_scheimpflug', 'Scheimpflug图像总览',
+    names=('Scheimpflug图像总览', 'Scheimpflug图像总览-右', 'Scheimpflug图像总览-左'),
+    prefixes=('Scheimpflug图像总览',),
+    regions=[Region((530, 520, 850, 571), 'patient', rec_only=True)],
+    extract=extract_name_only,
+))
+
+register_template(ReportTemplate(
+    'biomechanics', '生物力学',
+    names=('生物力学', '生物力学-右', '生物力学-左'), prefixes=('生物力学',),
+    regions={
+        'portrait': [Region((180, 1210, 430, 1250), 'patient', rec_only=True)],  # 竖版
+        'default': [Region((420, 535, 750, 591), 'patient', rec_only=True)],
+    },
+    extract=extract_name_only,
+))
+
+register_template(ReportTemplate(
+    'pentacam_6maps', '屈光六图',
+    names=('屈光六图', '屈光六图-右', '屈光六图-左'), prefixes=('屈光六图',),
+    regions={
+        'portrait': [Region((1430, 1170, 1550, 1250), 'patient', rec_only=True)],  # 竖版
+        'default': [Region((1990, 515, 2150, 610), 'patient', rec_only=True)],
+    },
+    extract=extract_name_only,
+))
+
+register_template(ReportTemplate(
+    'fundus_photo', '眼底照片',
+    names=('眼底照片',), prefixes=('眼底照片',),
+    regions=[Region((1150, 50, 1600, 115), 'patient', rec_only=True)],
+    extract=extract_name_only,
+))
@@ -0,0 +1,181 @@
+# 共享目录扫描索引（SQLite）
+# 记录仍留在共享目录中的文件 (path, inode, size, mtime, state, attempts, last_error)，文件移走后删除记录：
+#   new         新发现 / 内容有变化，等待写入完成后处理
+#   failed      处理失败，到 next_attempt_at 后重试，间隔从 MONITOR_RETRY_BACKOFF 秒起逐次翻倍（上限 MONITOR_RETRY_BACKOFF_MAX），
+#               短暂故障（共享盘断开、数据库重启）不会在几秒内耗尽重试次数
+#   quarantined 连续失败 MONITOR_MAX_ATTEMPTS 次，不再处理，直到文件被替换（inode / 大小 / mtime 变化）
+# 扫描只把新增或变化的文件、待处理的文件交给入库流程，已隔离的问题文件不会每轮都重新处理一遍；
+# 服务重启后未处理完的文件从索引中恢复
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from gylmodules.eye_hospital_pacs import ehp_config
+
+
+class ScanIndex:
+
+    def __init__(self, db_path: str, max_attempts: int = None):
+        self.db_path = db_path
+        self._max_attempts = max_attempts
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def max_attempts(self) -> int:
+        return self._max_attempts or ehp_config.MONITOR_MAX_ATTEMPTS
+
+    @staticmethod
+    def retry_delay(attempts: int) -> float:
+        """第 attempts 次失败后到下次重试的间隔（秒）"""
+        return min(ehp_config.MONITOR_RETRY_BACKOFF * 2 ** max(attempts - 1, 0), ehp_config.MONITOR_RETRY_BACKOFF_MAX)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS scan_files ("
+                         "path TEXT PRIMARY KEY, inode INTEGER NOT NULL, size INTEGER NOT NULL, "
+                         "mtime_ns INTEGER NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                         "last_error TEXT, first_seen REAL NOT NULL, updated_at REAL NOT NULL, "
+                         "next_attempt_at REAL NOT NULL DEFAULT 0)")
+            # 旧版本创建的本地索引库没有 next_attempt_at 列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(scan_files)")}
+            if 'next_attempt_at' not in columns:
+                conn.execute("ALTER TABLE scan_files ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_files_state ON scan_files (state)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def select(self, paths: Iterable[str]) -> List[str]:
+        """
+        筛选需要处理的文件：新文件、内容有变化的文件、待处理 / 已到重试时间的失败文件；
+        跳过已隔离且未变化的文件、未到重试时间的文件，已不存在的文件删除记录；索引不可用时不过滤
+        """
+        paths = list(paths)
+        selected, now = [], time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                for path in paths:
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        conn.execute("DELETE FROM scan_files WHERE path = ?", (path,))
+                        continue
+                    row = conn.execute("SELECT inode, size, mtime_ns, state, next_attempt_at FROM scan_files "
+                                       "WHERE path = ?", (path,)).fetchone()
+                    if row is None or tuple(row[:3]) != (st.st_ino, st.st_size, st.st_mtime_ns):
+                        # 新文件或文件被替换：重新计数
+                        conn.execute("INSERT OR REPLACE INTO scan_files "
+                                     "(path, inode, size, mtime_ns, state, attempts, last_error, first_seen, updated_at) "
+                                     "VALUES (?, ?, ?, ?, 'new', 0, NULL, ?, ?)",
+                                     (path, st.st_ino, st.st_size, st.st_mtime_ns, now, now))
+                        selected.append(path)
+                    elif row[3] == 'new' or (row[3] == 'failed' and row[4] <= now):
+                        selected.append(path)
+                conn.commit()
+        except Exception as e:
+            print(datetime.now(), f"扫描索引查询失败: {e}")
+            return paths
+        return selected
+
+    def record_failure(self, path: str, error: str) -> bool:
+        """
+        记录一次处理失败，按失败次数推迟下次重试
+        :return: 是否因失败次数达到上限被隔离
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT attempts FROM scan_files WHERE path = ?", (path,)).fetchone()
+                if row is None:
+                    return False
+                attempts, now = row[0] + 1, time.time()
+                state = 'quarantined' if attempts >= self.max_attempts else 'failed'
+                conn.execute("UPDATE scan_files SET attempts = ?, last_error = ?, updated_at = ?, state = ?, "
+                             "next_attempt_at = ? WHERE path = ?",
+                             (attempts, error[:1000], now, state, now + self.retry_delay(attempts), path))
+                conn.commit()
+            return state == 'quarantined'
+        except Exception as e:
+            print(datetime.now(), f"扫描索引写入失败: {e}")
+            return False
+
+    def remove(self, path: str):
+        """文件已移走"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM scan_files WHERE path = ?", (path,))
+                conn.commit()
+        except Exception as e:
+            print(datetime.now(), f"扫描索引写入失败: {e}")
+
+    def pending_paths(self, include_quarantined: bool = False) -> List[str]:
+        """
+        尚未处理完的文件（服务重启后恢复），失败文件只返回已到重试时间的
+        include_quarantined: 同时返回已隔离的文件，由 select 按签名判断是否被替换（原地覆盖写不会改变目录 mtime）
+        """
+        states = ('new', 'failed', 'quarantined') if include_quarantined else ('new', 'failed')
+        try:
+            with self._lock:
+                rows = self._connect().execute(
+                    f"SELECT path FROM scan_files WHERE state IN ({','.join('?' * len(states))}) "
+                    f"AND (state != 'failed' OR next_attempt_at <= ?)", states + (time.time(),)).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            print(datetime.now(), f"扫描索引查询失败: {e}")
+            return []
+
+    def next_retry_at(self) -> Optional[float]:
+        """最早到期的失败文件的重试时间（time.time()），没有失败文件时返回 None"""
+        try:
+            with self._lock:
+                row = self._connect().execute("SELECT MIN(next_attempt_at) FROM scan_files "
+                                              "WHERE state = 'failed'").fetchone()
+            return row[0]
+        except Exception as e:
+            print(datetime.now(), f"扫描索引查询失败: {e}")
+            return None
+
+    def release(self, path: str) -> bool:
+        """解除隔离，下一轮重新处理"""
+        with self._lock:
+            conn = self._connect()
+            updated = conn.execute("UPDATE scan_files SET state = 'new', attempts = 0, next_attempt_at = 0, "
+                                   "updated_at = ? WHERE path = ? AND state = 'quarantined'",
+                                   (time.time(), path)).rowcount
+            conn.commit()
+        return updated > 0
+
+    def quarantined(self, limit: int = 100) -> List[Dict]:
+        try:
+            with self._lock:
+                rows = self._connect().execute("SELECT path, attempts, last_error, updated_at FROM scan_files "
+                                               "WHERE state = 'quarantined' ORDER BY updated_at DESC LIMIT ?",
+                                               (limit,)).fetchall()
+        except Exception as e:
+            print(datetime.now(), f"扫描索引查询失败: {e}")
+            return []
+        return [{"path": path, "attempts": attempts, "last_error": last_error,
+                 "updated_at": datetime.fromtimestamp(updated_at).strftime("%Y-%m-%d %H:%M:%S")}
+                for path, attempts, last_error, updated_at in rows]
+
+    def stats(self) -> Dict:
+        try:
+            with self._lock:
+                rows = self._connect().execute("SELECT state, COUNT(*) FROM scan_files GROUP BY state").fetchall()
+            return dict(rows)
+        except Exception as e:
+            print(datetime.now(), f"扫描索引统计失败: {e}")
+            return {}
+
+
+scan_index = ScanIndex(ehp_config.MONITOR_INDEX_PATH)
@@ -0,0 +1,171 @@
+# 基准测试合成语料
+# 按各模板的识别区域生成矢量 PDF（文字直接写在区域内，带文本层）及同名期望字段 json，不含患者信息，随仓库提交在 benchmark_corpus/
+# 用于开箱运行基准测试、复现 --baseline 准确率对比、检查模板区域与字段提取规则；
+# 合成报告只有区域内的文字，不代表真实报告的 OCR 准确率，真实语料按 ocr_benchmark 的目录结构在本地准备
+# 用法（修改模板区域或下面的样本后重新生成）：
+#   python -m gylmodules.eye_hospital_pacs.synthetic_corpus [--out <目录>]
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.pdf_rasterizer import A4_LANDSCAPE, A4_PORTRAIT, REGION_DPI
+from gylmodules.eye_hospital_pacs.report_templates import get_template
+
+# PyMuPDF 内置字体：纯西文行用 Helvetica，含中文的行用简体中文字体（西文字符为全角宽度）
+LATIN_FONT = 'helv'
+CJK_FONT = 'china-s'
+MAX_FONT_SIZE = 8
+
+# 每个样本：模板、文件名（与生产环境一致，模板按文件名匹配）、是否横版、
+# 各页 {区域名: 文本行}（区域名取自模板区域及页面探测区域）、期望字段
+SAMPLES = [
+    {
+        "template_id": "corneal_endothelium", "file_name": "角膜内皮细胞报告_20250101090000.pdf",
+        "pages": [{"patient": ["姓名: 张三  性别: 男"], "cd_od": ["CD 2850"], "cd_os": ["CD 2790"]}],
+        "expected": {"name": "张三", "r_cd": "2850", "l_cd": "2790"},
+    },
+    {
+        "template_id": "corneal_endothelium_2", "file_name": "角膜内皮细胞报告2_20250101090500.pdf",
+        "pages": [{"patient": ["姓名: 李四"], "cd_od": ["CD", "3012"], "cd_os": ["CD", "2967"]}],
+        "expected": {"name": "李四", "r_cd": "3012", "l_cd": "2967"},
+    },
+    {
+        "template_id": "amaris", "file_name": "Zhang_San_OD_20250101091000.pdf",
+        "pages": [{"corneal_curvate": ["42,50 D  43,25 D"], "diopter": ["-3,25 D -0,75 Dx 180"],
+                   "cut_time": ["35 s"], "light_area": ["6,50 mm"], "cut_depth": ["95 um"]}],
+        "expected": {"corneal_curvate_od": "42,50,43,25", "diopter_od": "-3,25 D -0,75 Dx 180",
+                     "light_area_od": "6,50 mm", "cut_depth_od": "95 um", "cut_time_od": "35 s"},
+    },
+    {
+        "template_id": "pentacam_4maps", "file_name": "屈光四图-右_20250101091500.pdf",
+        "pages": [{"patient": ["姓: Wang", "名: Honglei", "眼睛: 右眼"],
+                   "front_surface": ["K1: 42.8 D", "K2: 43.9 D", "Rm: 7.78 毫米"],
+                   "thinnest_point": ["最薄点位置: 512 微米"],
+                   "chamber": ["角膜体积 60.1 毫米3 白到白 11.9 毫米", "房角 38.2 度 瞳孔 3.1 毫米 前房深度 3.05 毫米"]}],
+        "expected": {"name": "WangHonglei", "eye": "右眼", "r_k1": "42.8", "r_k2": "43.9", "r_rm": "7.78",
+                     "r_thinnest_point": "512", "r_distance": "11.9毫米", "r_depth": "3.05毫米"},
+    },
+    {
+        "template_id": "medmont_topography", "file_name": "角膜地形图_20250101092000.pdf", "landscape": True,
+        "pages": [{"patient": ["王芳 2025-01-01"], "od": ["平K 42.10 D", "陡K 43.20 D", "△K 1.10 D", "平面e 0.52"],
+                   "os": ["平K 41.90 D", "陡K 42.80 D", "△K 0.90 D", "平面e 0.48"]}],
+        "expected": {"name": "王芳", "r_pk1": "42.10", "l_pk1": "41.90", "r_xk2": "43.20", "l_xk2": "42.80",
+                     "r_dk3": "1.10", "l_dk3": "0.90", "r_pe": "0.52", "l_pe": "0.48"},
+    },
+    {
+        # 多页报告，目标页为第 2 页
+        "template_id": "master700", "file_name": "Master700_1918372191_Bai_Xue_20250101092500.pdf",
+        "pages": [{"title": ["检查概览"]},
+                  {"title": ["生物统计值"],
+                   "al_od": ["AL: 23.41 mm"], "cct_od": ["CCT: 545 µm"], "wtw_od": ["WTW: 11.8 mm"],
+                   "cw_chord_od": ["CW-chord: 0.3 mm @ 250°"],
+                   "al_os": ["AL: 23.38 mm"], "cct_os": ["CCT: 541 µm"], "wtw_os": ["WTW: 11.7 mm"],
+                   "cw_chord_os": ["CW-chord: 0.2 mm @ 95°"]}],
+        "expected": {"r_al": "23.41", "r_cct": "545", "r_wtw": "11.8", "r_cw_chord": "0.3 mm @ 250°",
+                     "l_al": "23.38", "l_cct": "541", "l_wtw": "11.7", "l_cw_chord": "0.2 mm @ 95°"},
+    },
+    {
+        "template_id": "ocular_surface", "file_name": "眼表综合检查报告_20250101093000.pdf",
+        "pages": [{"patient": ["姓名: 赵敏"], "first_rupture_time_od": ["5.2s"], "first_rupture_time_os": ["6.8s"]}],
+        "expected": {"name": "赵敏", "r_first_rupture_time": "5.2s", "l_first_rupture_time": "6.8s"},
+    },
+    {
+        "template_id": "pentacam_compare", "file_name": "比较两次检查-左_20250101093500.pdf",
+        "pages": [{"patient": ["Liu Yang"]}],
+        "expected": {"name": "LiuYang"},
+    },
+    {
+        "template_id": "pentacam_scheimpflug", "file_name": "Scheimpflug图像总览-右_20250101094000.pdf",
+        "pages": [{"patient": ["Chen Jing"]}],
+        "expected": {"name": "ChenJing"},
+    },
+    {
+        "template_id": "biomechanics", "file_name": "生物力学-右_20250101094500.pdf",
+        "pages": [{"patient": ["Sun Li"]}],
+        "expected": {"name": "SunLi"},
+    },
+    {
+        "template_id": "pentacam_6maps", "file_name": "屈光六图-左_20250101095000.pdf",
+        "pages": [{"patient": ["Ma Li"]}],
+        "expected": {"name": "MaLi"},
+    },
+    {
+        "template_id": "fundus_photo", "file_name": "眼底照片_20250101095500.pdf", "landscape": True,
+        "pages": [{"patient": ["Zhou Qiang"]}],
+        "expected": {"name": "ZhouQiang"},
+    },
+]
+
+
+def _template_regions(template, orientation: str) -> Dict:
+    """区域名 -> 区域，包括多页报告的页面探测区域"""
+    regions = {region.name: region for region in template.regions_for(orientation)}
+    if template.page_probe:
+        regions.setdefault(template.page_probe[0].name, template.page_probe[0])
+    return regions
+
+
+def _font_for(line: str) -> str:
+    return LATIN_FONT if all(ord(c) < 256 for c in line) else CJK_FONT
+
+
+def _write_region(page, region, lines: List[str]):
+    """在区域内从上到下写入文本行，字号按区域高度、宽度缩小，保证全部文字落在区域内"""
+    scale = 72 / REGION_DPI
+    left, top, right, bottom = (value * scale for value in region.box)
+    font_size = min([MAX_FONT_SIZE, (bottom - top - 2) / (len(lines) * 1.2)]
+                    + [(right - left - 4) / fitz.get_text_length(line, fontname=_font_for(line), fontsize=1)
+                       for line in lines])
+    for i, line in enumerate(lines):
+        baseline = top + 1 + font_size * (1.2 * i + 1)
+        page.insert_text((left + 2, baseline), line, fontname=_font_for(line), fontsize=font_size)
+
+
+def build_pdf(sample: Dict) -> bytes:
+    template = get_template(sample["template_id"])
+    width, height = A4_LANDSCAPE if sample.get("landscape") else A4_PORTRAIT
+    orientation = 'landscape' if sample.get("landscape") else 'portrait'
+    regions = _template_regions(template, orientation)
+    doc = fitz.open()
+    try:
+        for page_regions in sample["pages"]:
+            page = doc.new_page(width=width, height=height)
+            for name, lines in page_regions.items():
+                _write_region(page, regions[name], lines)
+        return doc.tobytes(garbage=3, deflate=True)
+    finally:
+        doc.close()
+
+
+def write_corpus(corpus_dir: str) -> int:
+    """生成全部样本，返回样本数"""
+    for sample in SAMPLES:
+        template_dir = os.path.join(corpus_dir, sample["template_id"])
+        os.makedirs(template_dir, exist_ok=True)
+        pdf_path = os.path.join(template_dir, sample["file_name"])
+        with open(pdf_path, 'wb') as f:
+            f.write(build_pdf(sample))
+        with open(os.path.splitext(pdf_path)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump(sample["expected"], f, ensure_ascii=False, indent=2)
+            f.write('\n')
+    return len(SAMPLES)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成基准测试合成语料')
+    parser.add_argument('--out', default=ehp_config.OCR_BENCHMARK_CORPUS, help='语料目录')
+    args = parser.parse_args(argv)
+    count = write_corpus(args.out)
+    print(datetime.now(), f"已生成 {count} 份合成报告：{args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
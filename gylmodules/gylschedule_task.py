@@ -2,7 +2,10 @@ import logging
 from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from gylmodules.eye_hospital_pacs.pdf_ocr_analysis import regularly_parsing_eye_report
+from gylmodules.eye_hospital_pacs import ehp_config, ocr_facade
+from gylmodules.eye_hospital_pacs.file_watcher import file_watcher
+from gylmodules.eye_hospital_pacs.parse_service import parse_service, enqueue_pending_reports
+from gylmodules.eye_hospital_pacs.report_claims import reap_expired_leases
 
 # 配置调度器，设置执行器，ThreadPoolExecutor 管理线程池并发
 executors = {'default': ThreadPoolExecutor(4), }
@@ -12,8 +15,23 @@ logger = logging.getLogger(__name__)
 
 
 def schedule_task():
+    if ehp_config.PARSE_WORKERS > 0:
+        # 多进程解析服务，各工作进程启动时自行加载并预热 OCR 引擎
+        # 新报告入库时直接投递，定时任务只做兜底扫描
+        parse_service.start()
+        parsing_job, interval = enqueue_pending_reports, ehp_config.PARSE_SWEEP_INTERVAL
+    else:
+        # 预热 OCR 引擎池，避免第一批报告承担模型加载耗时
+        ocr_facade.start_engine_pool()
+        parsing_job, interval = ocr_facade.regularly_parsing_eye_report, 2*60
+
+    # 共享目录新文件实时入库
+    if ehp_config.MONITOR_WATCHER_ENABLED:
+        file_watcher.start()
+
     # ====================== 定时任务 ======================
-    gylmodule_scheduler.add_job(regularly_parsing_eye_report, trigger='interval', seconds=2*60)
+    gylmodule_scheduler.add_job(parsing_job, trigger='interval', seconds=interval)
+    gylmodule_scheduler.add_job(reap_expired_leases, trigger='interval', seconds=ehp_config.PARSE_REAP_INTERVAL)
 
     # ======================  Start ======================
     gylmodule_scheduler.start()
@@ -1,4 +1,5 @@
 import logging
+import time
 
 import pymysql
 from pymysql.cursors import DictCursor
@@ -11,6 +12,25 @@ logger = logging.getLogger(__name__)
 数据库工具类
 """
 
+# SQL 耗时观察者 observer(op, seconds, ok)，用于监控指标统计
+_sql_observers = []
+
+
+def add_sql_observer(observer):
+    if observer not in _sql_observers:
+        _sql_observers.append(observer)
+
+
+def _notify_sql(op: str, start_time: float, ok: bool):
+    if not _sql_observers:
+        return
+    seconds = time.perf_counter() - start_time
+    for observer in _sql_observers:
+        try:
+            observer(op, seconds, ok)
+        except Exception:
+            pass
+
 
 class DbUtil:
     """构造函数"""
@@ -108,13 +128,16 @@ class DbUtil:
 
     def execute(self, sql, args=None, need_commit: bool = False, print_log: bool = True):
         """获取SQL执行结果"""
+        start_time = time.perf_counter()
         try:
             self.__cursor.execute(sql, args)
             last_rowid = self.__cursor.lastrowid
             if need_commit:
                 self.__commit()
+            _notify_sql('execute', start_time, True)
             return last_rowid
         except Exception as e:
+            _notify_sql('execute', start_time, False)
             if print_log:
                 logger.warning(f"执行SQL {sql}, 遇到异常 {e}")
             else:
@@ -124,14 +147,17 @@ class DbUtil:
 
     def execute_many(self, sql, args=None, need_commit: bool = False, print_log: bool = True):
         """获取SQL执行结果"""
+        start_time = time.perf_counter()
         try:
             self.__cursor.executemany(sql, args)
             if need_commit:
                 self.__commit()
+            _notify_sql('execute_many', start_time, True)
 
             # 获取最后一个插入记录的ID
             return self.__cursor.lastrowid
         except Exception as e:
+            _notify_sql('execute_many', start_time, False)
             if print_log:
                 logger.warning(f"执行SQL {sql}, 遇到异常 {e}")
             else:
@@ -142,10 +168,13 @@ class DbUtil:
     def query_one(self, sql, print_log: bool = True):
         """查询单条数据"""
         result = None
+        start_time = time.perf_counter()
         try:
             self.__cursor.execute(sql)
             result = self.__cursor.fetchone()
+            _notify_sql('query_one', start_time, True)
         except Exception as e:
+            _notify_sql('query_one', start_time, False)
             if print_log:
                 logger.warning(f"执行SQL {sql}, 遇到异常 {e}")
             else:
@@ -155,10 +184,13 @@ class DbUtil:
     def query_all(self, sql, print_log: bool = True):
         """查询多条数据"""
         list_result = ()
+        start_time = time.perf_counter()
         try:
             self.__cursor.execute(sql)
             list_result = self.__cursor.fetchall()
+            _notify_sql('query_all', start_time, True)
         except Exception as e:
+            _notify_sql('query_all', start_time, False)
             if print_log:
                 logger.warning(f"执行SQL {sql}, 遇到异常 {e}")
             else:
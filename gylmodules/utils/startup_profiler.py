@@ -0,0 +1,94 @@
+import builtins
+import sys
+import threading
+import time
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+"""
+启动耗时统计：启动阶段临时替换 __import__，记录每个模块首次导入的耗时
+cumulative 为包含其依赖在内的总耗时，self 为扣除依赖后模块自身的耗时
+"""
+
+
+class ImportProfiler:
+
+    def __init__(self):
+        self._original_import = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._records: Dict[str, List[float]] = {}  # 模块名 -> [cumulative, self]
+        self._start_time = None
+        self.total_seconds = None
+        self.rss_mb = None
+
+    def start(self):
+        if self._original_import is not None:
+            return
+        self._start_time = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original_import is None:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+        self.total_seconds = time.perf_counter() - self._start_time
+        if resource is not None:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux 单位为 KB，macOS 为字节
+            self.rss_mb = round(rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024, 1)
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original_import = self._original_import or builtins.__import__
+        # 相对导入、已加载的模块直接放行
+        if level or name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                record = self._records.setdefault(name, [0.0, 0.0])
+                record[0] += elapsed
+                record[1] += elapsed - children
+
+    def report(self, top: int = 20) -> Dict:
+        """按模块自身耗时排序的前 top 个模块，以及按顶层包汇总的耗时"""
+        with self._lock:
+            records = dict(self._records)
+        packages = {}
+        for name, (_, self_seconds) in records.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0.0) + self_seconds
+        slowest = sorted(records.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return {
+            "total_seconds": round(self.total_seconds, 3) if self.total_seconds is not None else None,
+            "peak_rss_mb": self.rss_mb,
+            "imported_modules": len(records),
+            "packages": {package: round(seconds, 3) for package, seconds
+                         in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]},
+            "modules": [{"module": name, "cumulative": round(cumulative, 3), "self": round(self_seconds, 3)}
+                        for name, (cumulative, self_seconds) in slowest],
+        }
+
+    def format_report(self, top: int = 10) -> str:
+        report = self.report(top)
+        lines = [f"启动导入耗时 {report['total_seconds']} s，导入模块 {report['imported_modules']} 个，"
+                 f"峰值内存 {report['peak_rss_mb']} MB"]
+        lines += [f"  {package:<30} {seconds:>8.3f} s" for package, seconds in report["packages"].items()]
+        return "\n".join(lines)
+
+
+import_profiler = ImportProfiler()
@@ -7,12 +7,18 @@
 import os
 import time
 
+from gylmodules.utils.startup_profiler import import_profiler
+
+# 统计启动阶段各模块导入耗时（/gyl/ehp/startup_report）
+import_profiler.start()
 from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 
 from gylmodules.app import gylroute
 from gylmodules import gylschedule_task, global_config
+import_profiler.stop()
+print(import_profiler.format_report())
 
 server_app = Flask(__name__)
 server_app.register_blueprint(gylroute, url_prefix='/gyl')
@@ -29,10 +35,22 @@ def start_schedule_work():
     time.sleep(3)  # 至少3秒 确保aaa被占用
 
 
+# 开发模式自动重载：werkzeug 监控进程和实际提供服务的子进程都会执行 main
+USE_RELOADER = True
+
+
+def is_serving_process() -> bool:
+    """开启 reloader 时只有子进程（WERKZEUG_RUN_MAIN=true）提供服务"""
+    return not USE_RELOADER or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+
 if __name__ == '__main__':
     import threading
-    t = threading.Thread(target=start_schedule_work)
-    t.setDaemon
-    t.start()
+    # 后台服务（目录监控、解析工作进程池、定时任务）只在提供服务的进程中启动，
+    # 否则监控进程和服务进程会重复入库同一批文件、各自加载一套 OCR 模型
+    if is_serving_process():
+        t = threading.Thread(target=start_schedule_work)
+        t.setDaemon
+        t.start()
     # port = 8081 if global_config.run_in_local else 8080
-    socketio.run(server_app, host='0.0.0.0', port=8080, debug=True, use_reloader=True)
+    socketio.run(server_app, host='0.0.0.0', port=8080, debug=True, use_reloader=USE_RELOADER)
@@ -0,0 +1,5 @@
+# 测试从仓库根目录导入 gylmodules（直接执行 pytest 时根目录不一定在 sys.path 中）
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.device_rules import DeviceRule, DeviceRules
+
+
+@pytest.fixture
+def rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(ehp_config, 'DEVICE_RULES_CHECK_INTERVAL', 0)
+    # 规则文件不存在，使用 ehp_config.DEVICE_RULES
+    return DeviceRules(str(tmp_path / 'device_rules.json'))
+
+
+@pytest.mark.parametrize('file_name, report_name, template_id', [
+    ('21_20250101.pdf', '角膜内皮细胞报告', 'corneal_endothelium'),
+    ('23_20250101.pdf', '角膜内皮细胞报告', 'corneal_endothelium'),
+    ('22_20250101.pdf', '角膜内皮细胞报告2', 'corneal_endothelium_2'),
+    ('31_20250101.pdf', '角膜地形图', 'medmont_topography'),
+    ('32_20250101.pdf', '角膜地形图', 'medmont_topography'),
+    ('41_20250101.pdf', '眼表综合检查报告', 'ocular_surface'),
+    ('44_20250101.pdf', '眼表综合检查报告', 'ocular_surface'),
+    ('51r_20250101.pdf', '屈光四图-右', 'pentacam_4maps'),
+    ('51L_20250101.pdf', '屈光四图-左', 'pentacam_4maps'),
+    ('52R_20250101.pdf', '屈光六图-右', 'pentacam_6maps'),
+    ('52l_20250101.pdf', '屈光六图-左', 'pentacam_6maps'),
+    ('53r_20250101.pdf', 'Scheimpflug图像总览-右', 'pentacam_scheimpflug'),
+    ('53l_20250101.pdf', 'Scheimpflug图像总览-左', 'pentacam_scheimpflug'),
+    ('54r_20250101.pdf', '比较两次检查-右', 'pentacam_compare'),
+    ('54l_20250101.pdf', '比较两次检查-左', 'pentacam_compare'),
+    ('6r_20250101.pdf', '生物力学-右', 'biomechanics'),
+    ('6l_20250101.pdf', '生物力学-左', 'biomechanics'),
+    ('7_20250101.pdf', '眼底照片', 'fundus_photo'),
+])
+def test_classify_prefix_rules(rules, file_name, report_name, template_id):
+    rule = rules.classify(os.path.join('/data/share', file_name))
+    assert (rule.full_report_name, rule.template_id) == (report_name, template_id)
+
+
+def test_master700_by_shape(rules):
+    rule = rules.classify('1918372191_Bai_Xue_20250101092500.pdf')
+    assert rule.template_id == 'master700'
+    assert rule.keep_name is True
+
+
+@pytest.mark.parametrize('file_name, template_id', [
+    # 前缀规则优先，形状相同也不归为 Master700（与原判断顺序一致）
+    ('7123456789_Bai_Xue_20250101092500.pdf', 'fundus_photo'),
+    ('2123456789_Bai_Xue_20250101092500.pdf', 'corneal_endothelium'),
+    ('51r_Wang_Honglei_20250101.pdf', 'pentacam_4maps'),
+])
+def test_prefix_rules_before_master700(rules, file_name, template_id):
+    assert rules.classify(file_name).template_id == template_id
+
+
+@pytest.mark.parametrize('file_name, report_name', [
+    ('Wang_Honglei_OD_20250101_091500_4 Maps Refr_1.pdf', '屈光四图-右'),
+    ('Wang_Honglei_OS_20250101_091500_4 Maps Refr_1.pdf', '屈光四图-左'),
+    ('Wang_Honglei_20250101_091500_4 Maps Refr_1.pdf', '屈光四图'),
+])
+def test_pentacam_export_eye(rules, file_name, report_name):
+    rule = rules.classify(file_name)
+    assert (rule.full_report_name, rule.template_id) == (report_name, 'pentacam_4maps')
+
+
+@pytest.mark.parametrize('file_name', ['8_20250101.pdf', 'report.pdf', '5_20250101.pdf', 'x21_20250101.pdf'])
+def test_unmatched(rules, file_name):
+    assert rules.classify(file_name) is None
+
+
+def test_rule_validation():
+    with pytest.raises(ValueError):
+        DeviceRule("报告", "设备")
+    with pytest.raises(ValueError):
+        DeviceRule("报告", "设备", prefixes=["9"], pattern="9")
+    with pytest.raises(ValueError):
+        DeviceRule("报告", "设备", prefixes=["9"], eye='OU')
+
+
+def test_earlier_rule_wins(tmp_path, monkeypatch):
+    monkeypatch.setattr(ehp_config, 'DEVICE_RULES', [
+        {"prefixes": ["9"], "report_name": "短前缀", "device": "设备"},
+        {"pattern": r"9\d_", "report_name": "正则", "device": "设备"},
+        {"prefixes": ["91"], "report_name": "长前缀", "device": "设备"},
+        {"prefixes": ["8"], "report_name": "其他", "device": "设备"},
+        {"pattern": r"8", "report_name": "靠后的正则", "device": "设备"},
+    ])
+    rules = DeviceRules(str(tmp_path / 'missing.json'))
+    assert rules.classify('91_x.pdf').report_name == '短前缀'
+    assert rules.classify('8_x.pdf').report_name == '其他'
+
+
+def test_reload_from_json(rules):
+    assert rules.status()["source"] == 'ehp_config.DEVICE_RULES'
+    with open(rules.rules_path, 'w', encoding='utf-8') as f:
+        json.dump([{"prefixes": ["9"], "report_name": "新设备报告", "device": "新设备",
+                    "template_id": "fundus_photo"}], f, ensure_ascii=False)
+    assert rules.classify('9_20250101.pdf').report_name == '新设备报告'
+    assert rules.classify('7_20250101.pdf') is None
+    assert rules.status()["source"] == rules.rules_path
+
+
+@pytest.mark.parametrize('bad_rule', [
+    {"pattern": "(9", "report_name": "正则错误", "device": "新设备"},
+    {"prefixes": ["9"], "report_name": "模板拼写错误", "device": "新设备", "template_id": "fundus_phtoo"},
+])
+def test_invalid_json_keeps_previous_rules(rules, bad_rule):
+    with open(rules.rules_path, 'w', encoding='utf-8') as f:
+        json.dump([{"prefixes": ["9"], "report_name": "新设备报告", "device": "新设备"}], f, ensure_ascii=False)
+    assert rules.classify('9_20250101.pdf') is not None
+    with open(rules.rules_path, 'w', encoding='utf-8') as f:
+        json.dump([bad_rule], f, ensure_ascii=False)
+    os.utime(rules.rules_path, ns=(1, 1))
+    assert rules.classify('9_20250101.pdf').report_name == '新设备报告'
+    with pytest.raises(ValueError):
+        rules.reload()
+
+
+def test_config_rules_reference_registered_templates(rules):
+    assert rules.reload() == len(ehp_config.DEVICE_RULES)
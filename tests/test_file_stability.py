@@ -0,0 +1,67 @@
+import os
+import time
+
+from gylmodules.eye_hospital_pacs.file_stability import FileStabilityTracker
+
+
+def _write(path, data=b'%PDF-1.4', age=0.0):
+    with open(path, 'wb') as f:
+        f.write(data)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_new_file_waits_for_stable_window(tmp_path):
+    tracker = FileStabilityTracker(stable_seconds=0.2)
+    path = _write(tmp_path / 'a.pdf')
+    assert tracker.check([path]) == ([], [path])
+    assert tracker.check([path]) == ([], [path])
+    time.sleep(0.25)
+    assert tracker.check([path]) == ([path], [])
+
+
+def test_preserved_old_mtime_is_not_ready_on_first_sight(tmp_path):
+    # cp -p / robocopy / SMB 复制保留源文件 mtime
+    tracker = FileStabilityTracker(stable_seconds=60)
+    path = _write(tmp_path / 'copied.pdf', age=3600)
+    assert tracker.check([path]) == ([], [path])
+    assert tracker.check([path]) == ([], [path])
+
+
+def test_startup_file_ready_after_one_unchanged_recheck(tmp_path):
+    tracker = FileStabilityTracker(stable_seconds=60)
+    path = _write(tmp_path / 'left_over.pdf', age=3600)
+    tracker.mark_startup([path])
+    assert tracker.check([path]) == ([], [path])
+    assert tracker.check([path]) == ([path], [])
+
+
+def test_startup_file_changed_before_recheck_restarts_window(tmp_path):
+    tracker = FileStabilityTracker(stable_seconds=60)
+    path = _write(tmp_path / 'growing.pdf', age=3600)
+    tracker.mark_startup([path])
+    assert tracker.check([path]) == ([], [path])
+    _write(path, b'%PDF-1.4 more data')
+    assert tracker.check([path]) == ([], [path])
+    assert tracker.check([path]) == ([], [path])
+
+
+def test_startup_mark_ignored_for_tracked_and_forgotten_files(tmp_path):
+    tracker = FileStabilityTracker(stable_seconds=60)
+    path = _write(tmp_path / 'a.pdf', age=3600)
+    tracker.check([path])
+    tracker.forget(path)
+    tracker.check([path])
+    tracker.mark_startup([path])  # 已在跟踪表中，不再倒推
+    assert tracker.check([path]) == ([], [path])
+
+
+def test_missing_file_dropped(tmp_path):
+    tracker = FileStabilityTracker(stable_seconds=0)
+    path = _write(tmp_path / 'a.pdf')
+    tracker.check([path])
+    os.remove(path)
+    assert tracker.check([path]) == ([], [])
+    assert tracker.tracked_count == 0
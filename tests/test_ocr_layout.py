@@ -0,0 +1,61 @@
+import re
+
+from gylmodules.eye_hospital_pacs.ocr_layout import NUMBER, TokenLayout, group_lines, merge_line_tokens, \
+    reading_order, token_boxes
+
+
+def tok(text, x0, y0, x1, y1):
+    """OCR 结果格式的文本框"""
+    return {"text": text, "confidence": 0.99, "position": [[x0, y0], [x1, y0], [x1, y1], [x0, y1]],
+            "y_position": (y0 + y1) / 2}
+
+
+def test_group_lines_orders_top_to_bottom_then_left_to_right():
+    tokens = [tok("b", 200, 12, 260, 42), tok("c", 10, 100, 60, 130), tok("a", 10, 10, 60, 40)]
+    order, line_ids = group_lines(token_boxes([t["position"] for t in tokens]))
+    assert [tokens[i]["text"] for i in order] == ["a", "b", "c"]
+    assert line_ids[0] == line_ids[2] != line_ids[1]
+
+
+def test_reading_order_and_lines():
+    tokens = [tok("右眼", 300, 0, 360, 30), tok("下一行", 0, 80, 90, 110), tok("眼睛:", 0, 2, 80, 32)]
+    assert [t["text"] for t in reading_order(tokens)] == ["眼睛:", "右眼", "下一行"]
+    assert TokenLayout(tokens).lines() == ["眼睛: 右眼", "下一行"]
+
+
+def test_value_in_same_token():
+    layout = TokenLayout([tok("K1: 42.8 D", 0, 0, 200, 30)])
+    assert layout.value_after(re.compile(r'K1'), NUMBER) == "42.8"
+
+
+def test_value_right_of_label_on_same_line():
+    layout = TokenLayout([tok("43.9 D", 120, 3, 220, 33), tok("K2", 0, 0, 40, 30), tok("9.9", 0, 60, 40, 90)])
+    assert layout.value_after(re.compile(r'K2'), NUMBER) == "43.9"
+
+
+def test_value_below_label():
+    layout = TokenLayout([tok("CD", 0, 0, 60, 30), tok("2850", 5, 50, 90, 80), tok("cells/mm2", 300, 50, 420, 80)])
+    assert layout.value_after(re.compile(r'CD'), NUMBER) == "2850"
+
+
+def test_label_without_value_is_skipped():
+    layout = TokenLayout([tok("K1", 0, 0, 40, 30), tok("mm", 100, 0, 140, 30)])
+    assert layout.value_after(re.compile(r'K1'), NUMBER) is None
+
+
+def test_multiple_values_in_reading_order():
+    layout = TokenLayout([tok("平K 41.90", 400, 0, 560, 30), tok("平K", 0, 0, 40, 30), tok("42.10", 60, 0, 140, 30)])
+    assert layout.values_after(re.compile(r'平K'), NUMBER) == ["42.10", "41.90"]
+
+
+def test_plain_text_tokens_from_old_cache():
+    layout = TokenLayout(["CD", "3012", ""])
+    assert layout.texts == ["CD", "3012"]
+    assert layout.value_after(re.compile(r'CD'), NUMBER) == "3012"
+
+
+def test_merge_line_tokens_joins_close_boxes_only():
+    tokens = [tok("42,50", 0, 0, 50, 20), tok("D", 60, 0, 70, 20), tok("far", 500, 0, 540, 20),
+              tok("next", 0, 50, 40, 70)]
+    assert [t["text"] for t in merge_line_tokens(tokens)] == ["42,50 D", "far", "next"]
+    assert merge_line_tokens(tokens, level=0) is tokens
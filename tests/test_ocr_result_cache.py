@@ -0,0 +1,20 @@
+from gylmodules.eye_hospital_pacs import ehp_metrics
+from gylmodules.eye_hospital_pacs.ocr_result_cache import OCRResultCache
+
+
+def test_stats_include_counts_merged_from_workers(tmp_path):
+    ehp_metrics.OCR_CACHE_EVENTS.drain()
+    cache = OCRResultCache(str(tmp_path / 'ocr_cache.db'), max_entries=1)
+    assert cache.get('h1', 'tpl@1') is None
+    cache.put('h1', 'tpl@1', [["文本"]], {"name": "张三"})
+    assert cache.get('h1', 'tpl@1')["value"] == {"name": "张三"}
+    cache.put('h2', 'tpl@1', [], {})
+
+    # 工作进程的增量随解析结果回传，由服务进程合并
+    worker_delta = ehp_metrics.drain()
+    ehp_metrics.merge(worker_delta)
+    ehp_metrics.merge({ehp_metrics.OCR_CACHE_EVENTS.name: {('hit',): 3}})
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (4, 1, 1, 1)
+    assert stats["hit_rate"] == 0.8
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from gylmodules.eye_hospital_pacs.page_pipeline import Pipeline
+
+
+def slow(seconds):
+    def stage(item):
+        time.sleep(seconds(item))
+        return item
+    return stage
+
+
+def test_items_come_out_in_source_order():
+    # 各项耗时不同，输出仍按原顺序
+    stages = [slow(lambda i: 0.01 * (5 - i % 5)), lambda i: i * 10]
+    with Pipeline(range(10), stages, maxsize=2) as pipe:
+        assert list(pipe) == [i * 10 for i in range(10)]
+
+
+def test_batches_cover_every_item_once_in_order():
+    with Pipeline(range(20), [slow(lambda i: 0.002)], maxsize=3) as pipe:
+        batches = list(pipe.batches(limit=4))
+    assert [item for batch in batches for item in batch] == list(range(20))
+    assert all(1 <= len(batch) <= 4 for batch in batches)
+
+
+def test_empty_source():
+    with Pipeline([], [lambda i: i]) as pipe:
+        assert list(pipe.batches()) == []
+
+
+def test_stage_failure_is_raised_in_consumer():
+    def stage(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    received = []
+    with pytest.raises(ValueError, match="bad item"):
+        with Pipeline(range(10), [stage, lambda i: i]) as pipe:
+            for item in pipe:
+                received.append(item)
+    assert received == [0, 1, 2]
+
+
+def test_source_failure_is_raised_in_consumer():
+    def source():
+        yield 1
+        raise RuntimeError("source broken")
+
+    with pytest.raises(RuntimeError, match="source broken"):
+        with Pipeline(source(), [lambda i: i]) as pipe:
+            list(pipe)
+
+
+def test_bounded_queues_limit_items_in_flight():
+    started = []
+    lock = threading.Lock()
+
+    def stage(item):
+        with lock:
+            started.append(item)
+        return item
+
+    with Pipeline(range(100), [stage], maxsize=2) as pipe:
+        iterator = iter(pipe)
+        assert next(iterator) == 0
+        time.sleep(0.3)
+        # 消费方只取走 1 项：阶段内处理中 1 项 + 两端队列各 maxsize 项
+        assert len(started) <= 1 + 2 * 2 + 1
+
+
+def test_close_stops_threads_when_consumer_stops_early():
+    pipe = Pipeline(range(1000), [lambda i: i, lambda i: i], maxsize=1)
+    with pipe:
+        next(iter(pipe))
+    assert not any(t.is_alive() for t in pipe._threads)
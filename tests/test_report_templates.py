@@ -0,0 +1,105 @@
+from gylmodules.eye_hospital_pacs.report_templates import extract_amaris_data, extract_biometry_data, extract_eye_exam_data, \
+    extract_name_and_cd, extract_name_only, extract_ocular_surface_data, extract_topography_data, get_template, \
+    match_template
+
+
+def tok(text, x0, y0, x1=None, y1=None):
+    """OCR 结果格式的文本框，默认宽度按字数估算、高度 30"""
+    x1 = x0 + 20 * len(text) if x1 is None else x1
+    y1 = y0 + 30 if y1 is None else y1
+    return {"text": text, "confidence": 0.99, "position": [[x0, y0], [x1, y0], [x1, y1], [x0, y1]],
+            "y_position": (y0 + y1) / 2}
+
+
+def test_name_and_cd_label_and_value_on_same_line():
+    regions = [[tok("性别: 男", 600, 0), tok("姓名:", 0, 2), tok("张三", 120, 0)],
+               [tok("CD 2850", 0, 0)],
+               [tok("CD", 0, 0), tok("2790", 100, 0)]]
+    assert extract_name_and_cd(regions, "角膜内皮细胞报告_20250101.pdf") == {"name": "张三", "r_cd": "2850", "l_cd": "2790"}
+
+
+def test_name_and_cd_value_below_label():
+    regions = [[tok("姓名: 李四", 0, 0)], [tok("CD", 0, 0), tok("3012", 0, 50)], [tok("CD", 0, 0), tok("2967", 0, 50)]]
+    assert extract_name_and_cd(regions, "x.pdf") == {"name": "李四", "r_cd": "3012", "l_cd": "2967"}
+
+
+def test_name_and_cd_falls_back_to_joined_text():
+    regions = [["姓名 王五"], ["CD:2500"], ["CD:2400"]]
+    assert extract_name_and_cd(regions, "x.pdf") == {"name": "王五", "r_cd": "2500", "l_cd": "2400"}
+
+
+def test_eye_exam_values_split_across_tokens():
+    regions = [
+        [tok("姓: Wang", 0, 0), tok("名: Honglei", 0, 50), tok("眼睛:", 0, 100), tok("左眼", 150, 100)],
+        [tok("K1:", 0, 0), tok("42.8 D", 150, 0), tok("K2: 43.9 D", 0, 50), tok("Rm", 0, 100), tok("7.78 毫米", 0, 150)],
+        [tok("最薄点位置:", 0, 0), tok("512 微米", 260, 0)],
+        [tok("60.1 毫米3", 0, 0), tok("11.9 毫米", 0, 50), tok("38.2 度", 0, 100), tok("3.1 毫米", 0, 150),
+         tok("3.05 毫米", 0, 200)],
+    ]
+    assert extract_eye_exam_data(regions, "屈光四图-左_20250101.pdf") == {
+        "name": "WangHonglei", "eye": "左眼", "l_k1": "42.8", "l_k2": "43.9", "l_rm": "7.78",
+        "l_thinnest_point": "512", "l_distance": "11.9毫米", "l_depth": "3.05毫米"}
+
+
+def test_topography_values_per_eye_region():
+    regions = [[tok("王芳", 0, 0)],
+               [tok("平K", 0, 0), tok("42.10 D", 100, 0), tok("陡K 43.20 D", 0, 50), tok("△K", 0, 100),
+                tok("1.10 D", 0, 150), tok("平面e 0.52", 0, 200)],
+               [tok("平K 41.90 D", 0, 0), tok("陡K 42.80 D", 0, 50), tok("△K 0.90 D", 0, 100),
+                tok("平面e", 0, 150), tok("0.48", 120, 150)]]
+    assert extract_topography_data(regions, "角膜地形图_20250101.pdf") == {
+        "name": "王芳", "r_pk1": "42.10", "l_pk1": "41.90", "r_xk2": "43.20", "l_xk2": "42.80",
+        "r_dk3": "1.10", "l_dk3": "0.90", "r_pe": "0.52", "l_pe": "0.48"}
+
+
+def test_biometry_first_half_is_right_eye():
+    regions = [[tok("AL: 23.41 mm", 0, 0)], [tok("CW-chord: 0.3 mm @ 250°", 0, 0)], [tok("WTW: 11.8 mm", 0, 0)],
+               [tok("CCT: 545 µm", 0, 0)],
+               [tok("AL：23.38 mm", 0, 0)], [tok("角膜直径: 0.2 mm 在 95 度", 0, 0)], [tok("WTW: 11.7 mm", 0, 0)],
+               [tok("CCT: 541", 0, 0)]]
+    assert extract_biometry_data(regions, "Master700_x.pdf") == {
+        "r_al": "23.41", "r_cct": "545", "r_wtw": "11.8", "r_cw_chord": "0.3 mm @ 250°",
+        "l_al": "23.38", "l_cct": "541", "l_wtw": "11.7", "l_cw_chord": "0.2 mm @ 95°"}
+
+
+def test_ocular_surface_joins_tokens_without_spaces():
+    regions = [[tok("姓名:", 0, 0), tok("赵敏", 100, 0)], [tok("5.2", 0, 0), tok("s", 70, 0)], [tok("6.8s", 0, 0)]]
+    assert extract_ocular_surface_data(regions, "x.pdf") == {
+        "name": "赵敏", "r_first_rupture_time": "5.2s", "l_first_rupture_time": "6.8s"}
+
+
+def test_name_only_uses_last_region_and_strips_punctuation():
+    assert extract_name_only([[tok("ignored", 0, 0)], [tok("Liu", 0, 0), tok("Yang.", 80, 0)]], "x.pdf") == \
+        {"name": "LiuYang"}
+
+
+def test_template_validation():
+    template = get_template('corneal_endothelium')
+    assert template.validate({"r_cd": "2850"}) == []
+    assert template.validate({"r_cd": "28"}) == ['r_cd']
+
+
+def test_match_template_by_report_name_and_device_file_name():
+    assert match_template("/data/屈光四图-右_20250101.pdf").template_id == 'pentacam_4maps'
+    assert match_template("Wang_Honglei_OS_11092025_110127_4 Maps Refr_20250911161631.pdf").template_id == \
+        'pentacam_4maps'
+    assert match_template("Zhang_San_OD_20250101091000.pdf").template_id == 'amaris'
+    assert match_template("unknown.pdf") is None
+
+
+def test_biometry_value_beside_or_below_label():
+    regions = [[tok("AL:", 0, 0), tok("23.41 mm", 120, 0)], [tok("CW-chord:", 0, 0), tok("0.3 mm @ 250°", 0, 60)],
+               [tok("WTW", 0, 0), tok("11.8 mm", 120, 0)], [tok("CCT:", 0, 0), tok("545 µm", 0, 60)],
+               [tok("AL: 23.38 mm", 0, 0)], [tok("CW-chord: 0.2 mm", 0, 0)], [tok("WTW: 11.7 mm", 0, 0)],
+               [tok("CCT: 541", 0, 0)]]
+    assert extract_biometry_data(regions, "Master700_x.pdf") == {
+        "r_al": "23.41", "r_cct": "545", "r_wtw": "11.8", "r_cw_chord": "0.3 mm @ 250°",
+        "l_al": "23.38", "l_cct": "541", "l_wtw": "11.7", "l_cw_chord": ""}
+
+
+def test_amaris_fields_come_from_their_own_region():
+    regions = [[tok("7,80 mm", 0, 0), tok("42,50 D", 0, 60), tok("43,25 D", 150, 60)],
+               [tok("-3,25 D -0,75 Dx 180", 0, 0)], [tok("35 s", 0, 0)], [tok("6,50 mm", 0, 0)], [tok("95 um", 0, 0)]]
+    assert extract_amaris_data(regions, "Zhang_San_OD_20250101.pdf") == {
+        "corneal_curvate_od": "42,50,43,25", "diopter_od": "-3,25 D -0,75 Dx 180", "cut_time_od": "35 s",
+        "light_area_od": "6,50 mm", "cut_depth_od": "95 um", "name": ""}
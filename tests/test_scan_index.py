@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import pytest
+
+from gylmodules.eye_hospital_pacs import ehp_config
+from gylmodules.eye_hospital_pacs.scan_index import ScanIndex
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(ehp_config, 'MONITOR_RETRY_BACKOFF', 0)
+    monkeypatch.setattr(ehp_config, 'MONITOR_RETRY_BACKOFF_MAX', 600)
+    return ScanIndex(str(tmp_path / 'index' / 'scan_index.db'), max_attempts=3)
+
+
+def _write(path, data=b'%PDF-1.4'):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def _state(index, path):
+    return index._connect().execute("SELECT state, attempts FROM scan_files WHERE path = ?", (path,)).fetchone()
+
+
+def test_new_failed_quarantined(index, tmp_path):
+    path = _write(tmp_path / 'a.pdf')
+    assert index.select([path]) == [path]
+    assert _state(index, path) == ('new', 0)
+    assert index.pending_paths() == [path]
+
+    assert index.record_failure(path, 'db down') is False
+    assert _state(index, path) == ('failed', 1)
+    assert index.select([path]) == [path]
+    assert index.record_failure(path, 'db down') is False
+    assert index.record_failure(path, 'db down') is True
+    assert _state(index, path) == ('quarantined', 3)
+
+    assert index.select([path]) == []
+    assert index.pending_paths() == []
+    assert index.pending_paths(include_quarantined=True) == [path]
+    assert index.quarantined()[0]["last_error"] == 'db down'
+    assert index.stats() == {'quarantined': 1}
+
+
+def test_failed_file_waits_for_backoff(index, tmp_path, monkeypatch):
+    monkeypatch.setattr(ehp_config, 'MONITOR_RETRY_BACKOFF', 60)
+    path = _write(tmp_path / 'a.pdf')
+    index.select([path])
+    index.record_failure(path, 'share offline')
+    assert index.select([path]) == []
+    assert index.pending_paths() == []
+    assert index.next_retry_at() is not None
+    # 未到重试时间：不交给入库流程，状态不变
+    assert _state(index, path) == ('failed', 1)
+
+
+def test_retry_delay_doubles_up_to_max(monkeypatch):
+    monkeypatch.setattr(ehp_config, 'MONITOR_RETRY_BACKOFF', 10)
+    monkeypatch.setattr(ehp_config, 'MONITOR_RETRY_BACKOFF_MAX', 60)
+    assert [ScanIndex.retry_delay(n) for n in range(1, 6)] == [10, 20, 40, 60, 60]
+
+
+def test_release(index, tmp_path):
+    path = _write(tmp_path / 'a.pdf')
+    index.select([path])
+    for _ in range(3):
+        index.record_failure(path, 'bad pdf')
+    assert index.release(path) is True
+    assert _state(index, path) == ('new', 0)
+    assert index.select([path]) == [path]
+    assert index.release(path) is False
+
+
+def test_replaced_file_resets_state(index, tmp_path):
+    path = _write(tmp_path / 'a.pdf')
+    index.select([path])
+    for _ in range(3):
+        index.record_failure(path, 'bad pdf')
+    os.remove(path)
+    _write(path, b'%PDF-1.4 replaced')
+    assert index.select([path]) == [path]
+    assert _state(index, path) == ('new', 0)
+
+
+def test_missing_file_removed(index, tmp_path):
+    path = _write(tmp_path / 'a.pdf')
+    index.select([path])
+    os.remove(path)
+    assert index.select([path]) == []
+    assert _state(index, path) is None
+    index.remove(path)
+    assert index.stats() == {}
+
+
+def test_old_index_gains_next_attempt_column(tmp_path):
+    db_path = str(tmp_path / 'scan_index.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE scan_files (path TEXT PRIMARY KEY, inode INTEGER NOT NULL, size INTEGER NOT NULL, "
+                 "mtime_ns INTEGER NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                 "last_error TEXT, first_seen REAL NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO scan_files VALUES ('/x/a.pdf', 1, 1, 1, 'failed', 1, 'err', 0, 0)")
+    conn.commit()
+    conn.close()
+    index = ScanIndex(db_path)
+    assert index.pending_paths() == ['/x/a.pdf']